@@ -3,48 +3,60 @@ import uuid
 import json
 import logging
 import re
-from langchain_groq import ChatGroq
-from langgraph.graph import StateGraph, START, END
 
-from api.prompts.story_prompts import get_story_system_prompt, get_image_prompt_system, get_character_extraction_prompt, DEFAULT_NUM_CHAPTERS, WORDS_PER_CHAPTER
+from api.services import clients
+from api.services.checkpoint_store import get_checkpoint_store
+from api.prompts.story_prompts import get_story_system_prompt, get_image_prompt_system, get_batch_image_prompt_system, get_character_extraction_prompt, DEFAULT_NUM_CHAPTERS, WORDS_PER_CHAPTER
 # Import utilities from the sibling module
 from .utils import (
     Story, 
     StoryState, 
+    ScenePromptBatch,
+    GenerationContext,
     generate_image, 
-    set_user_context, 
     logger, 
-    _image_counter
 )
 
-# Cargar API keys
-groq_key = os.getenv("GROQ_API_KEY")
-if not groq_key:
-    raise EnvironmentError("GROQ_API_KEY not found. Set it in your .env file.")
+# Max number of cover/chapter image pipelines (prompt -> image -> upload) in flight per story
+IMAGE_CONCURRENCY = max(1, int(os.getenv("IMAGE_CONCURRENCY", "4")))
+# Ask for every scene prompt in one LLM call instead of one call per image
+IMAGE_PROMPT_BATCH = os.getenv("IMAGE_PROMPT_BATCH", "true").strip().lower() == "true"
 
 # ============================================================================
 # AGENTS SETUP
 # ============================================================================
-logger.info("Building story_agent (Groq)...")
-story_llm = ChatGroq(
-    groq_api_key=groq_key,
-    model="llama-3.3-70b-versatile",
-    temperature=0.7,
-)
+# Los clientes de Groq se construyen en el primer uso (ver api/services/clients.py), no al importar
+def _groq_llm(temperature: float):
+    from langchain_groq import ChatGroq
+
+    groq_key = os.getenv("GROQ_API_KEY")
+    if not groq_key:
+        raise EnvironmentError("GROQ_API_KEY not found. Set it in your .env file.")
+    return ChatGroq(
+        groq_api_key=groq_key,
+        model="llama-3.3-70b-versatile",
+        temperature=temperature,
+    )
 
-story_agent = story_llm.with_structured_output(Story, method="json_mode")
-logger.info(f"story_agent ready (configured for ~{WORDS_PER_CHAPTER} words per chapter)")
+def _build_story_agent():
+    logger.info(f"Building story_agent (Groq, ~{WORDS_PER_CHAPTER} words per chapter)...")
+    return _groq_llm(0.7).with_structured_output(Story, method="json_mode")
 
-logger.info("Building image_llm (Groq)...")
-image_llm = ChatGroq(
-    groq_api_key=groq_key,
-    model="llama-3.3-70b-versatile",
-    temperature=0.2,
-)
-logger.info("image_llm ready")
+def _build_image_prompt_batch_agent():
+    return get_image_llm().with_structured_output(ScenePromptBatch, method="json_mode")
+
+get_story_agent = clients.register("story_agent", _build_story_agent)
+get_image_llm = clients.register("image_llm", lambda: _groq_llm(0.2))
+get_image_prompt_batch_agent = clients.register("image_prompt_batch_agent", _build_image_prompt_batch_agent)
 
 from langsmith import traceable
 
+def _with_character_block(prompt: str, character_block: str = None) -> str:
+    """Append character descriptions verbatim so they are never rewritten."""
+    if character_block:
+        return f"{character_block}\n\n{prompt}"
+    return prompt
+
 @traceable(run_type="chain", name="make_image_prompt")
 def make_image_prompt(
     text: str,
@@ -67,7 +79,7 @@ def make_image_prompt(
                 + user_content
             )
 
-        response = image_llm.invoke([
+        response = get_image_llm().invoke([
             {
                 "role": "system",
                 "content": get_image_prompt_system(lang),
@@ -76,9 +88,7 @@ def make_image_prompt(
         ])
         prompt = response.content.strip() if hasattr(response, "content") else str(response).strip()
 
-        # Append character descriptions verbatim so they are never rewritten
-        if character_block:
-            prompt = f"{character_block}\n\n{prompt}"
+        prompt = _with_character_block(prompt, character_block)
 
         logger.debug("Child-friendly prompt: %s", prompt[:200])
         return prompt
@@ -88,6 +98,56 @@ def make_image_prompt(
         return f"{base}"
 
 
+@traceable(run_type="chain", name="make_image_prompts_batch")
+def make_image_prompts_batch(
+    jobs: list[dict],
+    lang: str = "en",
+    style_context: str = None,
+    character_descriptions: str = None,
+) -> dict[int, str]:
+    """Create the scene prompts for every image job with a single LLM call.
+
+    Returns ``{job index: scene prompt}`` containing only entries that pass
+    validation (known index, no duplicates, non-empty prompt). Character
+    blocks are not part of the result; callers append them verbatim, exactly
+    as ``make_image_prompt`` does.
+    """
+    expected = {job["index"] for job in jobs}
+    scenes = "\n\n".join(f"### Scene {job['index']}\n{job['text'][:2000]}" for job in jobs)
+    user_content = f"Story scenes:\n\n{scenes}"
+    if character_descriptions:
+        user_content = f"CHARACTER REFERENCE:\n{character_descriptions}\n\n" + user_content
+    if style_context:
+        user_content = f"VISUAL STYLE INSTRUCTIONS:\n{style_context}\n\n" + user_content
+
+    try:
+        batch = get_image_prompt_batch_agent().invoke([
+            {"role": "system", "content": get_batch_image_prompt_system(lang, len(jobs))},
+            {"role": "user", "content": user_content},
+        ])
+    except Exception as e:
+        logger.error("Error creating batched image prompts: %s", e)
+        return {}
+
+    prompts: dict[int, str] = {}
+    for entry in getattr(batch, "prompts", None) or []:
+        prompt = (entry.prompt or "").strip()
+        if entry.index in expected and entry.index not in prompts and prompt:
+            prompts[entry.index] = prompt
+
+    missing = sorted(expected - prompts.keys())
+    if missing:
+        logger.warning("Batched image prompts missing/invalid for scenes %s; falling back per scene", missing)
+    return prompts
+
+
+def _report_progress(state: StoryState, stage: str, **data):
+    """Forward a progress update to the caller's reporter (``on_progress`` in state), if any."""
+    on_progress = state.get("on_progress")
+    if on_progress:
+        on_progress(stage, **data)
+
+
 def _parse_character_lines(character_descriptions: str) -> list[tuple[str, str]]:
     """Parse '- Name: description' lines into (name, full_line) tuples."""
     parsed: list[tuple[str, str]] = []
@@ -159,6 +219,26 @@ def _build_chapter_character_block(character_descriptions: str, chapter_text: st
         + "\n\n"
     )
 
+def _build_image_jobs(story: Story, character_descriptions: str | None) -> list[dict]:
+    """Return one image job for the cover followed by one per chapter, in story order."""
+    cover_text = f"Book cover for: {story.title}\n\nChapters: {', '.join(c.title for c in story.chapters)}"
+
+    # Build a verbatim character block for the cover (all characters)
+    cover_char_block = ""
+    if character_descriptions:
+        cover_char_block = (
+            "CHARACTER CONSISTENCY (All characters MUST match these exact descriptions):\n"
+            f"{character_descriptions}"
+        )
+
+    jobs = [{"image_type": "cover", "index": 0, "text": cover_text, "character_block": cover_char_block}]
+    for idx, chapter in enumerate(story.chapters, 1):
+        chapter_text = f"{chapter.title}\n\n{chapter.content[:1500]}"
+        # Build verbatim character block (only characters in this chapter)
+        chapter_char_block = _build_chapter_character_block(character_descriptions or "", chapter_text)
+        jobs.append({"image_type": "chapter", "index": idx, "text": chapter_text, "character_block": chapter_char_block})
+    return jobs
+
 # ============================================================================
 # WORKFLOW NODES
 # ============================================================================
@@ -189,9 +269,10 @@ def story_generation_node(state: StoryState):
              user_content = str(first_msg)
 
     logger.info(f" [LLM Input] Sending prompt to Groq: '{user_content}'")
+    _report_progress(state, "generating_story")
     
     try:
-        story = story_agent.invoke(full_messages)
+        story = get_story_agent().invoke(full_messages)
         
         if not story or not isinstance(story, Story):
             logger.error("Invalid story response from LLM")
@@ -200,6 +281,7 @@ def story_generation_node(state: StoryState):
         logger.info(f"Story generated: {story.title}, {len(story.chapters)} chapters")
         story.story_type = state.get("story_type", "open")
         story.metadata = state.get("metadata", {})
+        _report_progress(state, "story_ready", story=story.model_dump())
         return {"story_data": story}
         
     except Exception as e:
@@ -216,6 +298,7 @@ def character_extraction_node(state: StoryState):
         return {}
 
     lang = state.get("language", "en") or "en"
+    _report_progress(state, "extracting_characters")
 
     # Build full story text
     full_text = f"Title: {story.title}\n\n"
@@ -238,7 +321,7 @@ def character_extraction_node(state: StoryState):
     system_prompt = get_character_extraction_prompt(lang)
 
     try:
-        response = image_llm.invoke([
+        response = get_image_llm().invoke([
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"{full_text}{protagonist_hint}"}
         ])
@@ -257,6 +340,82 @@ def character_extraction_node(state: StoryState):
         logger.error(f"Error extracting characters: {e}")
         return {}
 
+def resolve_story_id(task_id: str | None) -> str:
+    """Return the storage folder id for a run, stable across retries of the same task."""
+    if not task_id:
+        return str(uuid.uuid4())
+    checkpoints = get_checkpoint_store()
+    story_id = checkpoints.get(task_id, "story_id")
+    if not story_id:
+        # Keep the storage folder stable across retries so resumed images land with the finished ones
+        story_id = str(uuid.uuid4())
+        checkpoints.save(task_id, "story_id", story_id)
+    return story_id
+
+
+def plan_image_jobs(
+    story: Story,
+    character_descriptions: str | None,
+    lang: str = "en",
+    style_context: str | None = None,
+    task_id: str | None = None,
+) -> list[dict]:
+    """Build the cover + chapter image jobs for a story, ready for ``render_image_job``.
+
+    Jobs are plain JSON-serializable dicts, so they can also be sent to
+    Celery tasks. Images already checkpointed for ``task_id`` carry their
+    ``url``; the remaining ones get a batched scene ``prompt`` when
+    ``IMAGE_PROMPT_BATCH`` is on and the batch entry validated.
+    """
+    jobs = _build_image_jobs(story, character_descriptions)
+    saved = get_checkpoint_store().load(task_id) if task_id else {}
+    for job in jobs:
+        job["url"] = saved.get(f"image:{job['index']}")
+        job["prompt"] = None
+
+    pending_jobs = [job for job in jobs if not job["url"]]
+    if IMAGE_PROMPT_BATCH and pending_jobs:
+        batch_prompts = make_image_prompts_batch(
+            pending_jobs,
+            lang=lang,
+            style_context=style_context or None,
+            character_descriptions=character_descriptions or None,
+        )
+        for job in pending_jobs:
+            job["prompt"] = batch_prompts.get(job["index"])
+    return jobs
+
+
+def render_image_job(
+    job: dict,
+    context: GenerationContext,
+    lang: str = "en",
+    style_context: str | None = None,
+    model: str | None = None,
+    task_id: str | None = None,
+) -> str:
+    """Run the prompt -> image -> upload pipeline for one job and checkpoint the result."""
+    if job.get("url"):
+        logger.info("Resuming %s %d from checkpoint", job["image_type"], job["index"])
+        return job["url"]
+
+    if job.get("prompt"):
+        prompt = _with_character_block(job["prompt"], job["character_block"] or None)
+    else:
+        prompt = make_image_prompt(
+            job["text"],
+            lang=lang,
+            style_context=style_context or None,
+            character_block=job["character_block"] or None,
+        )
+    url = generate_image(
+        prompt, image_type=job["image_type"], model=model, index=job["index"], context=context
+    )
+    if url and task_id:
+        get_checkpoint_store().save(task_id, f"image:{job['index']}", url)
+    return url
+
+
 def image_generation_node(state: StoryState):
     """Generate images for cover and chapters and upload to Supabase Storage"""
     logger.info("Node: image_generation")
@@ -270,12 +429,9 @@ def image_generation_node(state: StoryState):
         logger.error("user_id or jwt_token not provided in state")
         raise ValueError("user_id and jwt_token are required for image generation")
     
-    story_id = str(uuid.uuid4())
-    set_user_context(user_id, jwt_token, story_id)
-    
-    # Reset counters from utils
-    _image_counter["cover"] = 0
-    _image_counter["chapter"] = 0
+    task_id = state.get("task_id")
+    story_id = resolve_story_id(task_id)
+    context = GenerationContext(user_id, jwt_token, story_id)
     
     story = state.get("story_data")
     model = state.get("model")
@@ -284,42 +440,24 @@ def image_generation_node(state: StoryState):
         logger.error("No story_data in state")
         return {"final_output": None}
     
-    # Cover image
-    logger.info("Generating cover image...")
     lang = state.get("language", "en") or "en"
-    cover_text = f"Book cover for: {story.title}\n\nChapters: {', '.join(c.title for c in story.chapters)}"
+    jobs = plan_image_jobs(story, character_descriptions, lang, image_style_context, task_id)
+    _report_progress(state, "generating_images", story=story.model_dump(), images_total=len(jobs))
 
-    # Build a verbatim character block for the cover (all characters)
-    cover_char_block = ""
-    if character_descriptions:
-        cover_char_block = (
-            "CHARACTER CONSISTENCY (All characters MUST match these exact descriptions):\n"
-            f"{character_descriptions}"
-        )
+    def render(job: dict) -> str:
+        url = render_image_job(job, context, lang, image_style_context, model, task_id)
+        _report_progress(state, "generating_images", image={"index": job["index"], "url": url})
+        return url
 
-    cover_prompt = make_image_prompt(
-        cover_text, lang=lang, style_context=image_style_context or None,
-        character_block=cover_char_block or None,
-    )
-    story.cover_image_url = generate_image(cover_prompt, image_type="cover", model=model)
-    logger.info("Cover image URL (Supabase): %s", story.cover_image_url)
+    # Cover and chapters run concurrently; map() keeps results in job order
+    max_workers = min(IMAGE_CONCURRENCY, len(jobs))
+    logger.info(f"Generating {len(jobs)} images (cover + {len(story.chapters)} chapters), concurrency={max_workers}...")
+    from langchain_core.runnables.config import ContextThreadPoolExecutor
 
-    # Chapter images
-    logger.info(f"Generating {len(story.chapters)} chapter images...")
-    for idx, chapter in enumerate(story.chapters, 1):
-        logger.info(f"Chapter {idx}: {chapter.title}")
-        chapter_text = f"{chapter.title}\n\n{chapter.content[:1500]}"
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        urls = list(executor.map(render, jobs))
 
-        # Build verbatim character block (only characters in this chapter)
-        chapter_char_block = _build_chapter_character_block(character_descriptions or "", chapter_text)
-        chapter_prompt = make_image_prompt(
-            chapter_text,
-            lang=lang,
-            style_context=image_style_context or None,
-            character_block=chapter_char_block or None,
-        )
-        chapter.image_url = generate_image(chapter_prompt, image_type="chapter", model=model)
-        logger.info("Chapter %d image URL (Supabase): %s", idx, chapter.image_url)
+    apply_image_urls(story, urls)
     
     final_output = story.model_dump()
     final_output["story_id"] = story_id
@@ -328,25 +466,76 @@ def image_generation_node(state: StoryState):
     final_output["metadata"] = story.metadata
     
     logger.info("All images generated and uploaded to Supabase Storage")
-    return {"final_output": final_output}
+    return {"final_output": final_output, "story_data": story}
+
+
+def apply_image_urls(story: Story, urls: list[str]) -> Story:
+    """Set the cover URL (first entry) and chapter URLs (the rest, in chapter order)."""
+    story.cover_image_url = urls[0]
+    logger.info("Cover image URL (Supabase): %s", story.cover_image_url)
+    for idx, (chapter, url) in enumerate(zip(story.chapters, urls[1:]), 1):
+        chapter.image_url = url
+        logger.info("Chapter %d image URL (Supabase): %s", idx, chapter.image_url)
+    return story
 
 # ============================================================================
 # WORKFLOW GRAPH
 # ============================================================================
-logger.info("Building workflow graph...")
-workflow = StateGraph(StoryState)
+def _checkpointed(name: str, node):
+    """Wrap a graph node so its output is saved per run and replayed on retry.
+
+    Runs without ``task_id`` in state (tests, local scripts) skip the store.
+    """
+    checkpoint_key = f"node:{name}"
+
+    def wrapper(state: StoryState):
+        task_id = state.get("task_id")
+        if not task_id:
+            return node(state)
+
+        checkpoints = get_checkpoint_store()
+        saved = checkpoints.get(task_id, checkpoint_key)
+        if saved is not None:
+            logger.info(f"Node {name}: resuming from checkpoint")
+            if saved.get("story_data") is not None:
+                saved["story_data"] = Story.model_validate(saved["story_data"])
+            return saved
+
+        update = node(state)
+        encoded = dict(update or {})
+        if isinstance(encoded.get("story_data"), Story):
+            encoded["story_data"] = encoded["story_data"].model_dump()
+        checkpoints.save(task_id, checkpoint_key, encoded)
+        return update
+
+    wrapper.__name__ = getattr(node, "__name__", name)
+    return wrapper
+
+# Checkpointed text steps, shared by the graph and the Celery canvas pipeline
+generate_story_step = _checkpointed("generate_story", story_generation_node)
+extract_characters_step = _checkpointed("extract_characters", character_extraction_node)
+
+def _build_graph():
+    from langgraph.graph import StateGraph, START, END
+
+    logger.info("Building workflow graph...")
+    workflow = StateGraph(StoryState)
+
+    workflow.add_node("generate_story", generate_story_step)
+    workflow.add_node("extract_characters", extract_characters_step)
+    workflow.add_node("generate_images", _checkpointed("generate_images", image_generation_node))
 
-workflow.add_node("generate_story", story_generation_node)
-workflow.add_node("extract_characters", character_extraction_node)
-workflow.add_node("generate_images", image_generation_node)
+    workflow.add_edge(START, "generate_story")
+    workflow.add_edge("generate_story", "extract_characters")
+    workflow.add_edge("extract_characters", "generate_images")
+    workflow.add_edge("generate_images", END)
 
-workflow.add_edge(START, "generate_story")
-workflow.add_edge("generate_story", "extract_characters")
-workflow.add_edge("extract_characters", "generate_images")
-workflow.add_edge("generate_images", END)
+    graph = workflow.compile()
+    logger.info("Workflow compiled")
+    return graph
 
-graph = workflow.compile()
-logger.info("Workflow compiled")
+# Compiled on first use (or by the worker warm-up); importing this module stays cheap
+get_graph = clients.register("story_graph", _build_graph)
 
 # ============================================================================
 # EXECUTION (TEST)
@@ -355,7 +544,7 @@ if __name__ == "__main__":
     logger.info("Starting workflow...")
     
     try:
-        result = graph.invoke({
+        result = get_graph().invoke({
             "messages": [{"role": "user", "content": "Write a sci-fi story about dragons in space."}],
             "user_id": "test_user",
             "jwt_token": None
@@ -2,30 +2,38 @@ import os
 import json
 import logging
 import base64
+import hashlib
 import uuid
+import threading
 import requests
-import boto3
-from typing import List
-from botocore.client import Config
-from openai import OpenAI
+import redis
+from typing import Callable, List
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from api.services import clients, image_spool
+from api.services.cache import CacheBackend, InMemoryLRUCache, RedisCache
+
 # Setup
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 from langsmith import traceable
-from langsmith.wrappers import wrap_openai
 
-# Cargar API keys
-openai_key = os.getenv("OPENAI_API_KEY")
-if not openai_key:
-    raise EnvironmentError("OPENAI_API_KEY not found. Set it in your .env file.")
 
-client = wrap_openai(OpenAI(api_key=openai_key))
+def _build_openai_client():
+    from openai import OpenAI
+    from langsmith.wrappers import wrap_openai
+
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if not openai_key:
+        raise EnvironmentError("OPENAI_API_KEY not found. Set it in your .env file.")
+    return wrap_openai(OpenAI(api_key=openai_key))
+
+# Se construye en el primer uso (ver api/services/clients.py), no al importar el módulo
+get_openai_client = clients.register("openai", _build_openai_client)
 
 # ============================================================================
 # SUPABASE S3 STORAGE CONFIGURATION
@@ -35,59 +43,59 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_S3_ENDPOINT = f"https://{SUPABASE_PROJECT_REF}.storage.supabase.co/storage/v1/s3"
 SUPABASE_S3_REGION = "eu-central-1"
 STORAGE_BUCKET_NAME = os.getenv("STORAGE_BUCKET_NAME", "cuentee_images")
+STORAGE_PUBLIC_URL_PREFIX = f"https://{SUPABASE_PROJECT_REF}.supabase.co/storage/v1/object/public/{STORAGE_BUCKET_NAME}/"
 
-if not SUPABASE_ANON_KEY:
-    raise EnvironmentError("SUPABASE_ANON_KEY not found. Set it in your .env file.")
+class GenerationContext:
+    """Per-run state for one story generation: owner, story id, JWT and S3 client.
 
-# Global variable para almacenar el contexto del usuario actual y cliente S3 cacheado
-_current_jwt_token = None
-_current_user_id = None
-_current_story_id = None
-_cached_s3_client = None
-_cached_client_token = None
+    Each run gets its own instance, so several stories can be generated
+    concurrently in the same process without sharing upload state.
+    """
+    def __init__(self, user_id: str, jwt_token: str, story_id: str = None):
+        self.user_id = user_id
+        self.jwt_token = jwt_token
+        self.story_id = story_id or str(uuid.uuid4())
+        self._s3_client = None
+        self._chapter_counter = 0
+        self._lock = threading.Lock()
+        logger.info(f"Generation context created: user_id={user_id}, story_id={self.story_id}")
 
-def set_user_context(user_id: str, jwt_token: str, story_id: str = None):
-    """Set user context for S3 uploads and reset cache if token changes"""
-    global _current_jwt_token, _current_user_id, _current_story_id, _cached_s3_client, _cached_client_token
-    
-    if _current_jwt_token != jwt_token:
-        _cached_s3_client = None # Invalidate cache if token changes
-        
-    _current_jwt_token = jwt_token
-    _current_user_id = user_id
-    _current_story_id = story_id or str(uuid.uuid4())
-    logger.info(f"User context set: user_id={user_id}, story_id={_current_story_id}")
-
-def get_s3_client():
-    """Create or retrieve S3 client authenticated with user's JWT token."""
-    global _cached_s3_client, _cached_client_token
-    
-    if not SUPABASE_ANON_KEY:
-        raise EnvironmentError("SUPABASE_ANON_KEY not configured")
-    
-    if not _current_jwt_token:
-        raise EnvironmentError("JWT token not set. Call set_user_context() first.")
-    
-    # Return cached client if token hasn't changed
-    if _cached_s3_client and _cached_client_token == _current_jwt_token:
-        return _cached_s3_client
-    
-    logger.info(f"Creating new S3 client for user: {_current_user_id}")
-    
-    _cached_s3_client = boto3.client(
-        's3',
-        endpoint_url=SUPABASE_S3_ENDPOINT,
-        aws_access_key_id=SUPABASE_PROJECT_REF,
-        aws_secret_access_key=SUPABASE_ANON_KEY,
-        aws_session_token=_current_jwt_token,  # JWT del usuario autenticado
-        region_name=SUPABASE_S3_REGION,
-        config=Config(signature_version='s3v4')
-    )
-    _cached_client_token = _current_jwt_token
-    
-    return _cached_s3_client
+    def get_s3_client(self):
+        """Create or retrieve the S3 client authenticated with this run's JWT token."""
+        if not self.jwt_token:
+            raise EnvironmentError("JWT token not set in generation context.")
+        if not SUPABASE_ANON_KEY:
+            raise EnvironmentError("SUPABASE_ANON_KEY not found. Set it in your .env file.")
+
+        with self._lock:
+            if self._s3_client is None:
+                import boto3
+                from botocore.client import Config
+
+                logger.info(f"Creating new S3 client for user: {self.user_id}")
+                # boto3's default session is not thread-safe, so each run builds its own
+                self._s3_client = boto3.session.Session().client(
+                    's3',
+                    endpoint_url=SUPABASE_S3_ENDPOINT,
+                    aws_access_key_id=SUPABASE_PROJECT_REF,
+                    aws_secret_access_key=SUPABASE_ANON_KEY,
+                    aws_session_token=self.jwt_token,  # JWT del usuario autenticado
+                    region_name=SUPABASE_S3_REGION,
+                    config=Config(signature_version='s3v4')
+                )
+            return self._s3_client
+
+    def next_chapter_index(self) -> int:
+        """Return the next sequential chapter number for images without an explicit index."""
+        with self._lock:
+            self._chapter_counter += 1
+            return self._chapter_counter
+
+def public_url_for(object_key: str) -> str:
+    """Public Supabase Storage URL for an object key in the images bucket."""
+    return f"{STORAGE_PUBLIC_URL_PREFIX}{object_key}"
 
-def upload_image_bytes_to_supabase(image_data: bytes, image_type: str) -> str:
+def upload_image_bytes_to_supabase(image_data: bytes, image_type: str, context: GenerationContext | None) -> str:
     """Upload raw image bytes to Supabase Storage and attach to LangSmith."""
     try:
         from langsmith import get_current_run
@@ -97,18 +105,18 @@ def upload_image_bytes_to_supabase(image_data: bytes, image_type: str) -> str:
     except Exception as e:
         logger.warning(f"Failed to attach image to LangSmith: {e}")
 
-    if not _current_user_id or not _current_jwt_token:
-        logger.error("User context not set. Cannot upload to Supabase.")
+    if not context or not context.user_id or not context.jwt_token:
+        logger.error("Generation context not set. Cannot upload to Supabase.")
         return ""
     
     try:
         file_extension = "png"
         unique_id = str(uuid.uuid4())[:8]
-        filename = f"{_current_user_id}/{_current_story_id}/{image_type}_{unique_id}.{file_extension}"
+        filename = f"{context.user_id}/{context.story_id}/{image_type}_{unique_id}.{file_extension}"
         
         logger.info(f"Uploading to Supabase Storage: {STORAGE_BUCKET_NAME}/{filename}")
         
-        s3_client = get_s3_client()
+        s3_client = context.get_s3_client()
         s3_client.put_object(
             Bucket=STORAGE_BUCKET_NAME,
             Key=filename,
@@ -116,7 +124,9 @@ def upload_image_bytes_to_supabase(image_data: bytes, image_type: str) -> str:
             ContentType='image/png'
         )
         
-        public_url = f"https://{SUPABASE_PROJECT_REF}.supabase.co/storage/v1/object/public/{STORAGE_BUCKET_NAME}/{filename}"
+        public_url = public_url_for(filename)
+        # The PDF stage reads these bytes from the spool instead of downloading them again
+        image_spool.put(public_url, image_data)
         
         logger.info(f"✓ Image uploaded to Supabase Storage: {public_url}")
         return public_url
@@ -125,7 +135,21 @@ def upload_image_bytes_to_supabase(image_data: bytes, image_type: str) -> str:
         logger.exception(f"Error uploading to Supabase Storage: {e}")
         return ""
 
-def upload_to_supabase_storage(image_url: str, image_type: str) -> str:
+def copy_cached_image(object_key: str, image_type: str, context: GenerationContext | None) -> str:
+    """
+    Copy a cached image into this run's prefix (``{user_id}/{story_id}/``) and spool it.
+    Every story owns its images, so deleting one story never breaks another that hit the
+    same cache entry. Returns "" when the cached object can no longer be read.
+    """
+    try:
+        response = requests.get(public_url_for(object_key), timeout=30)
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Cached image {object_key} unavailable, regenerating: {e}")
+        return ""
+    return upload_image_bytes_to_supabase(response.content, image_type, context)
+
+def upload_to_supabase_storage(image_url: str, image_type: str, context: GenerationContext | None) -> str:
     """Download image from URL and upload to Supabase Storage using user's JWT."""
     if not image_url:
         logger.warning("Empty image_url provided")
@@ -138,7 +162,7 @@ def upload_to_supabase_storage(image_url: str, image_type: str) -> str:
         image_data = response.content
         logger.info(f"Image downloaded, size: {len(image_data)} bytes")
         
-        public_url = upload_image_bytes_to_supabase(image_data, image_type)
+        public_url = upload_image_bytes_to_supabase(image_data, image_type, context)
         return public_url if public_url else image_url
         
     except Exception as e:
@@ -162,6 +186,13 @@ class Story(BaseModel):
     story_type: str = Field(default="open", description="Type of story: open or guided")
     metadata: dict = Field(default_factory=dict, description="Metadata parameters used to build the story")
 
+class ScenePrompt(BaseModel):
+    index: int = Field(description="Scene index: 0 for the cover, 1..N for chapters")
+    prompt: str = Field(description="Image prompt for this scene")
+
+class ScenePromptBatch(BaseModel):
+    prompts: List[ScenePrompt] = Field(description="One image prompt per scene")
+
 class StoryState(TypedDict):
     messages: list
     story_data: Story | None
@@ -175,6 +206,8 @@ class StoryState(TypedDict):
     story_type: str | None
     metadata: dict | None
     language: str | None
+    task_id: str | None
+    on_progress: Callable | None
 
 # ============================================================================
 # IMAGE GENERATION LOGIC
@@ -195,11 +228,44 @@ GPT_IMAGE_MODELS = {
 }
 DEFAULT_IMAGE_MODEL = os.getenv("IMAGE_MODEL", "gpt-image-2-2026-04-21").strip().lower()
 SELECTED_IMAGE_MODEL = IMAGE_MODELS.get(DEFAULT_IMAGE_MODEL, "gpt-image-2-2026-04-21")
-_image_counter = {"cover": 0, "chapter": 0}
+
+# Content-addressed cache: hash(model, prompt, size, quality) -> stored object key
+IMAGE_CACHE_BACKEND = os.getenv("IMAGE_CACHE_BACKEND", "memory").strip().lower()  # memory | redis | off
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "512"))
+IMAGE_CACHE_TTL_SECONDS = int(os.getenv("IMAGE_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 30)))
+
+def _build_image_cache() -> CacheBackend | None:
+    if IMAGE_CACHE_BACKEND == "off":
+        return None
+    redis_url = os.getenv("REDIS_URL")
+    if IMAGE_CACHE_BACKEND == "redis" and redis_url:
+        return RedisCache(redis.from_url(redis_url), prefix="image-cache", ttl=IMAGE_CACHE_TTL_SECONDS)
+    if IMAGE_CACHE_BACKEND == "redis":
+        logger.warning("IMAGE_CACHE_BACKEND=redis but REDIS_URL not set; using in-memory image cache.")
+    return InMemoryLRUCache(maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL_SECONDS)
+
+image_cache = _build_image_cache()
+
+def image_cache_key(model: str, prompt: str, size: str, quality: str | None) -> str:
+    """Stable content hash of everything that determines the rendered image."""
+    payload = json.dumps([model, prompt, size, quality], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 @traceable(run_type="tool", name="image_generation")
-def generate_image(prompt: str, model: str = None, image_type: str = "image") -> str:
-    """Generate image using OpenAI and upload to Supabase."""
+def generate_image(
+    prompt: str,
+    model: str = None,
+    image_type: str = "image",
+    index: int | None = None,
+    context: GenerationContext | None = None,
+) -> str:
+    """Generate image using OpenAI and upload to Supabase.
+
+    ``index`` pins the chapter number used in the storage key, so images
+    rendered concurrently keep their chapter order. ``context`` carries the
+    per-run owner, story id and storage client used for the upload.
+    """
     model_name = IMAGE_MODELS.get((model or SELECTED_IMAGE_MODEL).lower(), SELECTED_IMAGE_MODEL)
     logger.info(f"Generating image with {model_name}, prompt length: {len(prompt)}")
     
@@ -219,8 +285,25 @@ def generate_image(prompt: str, model: str = None, image_type: str = "image") ->
         
         if model_name == "dall-e-3":
             params["style"] = "vivid"
+
+        if image_type == "cover":
+            storage_type = "cover"
+        elif index is not None:
+            storage_type = f"chapter_{index}"
+        elif context:
+            storage_type = f"chapter_{context.next_chapter_index()}"
+        else:
+            storage_type = "chapter"
+
+        cache_key = image_cache_key(model_name, prompt, params["size"], params.get("quality"))
+        cached = image_cache.get(cache_key) if image_cache is not None else None
+        if cached:
+            logger.info(f"✓ Image cache hit ({image_cache.stats()}): {cached['object_key']}")
+            image_url = copy_cached_image(cached["object_key"], storage_type, context)
+            if image_url:
+                return image_url
         
-        response = client.images.generate(**params)
+        response = get_openai_client().images.generate(**params)
         
         # Logging response debug
         try:
@@ -231,12 +314,6 @@ def generate_image(prompt: str, model: str = None, image_type: str = "image") ->
             logger.info(f" [DEBUG] Raw Image Response for: {model_name}: {first_item_dict if response.data else 'No data'}")
         except:
             pass
-
-        if image_type == "cover":
-            storage_type = "cover"
-        else:
-            _image_counter["chapter"] += 1
-            storage_type = f"chapter_{_image_counter['chapter']}"
         
         if is_base64_model:
             first_item = response.data[0]
@@ -246,18 +323,23 @@ def generate_image(prompt: str, model: str = None, image_type: str = "image") ->
                 logger.warning(f"No b64_json in response for {model_name}. Checks if url exists.")
                 if hasattr(first_item, 'url') and first_item.url:
                      logger.info("✓ Found URL instead of b64_json, switching method.")
-                     return upload_to_supabase_storage(first_item.url, storage_type)
-                
-                logger.error("No image data (b64 or url) found in response.")
-                return ""
-            
-            logger.info("✓ OpenAI generated image (base64)")
-            image_data = base64.b64decode(b64_data)
-            return upload_image_bytes_to_supabase(image_data, storage_type)
+                     image_url = upload_to_supabase_storage(first_item.url, storage_type, context)
+                else:
+                    logger.error("No image data (b64 or url) found in response.")
+                    return ""
+            else:
+                logger.info("✓ OpenAI generated image (base64)")
+                image_data = base64.b64decode(b64_data)
+                image_url = upload_image_bytes_to_supabase(image_data, storage_type, context)
         else:
             openai_url = response.data[0].url
             logger.info(f"✓ OpenAI generated image: {openai_url[:80]}...")
-            return upload_to_supabase_storage(openai_url, storage_type)
+            image_url = upload_to_supabase_storage(openai_url, storage_type, context)
+
+        # Only cache images persisted in our bucket (OpenAI URLs expire)
+        if image_cache is not None and image_url.startswith(STORAGE_PUBLIC_URL_PREFIX):
+            image_cache.set(cache_key, {"object_key": image_url[len(STORAGE_PUBLIC_URL_PREFIX):]})
+        return image_url
             
     except Exception as e:
         logger.error(f"Error generating image: {e}")
@@ -1,7 +1,10 @@
 import os
 import logging
 from celery import Celery
-from celery.signals import worker_ready, after_setup_logger
+from celery.schedules import crontab
+from celery.signals import worker_ready, worker_init, worker_process_init, after_setup_logger
+
+from api.celery_tasks.routing import TASK_QUEUES, DEFAULT_QUEUE, PDF_QUEUE, route_task
 
 # Configuración de Redis
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -22,10 +25,34 @@ if "@" in REDIS_URL:
 
 logger = logging.getLogger(__name__)
 
+# Story tasks spend almost all their time waiting on Groq/OpenAI/Supabase, so the default
+# pool runs many of them per process: "threads" (or "gevent", which needs `pip install gevent`).
+# "solo"/"prefork" keep the old one-story-at-a-time behaviour.
+# A worker that only consumes the PDF queue (CELERY_WORKER_QUEUES=pdf) does CPU-bound work instead:
+# it defaults to one prefork process per core, each reserving a single render at a time.
+WORKER_QUEUES = [q.strip() for q in os.getenv("CELERY_WORKER_QUEUES", "").split(",") if q.strip()]
+PDF_ONLY_WORKER = WORKER_QUEUES == [PDF_QUEUE]
+WORKER_POOL = os.getenv("CELERY_WORKER_POOL", "prefork" if PDF_ONLY_WORKER else "threads").strip().lower()
+if PDF_ONLY_WORKER:
+    _default_concurrency = str(os.cpu_count() or 1)
+else:
+    _default_concurrency = "1" if WORKER_POOL in ("solo", "prefork") else "16"
+WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", _default_concurrency))
+# Renders are long and uneven: prefetching more than one per process lets a busy process hold
+# PDFs an idle one could start. Story workers keep Celery's default.
+WORKER_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_WORKER_PREFETCH_MULTIPLIER", "1" if PDF_ONLY_WORKER else "4"))
+# Every in-flight story publishes PROGRESS and reads/writes checkpoints, so Redis connections scale with concurrency
+REDIS_MAX_CONNECTIONS = max(2, WORKER_CONCURRENCY + 2)
+# Precarga de assets antes del fork y de clientes en cada hijo (ver warmup.py)
+WORKER_WARMUP = os.getenv("CELERY_WORKER_WARMUP", "true").strip().lower() == "true"
+# Hora (UTC) del refill diario del plan plus; lo dispara un único proceso `celery beat`
+PLUS_REFILL_HOUR = int(os.getenv("PLUS_REFILL_HOUR", "3"))
+
 celery_app = Celery(
     "story_tasks",
     broker=REDIS_URL,
-    backend=REDIS_URL
+    backend=REDIS_URL,
+    include=["api.celery_tasks.tasks", "api.celery_tasks.canvas", "api.celery_tasks.maintenance"],
 )
 
 @after_setup_logger.connect
@@ -42,17 +69,52 @@ def at_start(sender, **kwargs):
     except Exception as e:
         logger.error(f"Failed to establish initial connection in worker_ready: {e}")
 
+@worker_init.connect
+def preload_worker(sender=None, **kwargs):
+    """Runs in the main worker process before the pool starts (i.e. before prefork children exist)."""
+    if not WORKER_WARMUP:
+        return
+    from api.celery_tasks.warmup import open_client_pools, preload_shared_assets
+
+    preload_shared_assets()
+    # `--pool` on the command line wins over CELERY_WORKER_POOL
+    pool_cls = getattr(sender, "pool_cls", None) or WORKER_POOL
+    if "prefork" not in (pool_cls if isinstance(pool_cls, str) else pool_cls.__module__):
+        # threads/gevent/solo: this process runs the tasks itself
+        open_client_pools()
+
+@worker_process_init.connect
+def warm_worker_child(**kwargs):
+    """Runs in every prefork child right after the fork, including recycled ones."""
+    if not WORKER_WARMUP:
+        return
+    from api.celery_tasks.warmup import open_client_pools
+
+    open_client_pools()
+
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     timezone="UTC",
     enable_utc=True,
     broker_pool_limit=1,
-    worker_concurrency=1,
+    worker_pool=WORKER_POOL,
+    worker_concurrency=WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=WORKER_PREFETCH_MULTIPLIER,
     result_serializer="json",
     result_expires=3600,
-    result_backend_transport_options={"max_connections": 2},
+    result_backend_transport_options={"max_connections": REDIS_MAX_CONNECTIONS},
     broker_connection_retry_on_startup=True,
-    broker_transport_options={"max_connections": 2},
-    worker_max_tasks_per_child=50, # Recycle worker after 50 tasks to release memory
+    broker_transport_options={"max_connections": REDIS_MAX_CONNECTIONS},
+    worker_max_tasks_per_child=50, # Recycle worker after 50 tasks to release memory (prefork only)
+    # Plan- and stage-based queues (see routing.py); workers pick theirs with CELERY_WORKER_QUEUES
+    task_queues=TASK_QUEUES,
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes=(route_task,),
+    beat_schedule={
+        "refill-plus-credits": {
+            "task": "refill_plus_credits_task",
+            "schedule": crontab(minute=0, hour=PLUS_REFILL_HOUR),
+        },
+    },
 )
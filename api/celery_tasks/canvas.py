@@ -0,0 +1,215 @@
+"""
+Celery canvas version of the story pipeline (STORY_PIPELINE=canvas).
+
+    story_text_task -> extract_characters_task -> story_images_task
+        -> chord(chapter_image_task per cover/chapter) -> join_images_task
+        -> render_pdf_task -> persist_story_task
+
+render_pdf_task is only part of the chain with PDF_RENDER_MODE=inline (the default);
+otherwise the story is persisted (and returned) first and render_story_pdf_task follows.
+
+Every task receives and returns a JSON ``run`` dict. The image tasks of one
+story can run on any available worker; their results are joined before the
+PDF stage. Steps reuse the same checkpoints (keyed by the original
+``generate_story_task`` id) as the in-process graph, so retries resume.
+
+The graph pipeline (the default) reuses the last two links through
+``build_postprocessing_chain``. Queues are picked per task by routing.py.
+"""
+import logging
+
+from celery import chain, chord
+
+from api.agents.story_agent import (
+    Story,
+    GenerationContext,
+    apply_image_urls,
+    extract_characters_step,
+    generate_story_step,
+    plan_image_jobs,
+    render_image_job,
+    resolve_story_id,
+)
+from api.celery_tasks.app import celery_app
+from api.celery_tasks.progress import ProgressReporter
+from api.celery_tasks.signatures import send_render_story_pdf_task
+from api.celery_tasks.tasks import PDF_RENDER_MODE, render_and_upload_pdf, save_story_and_commit_credit
+from api.services.checkpoint_store import get_checkpoint_store
+
+logger = logging.getLogger(__name__)
+
+RETRY_COUNTDOWN = 60
+MAX_RETRIES = 3
+
+
+def build_story_canvas(run: dict):
+    """Return the chain that replaces ``generate_story_task`` for one story."""
+    return chain(
+        story_text_task.s(run),
+        extract_characters_task.s(),
+        story_images_task.s(),
+        *([render_pdf_task.s()] if PDF_RENDER_MODE == "inline" else []),
+        persist_story_task.s(),
+    )
+
+
+def build_postprocessing_chain(run: dict):
+    """Return the PDF + persist chain for a ``run`` whose story already has its images.
+
+    The graph pipeline replaces ``generate_story_task`` with it, so the PDF is
+    rendered on the pdf queue rather than in the story worker. Unless
+    PDF_RENDER_MODE is "inline", the chain only persists the story and the
+    PDF is rendered after it (see persist_story_task).
+    """
+    if PDF_RENDER_MODE == "inline":
+        return chain(render_pdf_task.s(run), persist_story_task.s())
+    return chain(persist_story_task.s(run))
+
+
+def _progress(run: dict) -> ProgressReporter:
+    """Reporter that publishes PROGRESS meta on the original task id, from any worker."""
+    task_id = run["task_id"]
+    return ProgressReporter(lambda meta: celery_app.backend.store_result(task_id, meta, "PROGRESS"), story=run.get("story"))
+
+
+def _publish_images_progress(run: dict, images_total: int):
+    """Rebuild the partial story from the checkpointed images and publish it."""
+    saved = get_checkpoint_store().load(run["task_id"])
+    images = {int(key.split(":", 1)[1]): url for key, url in saved.items() if key.startswith("image:") and url}
+    _progress(run).publish_snapshot("generating_images", run.get("story"), images, images_total)
+
+
+def _graph_state(run: dict, progress: ProgressReporter | None = None) -> dict:
+    """Build the StoryState a graph node expects from a canvas run."""
+    story = run.get("story")
+    return {
+        "messages": [{"role": "user", "content": run["topic"]}],
+        "user_id": run["user_id"],
+        "jwt_token": run["jwt_token"],
+        "model": run.get("model"),
+        "image_style_context": run.get("image_style_context"),
+        "num_chapters": run.get("num_chapters"),
+        "story_type": run.get("story_type", "open"),
+        "metadata": run.get("metadata") or {},
+        "language": (run.get("metadata") or {}).get("language"),
+        "story_data": Story.model_validate(story) if story else None,
+        "character_descriptions": run.get("character_descriptions"),
+        "task_id": run["task_id"],
+        "on_progress": progress,
+    }
+
+
+@celery_app.task(bind=True, name="story_text_task")
+def story_text_task(self, run: dict):
+    logger.info(f" [Task {run['task_id']}] Canvas: generating story text...")
+    try:
+        update = generate_story_step(_graph_state(run, _progress(run)))
+        run["story"] = update["story_data"].model_dump()
+        return run
+    except Exception as e:
+        logger.error(f" [Task {run['task_id']}] Story text failed: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN, max_retries=MAX_RETRIES)
+
+
+@celery_app.task(bind=True, name="extract_characters_task")
+def extract_characters_task(self, run: dict):
+    logger.info(f" [Task {run['task_id']}] Canvas: extracting characters...")
+    try:
+        update = extract_characters_step(_graph_state(run, _progress(run)))
+        if update.get("story_data") is not None:
+            run["story"] = update["story_data"].model_dump()
+        run["character_descriptions"] = update.get("character_descriptions")
+        return run
+    except Exception as e:
+        logger.error(f" [Task {run['task_id']}] Character extraction failed: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN, max_retries=MAX_RETRIES)
+
+
+@celery_app.task(bind=True, name="story_images_task")
+def story_images_task(self, run: dict):
+    """Plan the image jobs (one batched prompt call) and replace itself with a chord of per-image tasks."""
+    task_id = run["task_id"]
+    try:
+        story = Story.model_validate(run["story"])
+        run["story_id"] = resolve_story_id(task_id)
+        jobs = plan_image_jobs(
+            story,
+            run.get("character_descriptions"),
+            (run.get("metadata") or {}).get("language") or "en",
+            run.get("image_style_context"),
+            task_id,
+        )
+    except Exception as e:
+        logger.error(f" [Task {task_id}] Image planning failed: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN, max_retries=MAX_RETRIES)
+
+    _publish_images_progress(run, len(jobs))
+    logger.info(f" [Task {task_id}] Canvas: fanning out {len(jobs)} image tasks...")
+
+    # Image tasks keep the story (for progress snapshots) but not the character sheet, already baked into each job
+    image_run = {key: value for key, value in run.items() if key != "character_descriptions"}
+    image_run["images_total"] = len(jobs)
+    header = [chapter_image_task.s(image_run, job) for job in jobs]
+    return self.replace(chord(header, join_images_task.s(run)))
+
+
+@celery_app.task(bind=True, name="chapter_image_task")
+def chapter_image_task(self, run: dict, job: dict):
+    task_id = run["task_id"]
+    try:
+        context = GenerationContext(run["user_id"], run["jwt_token"], run["story_id"])
+        url = render_image_job(
+            job,
+            context,
+            lang=(run.get("metadata") or {}).get("language") or "en",
+            style_context=run.get("image_style_context"),
+            model=run.get("model"),
+            task_id=task_id,
+        )
+    except Exception as e:
+        logger.error(f" [Task {task_id}] Image {job.get('index')} failed: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN, max_retries=MAX_RETRIES)
+
+    _publish_images_progress(run, run.get("images_total"))
+    return {"index": job["index"], "url": url}
+
+
+@celery_app.task(name="join_images_task")
+def join_images_task(results: list[dict], run: dict):
+    """Chord body: put every image URL back on the story in cover/chapter order."""
+    urls = [result["url"] for result in sorted(results, key=lambda result: result["index"])]
+    story = apply_image_urls(Story.model_validate(run["story"]), urls)
+    run["story"] = story.model_dump()
+    logger.info(f" [Task {run['task_id']}] Canvas: all {len(urls)} images joined")
+    return run
+
+
+@celery_app.task(bind=True, name="render_pdf_task")
+def render_pdf_task(self, run: dict):
+    render_and_upload_pdf(run["story"], run["user_id"], run["task_id"], _progress(run))
+    return run
+
+
+@celery_app.task(bind=True, name="persist_story_task")
+def persist_story_task(self, run: dict):
+    """Last link of the chain; it runs under the original task id, so its return value is the task result."""
+    task_id = run["task_id"]
+    story_json = run["story"]
+    try:
+        story_row = save_story_and_commit_credit(
+            story_json, run["user_id"], task_id, run["topic"], run.get("story_type", "open"), run.get("metadata"), _progress(run)
+        )
+    except Exception as e:
+        logger.error(f"🔥 [Task {task_id}] Persist failed: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN, max_retries=MAX_RETRIES)
+
+    if PDF_RENDER_MODE == "background" and story_row and story_row.get("id"):
+        # The story is complete for the user now; the PDF follows on the pdf queue
+        try:
+            send_render_story_pdf_task(story_row["id"])
+        except Exception as e:
+            logger.error(f" [Task {task_id}] Could not enqueue PDF rendering (rendered on first download instead): {e}")
+
+    get_checkpoint_store().clear(task_id)
+    logger.info(f"🏁 [Task {task_id}] FINISHED successfully (canvas). PDF URL: {story_json.get('pdf_url')}")
+    return story_json
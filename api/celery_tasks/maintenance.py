@@ -0,0 +1,40 @@
+"""
+Periodic maintenance tasks. They are scheduled by a single ``celery beat`` process
+(``beat_schedule`` in app.py), not by the API, so they run once per cluster no matter
+how many API replicas or workers are up.
+"""
+import logging
+import os
+
+from api.celery_tasks.app import celery_app
+from api.services.profile_cache import invalidate_profile
+from api.services.supabase_client import get_supabase_admin_client
+
+logger = logging.getLogger(__name__)
+
+PLUS_REFILL_CREDITS = int(os.getenv("PLUS_REFILL_CREDITS", "10"))
+PLUS_REFILL_INTERVAL_DAYS = int(os.getenv("PLUS_REFILL_INTERVAL_DAYS", "30"))
+
+
+@celery_app.task(name="refill_plus_credits_task")
+def refill_plus_credits_task() -> int:
+    """
+    Refills every 'plus' profile that is due in one set-based UPDATE (the
+    `refill_plus_credits` RPC): one round trip regardless of the number of users.
+    The RPC returns the refilled ids, whose cached profiles are dropped so those
+    users see their new credits on their next request.
+    """
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        logger.warning("⚠️ Skipping plus credit refill (Supabase service client not configured).")
+        return 0
+
+    rows = supabase_admin.rpc("refill_plus_credits", {
+        "p_amount": PLUS_REFILL_CREDITS,
+        "p_interval_days": PLUS_REFILL_INTERVAL_DAYS,
+    }).execute().data or []
+    for row in rows:
+        # PostgREST returns SETOF scalars as bare values or as {"refill_plus_credits": value}
+        invalidate_profile(str(next(iter(row.values())) if isinstance(row, dict) else row))
+    logger.info(f"Refilled credits for {len(rows)} plus users.")
+    return len(rows)
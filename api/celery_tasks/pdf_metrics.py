@@ -0,0 +1,97 @@
+"""
+Metrics of the PDF stage, so the CPU-bound PDF workers can be scaled apart from the
+I/O-bound story workers:
+
+    queue depth    messages waiting on each queue, read from the broker
+    render time    wall and CPU seconds of recent renders, recorded by every worker
+
+Render samples are kept in a capped Redis list shared by all workers (in process
+memory when REDIS_URL is not set). ``GET /metrics/pdf`` in the API returns both.
+"""
+import json
+import logging
+import statistics
+import threading
+from collections import deque
+
+import redis
+from kombu.exceptions import ChannelError
+
+from api.celery_tasks.app import celery_app
+from api.celery_tasks.routing import PDF_QUEUE, TASK_QUEUES
+from api.core import config
+from api.services import clients
+
+logger = logging.getLogger(__name__)
+
+RENDER_SAMPLES_KEY = "metrics:pdf-render"
+# Enough recent renders for a stable p95 without the list growing
+RENDER_SAMPLES = 500
+
+_local_samples: deque = deque(maxlen=RENDER_SAMPLES)
+_local_lock = threading.Lock()
+
+
+def _build_redis():
+    return redis.from_url(config.REDIS_URL) if config.REDIS_URL else None
+
+get_metrics_redis = clients.register("metrics_redis", _build_redis)
+
+
+def record_render(seconds: float, cpu_seconds: float, pages: int | None = None) -> None:
+    """Store one render sample. Never raises: metrics must not fail a PDF."""
+    sample = json.dumps({"seconds": round(seconds, 4), "cpu_seconds": round(cpu_seconds, 4), "pages": pages})
+    try:
+        client = get_metrics_redis()
+        if client is None:
+            with _local_lock:
+                _local_samples.appendleft(sample)
+            return
+        pipe = client.pipeline()
+        pipe.lpush(RENDER_SAMPLES_KEY, sample)
+        pipe.ltrim(RENDER_SAMPLES_KEY, 0, RENDER_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record PDF render metrics: {e}")
+
+
+def render_stats() -> dict:
+    """Count, mean, p50 and p95 of wall seconds and mean CPU seconds of the recent renders."""
+    client = get_metrics_redis()
+    if client is None:
+        with _local_lock:
+            raw = list(_local_samples)
+    else:
+        raw = client.lrange(RENDER_SAMPLES_KEY, 0, -1)
+    samples = [json.loads(item) for item in raw]
+    if not samples:
+        return {"count": 0}
+
+    seconds = sorted(sample["seconds"] for sample in samples)
+    return {
+        "count": len(samples),
+        "avg_seconds": round(statistics.fmean(seconds), 3),
+        "p50_seconds": round(statistics.median(seconds), 3),
+        "p95_seconds": round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3),
+        "avg_cpu_seconds": round(statistics.fmean(sample["cpu_seconds"] for sample in samples), 3),
+    }
+
+
+def queue_depths(queues=None) -> dict[str, int]:
+    """Messages waiting (not yet reserved by a worker) per queue; all pipeline queues by default."""
+    names = queues or [queue.name for queue in TASK_QUEUES]
+    depths = {}
+    with celery_app.connection_for_read() as conn:
+        channel = conn.default_channel
+        for name in names:
+            # passive: only inspects the queue, never creates it
+            try:
+                depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+            except ChannelError:
+                # Redis deletes a list once it is empty, so an idle queue is reported as missing
+                depths[name] = 0
+    return depths
+
+
+def pdf_queue_depth() -> int:
+    return queue_depths([PDF_QUEUE])[PDF_QUEUE]
@@ -0,0 +1,86 @@
+import copy
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _count_images(story: dict | None) -> int:
+    if not story:
+        return 0
+    return bool(story.get("cover_image_url")) + sum(bool(c.get("image_url")) for c in story.get("chapters") or [])
+
+
+class ProgressReporter:
+    """
+    Accumulates the partial story of one run and publishes it after every change.
+
+    ``publish`` receives the full meta dict, e.g. ``lambda meta: task.update_state(state="PROGRESS", meta=meta)``.
+    Graph nodes call the reporter through the ``on_progress`` state key; image workers
+    call it from several threads, so updates are serialized with a lock.
+    """
+
+    def __init__(self, publish: Callable[[dict], None], story: dict | None = None):
+        self._publish = publish
+        self._lock = threading.Lock()
+        # A story handed over from an earlier task may already carry its images
+        images = _count_images(story)
+        self._meta = {"stage": "queued", "story": copy.deepcopy(story), "images_done": images, "images_total": images}
+
+    @property
+    def meta(self) -> dict:
+        with self._lock:
+            return copy.deepcopy(self._meta)
+
+    def __call__(self, stage: str, story: dict | None = None, image: dict | None = None, images_total: int | None = None):
+        """
+        Record a stage change and optionally the story text or one finished image.
+
+        ``image`` is ``{"index": 0 for the cover or the chapter number, "url": ...}``.
+        """
+        with self._lock:
+            self._meta["stage"] = stage
+            if story is not None:
+                self._meta["story"] = copy.deepcopy(story)
+            if images_total is not None:
+                self._meta["images_total"] = images_total
+            if image is not None:
+                self._apply_image(image)
+            meta = copy.deepcopy(self._meta)
+
+            try:
+                self._publish(meta)
+            except Exception as e:
+                # Progress is best effort; it must never fail the generation itself
+                logger.warning(f"Failed to publish task progress ({stage}): {e}")
+
+    def publish_snapshot(self, stage: str, story: dict | None, images: dict[int, str], images_total: int | None = None):
+        """
+        Replace the accumulated state with a full snapshot and publish it once.
+
+        Used when updates come from several worker processes (the Celery canvas
+        pipeline): each publisher rebuilds the whole partial story from the
+        checkpoint store instead of merging into meta it cannot see.
+        """
+        with self._lock:
+            self._meta = {"stage": stage, "story": copy.deepcopy(story), "images_done": 0, "images_total": images_total or 0}
+            for index, url in sorted(images.items()):
+                self._apply_image({"index": index, "url": url})
+            meta = copy.deepcopy(self._meta)
+
+            try:
+                self._publish(meta)
+            except Exception as e:
+                logger.warning(f"Failed to publish task progress ({stage}): {e}")
+
+    def _apply_image(self, image: dict):
+        self._meta["images_done"] += 1
+        story = self._meta["story"]
+        if not story:
+            return
+        index, url = image.get("index"), image.get("url")
+        if index == 0:
+            story["cover_image_url"] = url
+        elif index and 0 < index <= len(story.get("chapters") or []):
+            story["chapters"][index - 1]["image_url"] = url
@@ -0,0 +1,63 @@
+"""
+Queue layout for the story pipeline.
+
+Story work is split by the user's plan, so a 'plus' story never waits behind
+the free-tier backlog, and PDF rendering (CPU-bound) gets its own queue so it
+does not hold the I/O-bound story slots:
+
+    stories.plus  -> generate_story_task and the canvas text/image tasks of 'plus' users
+    stories.free  -> the same tasks for every other plan
+    pdf           -> render_pdf_task, render_story_pdf_task
+    celery        -> anything else (default queue)
+
+Which worker consumes which queue is decided at deploy time with
+``CELERY_WORKER_QUEUES`` (see worker_start.sh); by default a worker consumes all of them.
+"""
+import os
+
+from kombu import Queue
+
+STORY_QUEUE_PLUS = os.getenv("STORY_QUEUE_PLUS", "stories.plus")
+STORY_QUEUE_FREE = os.getenv("STORY_QUEUE_FREE", "stories.free")
+PDF_QUEUE = os.getenv("PDF_QUEUE", "pdf")
+DEFAULT_QUEUE = "celery"
+
+# Plans whose stories go to the dedicated queue
+PRIORITY_PLANS = {"plus"}
+
+STORY_TASKS = {
+    "generate_story_task",
+    "story_text_task",
+    "extract_characters_task",
+    "story_images_task",
+    "chapter_image_task",
+    "join_images_task",
+    "persist_story_task",
+}
+PDF_TASKS = {"render_pdf_task", "render_story_pdf_task"}
+
+TASK_QUEUES = tuple(Queue(name) for name in (STORY_QUEUE_PLUS, STORY_QUEUE_FREE, PDF_QUEUE, DEFAULT_QUEUE))
+
+
+def story_queue_for(plan: str | None) -> str:
+    """Return the story queue for a user plan ('plus' -> paid queue, anything else -> free)."""
+    return STORY_QUEUE_PLUS if (plan or "free").lower() in PRIORITY_PLANS else STORY_QUEUE_FREE
+
+
+def _plan_of(args, kwargs) -> str | None:
+    """Find the plan in a task call: the ``plan`` kwarg, or the ``run`` dict canvas tasks pass around."""
+    if kwargs and kwargs.get("plan"):
+        return kwargs["plan"]
+    for arg in args or ():
+        if isinstance(arg, dict) and "task_id" in arg:
+            return arg.get("plan")
+    return None
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery router (``task_routes``): pick the queue from the task stage and the user's plan."""
+    if name in PDF_TASKS:
+        return {"queue": PDF_QUEUE}
+    if name in STORY_TASKS:
+        return {"queue": story_queue_for(_plan_of(args, kwargs))}
+    return None
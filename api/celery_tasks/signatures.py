@@ -0,0 +1,59 @@
+"""
+Lightweight handles on the worker tasks the API enqueues.
+
+The API sends tasks by name through ``celery_app.send_task`` so the web process
+never imports ``api.celery_tasks.tasks`` (and with it LangChain, LangGraph, the
+OpenAI/Groq clients and boto3). The names below are the ones the worker
+registers; ``tasks.py`` uses the same constants in its decorators.
+"""
+from celery import Signature
+from celery.result import AsyncResult
+
+from api.celery_tasks.app import celery_app
+
+GENERATE_STORY_TASK = "generate_story_task"
+REFUND_CREDIT_TASK = "refund_credit_task"
+RENDER_STORY_PDF_TASK = "render_story_pdf_task"
+
+
+def send_generate_story_task(
+    task_id: str,
+    topic: str,
+    user_id: str,
+    jwt_token: str,
+    model: str | None = None,
+    image_style_context: str | None = None,
+    num_chapters: int | None = None,
+    story_type: str = "open",
+    metadata: dict | None = None,
+    plan: str = "free",
+    link_error: Signature | None = None,
+) -> AsyncResult:
+    """Enqueue ``generate_story_task`` under ``task_id``; mirrors its parameters so callers keep keyword checking."""
+    return celery_app.send_task(
+        GENERATE_STORY_TASK,
+        kwargs={
+            "topic": topic,
+            "user_id": user_id,
+            "jwt_token": jwt_token,
+            "model": model,
+            "image_style_context": image_style_context,
+            "num_chapters": num_chapters,
+            "story_type": story_type,
+            "metadata": metadata,
+            "plan": plan,
+        },
+        task_id=task_id,
+        link_error=link_error,
+    )
+
+
+def refund_credit_signature(task_id: str) -> Signature:
+    """Immutable ``refund_credit_task`` errback for the story enqueued as ``task_id``."""
+    return celery_app.signature(REFUND_CREDIT_TASK, args=(task_id,), immutable=True)
+
+
+def send_render_story_pdf_task(story_id: str, task_id: str | None = None, profile: str | None = None) -> AsyncResult:
+    """Enqueue ``render_story_pdf_task`` for a saved story (routed to the pdf queue); ``profile`` defaults to the worker's."""
+    kwargs = {"profile": profile} if profile else {}
+    return celery_app.send_task(RENDER_STORY_PDF_TASK, args=(story_id,), kwargs=kwargs, task_id=task_id)
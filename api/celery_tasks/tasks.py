@@ -3,57 +3,289 @@ import os
 import asyncio
 from asgiref.sync import async_to_sync
 import json
-from api.celery_tasks.app import celery_app
-from api.agents.story_agent import graph, StoryState
-from supabase import create_client
+import time
+from api.celery_tasks.app import celery_app, WORKER_POOL
+from api.agents.story_agent import get_graph, StoryState
+from api.services.checkpoint_store import get_checkpoint_store
+from api.services import image_spool
+from api.services.pdf_cache import PDF_BUCKET, cached_pdf_url, parse_story_content, pdf_path, release_render, resolve_profile, story_content_hash
+from api.celery_tasks.progress import ProgressReporter
+from api.celery_tasks.pdf_metrics import record_render
+from api.celery_tasks.signatures import GENERATE_STORY_TASK, REFUND_CREDIT_TASK, RENDER_STORY_PDF_TASK
+from langsmith import traceable
+from api.services.supabase_client import get_supabase_admin_client
+from api.services.profile_cache import invalidate_profile
 import logging
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# "graph": run the whole LangGraph in this task. "canvas": fan out into a Celery chain/chord (see canvas.py)
+STORY_PIPELINE = os.getenv("STORY_PIPELINE", "graph").strip().lower()
+# When the PDF is rendered. "inline" (default): before the story is saved, so the task result and the
+# stored story carry pdf_url. "background": right after the story is saved, by render_story_pdf_task.
+# "on_demand": on first download only. Both opt-in modes need a client that asks GET /stories/{id}/pdf.
+PDF_RENDER_MODE = os.getenv("PDF_RENDER_MODE", "inline").strip().lower()
+# Render PDFs in pdf_service.get_render_pool() instead of the task's own thread. On by default for
+# threads/gevent workers, whose in-flight stories would otherwise wait on the GIL during layout;
+# a prefork worker (e.g. the PDF-only one) already renders in its own processes.
+PDF_PROCESS_POOL = os.getenv("PDF_PROCESS_POOL", str(WORKER_POOL in ("threads", "gevent"))).strip().lower() == "true"
 
-supabase_admin = None
-if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
-    supabase_admin = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-else:
-    logger.warning("⚠️ SUPABASE CREDENTIALS NOT FOUND. Database operations will fail.")
 
-@celery_app.task(bind=True, name="generate_story_task")
-def generate_story_task(self, topic: str, user_id: str, jwt_token: str, model: str | None = None, image_style_context: str | None = None, num_chapters: int | None = None, story_type: str = "open", metadata: dict = None):
+def build_run_metadata(task_id, topic, user_id, model, image_style_context, num_chapters, story_type, metadata) -> dict:
+    """Normalize metadata for LangSmith filters and the stored story record."""
+    run_metadata = {
+        "agent_name": "story_agent",
+        "story_type": story_type,
+        "topic": topic,
+        "user_id": user_id,
+        "num_chapters": num_chapters,
+        "language": (metadata or {}).get("language", "en"),
+        "model": model or "llama-3.3-70b-versatile",
+        "image_style": bool(image_style_context),
+        "story_id": str(task_id)
+    }
+    if metadata:
+        run_metadata.update(metadata)
+    return run_metadata
+
+
+def _render_pdf(story_output: dict, images: dict[str, bytes], task_id_str: str, profile: str) -> bytes:
+    """Renders the PDF (in the render process pool if PDF_PROCESS_POOL) and records its time."""
+    from api.services.pdf_service import get_render_pool, render_story_pdf
+    started = time.perf_counter()
+    if PDF_PROCESS_POOL:
+        pdf_bytes, cpu_seconds = get_render_pool().submit(render_story_pdf, story_output, images, profile).result()
+    else:
+        pdf_bytes, cpu_seconds = render_story_pdf(story_output, images, profile)
+    seconds = time.perf_counter() - started
+    record_render(seconds, cpu_seconds)
+    logger.info(f" [Task {task_id_str}] PDF rendered in {seconds:.2f}s ({cpu_seconds:.2f}s CPU)")
+    return pdf_bytes
+
+
+@traceable(run_type="chain", name="render_pdf", tags=["postprocessing"])
+def render_and_upload_pdf(story_output: dict, user_id_str: str, task_id_str: str, progress=None, profile: str | None = None) -> str | None:
+    """
+    Renders the story PDF in ``profile`` (PDF_PROFILE by default) and uploads it to the
+    'cuentee_pdfs' bucket, under the hash of the story content (see pdf_cache.py): a
+    version already in storage is reused. Sets `pdf_url`, `pdf_hash` and `pdf_profile`
+    on the story. Failures are logged and return None: a missing PDF never fails the story.
+    """
+    profile = resolve_profile(profile)
+    content_hash = story_content_hash(story_output, profile)
+    checkpoints = get_checkpoint_store()
+    pdf_url = cached_pdf_url(story_output, profile) or checkpoints.get(task_id_str, "pdf_url")
+    if pdf_url:
+        logger.info(f" [Task {task_id_str}] PDF already uploaded for this content: {pdf_url}")
+        story_output.update(pdf_url=pdf_url, pdf_hash=content_hash, pdf_profile=profile)
+        return pdf_url
+
+    pdf_filename = pdf_path(user_id_str, content_hash)
+    try:
+        # Service-role client shared by the whole process (one pooled keep-alive HTTP client)
+        supabase_admin = get_supabase_admin_client()
+        bucket = supabase_admin.storage.from_(PDF_BUCKET) if supabase_admin else None
+
+        if bucket and bucket.exists(pdf_filename):
+            logger.info(f" [Task {task_id_str}] PDF for this content already in storage, skipping render.")
+        else:
+            if progress:
+                progress("rendering_pdf")
+            from api.services.pdf_service import fetch_images, story_image_urls
+            logger.info(f" [Task {task_id_str}] Generando PDF del cuento...")
+            # Images spooled by the image stage on this host are not downloaded again
+            image_urls = story_image_urls(story_output)
+            images = image_spool.load(image_urls)
+            logger.info(f" [Task {task_id_str}] {len(images)}/{len(image_urls)} images taken from the spool")
+            try:
+                # Downloads (I/O) stay here; only the layout goes to the render processes
+                images = fetch_images(image_urls, images)
+                pdf_bytes = _render_pdf(story_output, images, task_id_str, profile)
+            finally:
+                image_spool.discard(image_urls)
+
+            logger.info(f" [Task {task_id_str}] PDF generado. Tipo: {type(pdf_bytes)}, Tamaño: {len(pdf_bytes)} bytes")
+
+            if not bucket:
+                logger.warning(f" [Task {task_id_str}] No se pudo subir PDF (Supabase client missing).")
+                return None
+
+            logger.info(f" [Task {task_id_str}] Subiendo PDF a bucket '{PDF_BUCKET}' como '{pdf_filename}'...")
+            bucket.upload(
+                path=pdf_filename,
+                file=pdf_bytes,
+                file_options={"content-type": "application/pdf", "upsert": "true"}
+            )
+
+        pdf_url = bucket.get_public_url(pdf_filename)
+        logger.info(f" [Task {task_id_str}] PDF subido exitosamente. URL: {pdf_url}")
+        story_output.update(pdf_url=pdf_url, pdf_hash=content_hash, pdf_profile=profile)
+        checkpoints.save(task_id_str, "pdf_url", pdf_url)
+
+    except Exception as pdf_err:
+        logger.error(f" [Task {task_id_str}] ERROR Generando/Subiendo PDF: {pdf_err}", exc_info=True)
+
+    return pdf_url
+
+
+@traceable(run_type="chain", name="save_story", tags=["postprocessing"])
+def save_story_and_commit_credit(story_output: dict, user_id_str: str, task_id_str: str, topic_str: str, story_type_str: str, meta: dict, progress=None) -> dict | None:
+    """
+    Inserts the story row and commits the credit reserved at enqueue time, in one
+    `finalize_story` RPC (one transaction, idempotent per task id).
+    Database errors are raised so the calling task retries.
+    """
+    checkpoints = get_checkpoint_store()
+    db_res = checkpoints.get(task_id_str, "story_row")
+    if db_res:
+        logger.info(f" [Task {task_id_str}] Story already saved on a previous attempt. ID: {db_res.get('id')}")
+        return db_res
+
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        logger.error(f" [Task {task_id_str}] Skipping DB save (Supabase client not initialized)")
+        return None
+
+    if progress:
+        progress("saving")
+    logger.info(f"💾 [Task {task_id_str}] Saving story and committing credit...")
+    try:
+        db_response = supabase_admin.rpc("finalize_story", {
+            "p_task_id": task_id_str,
+            "p_user_id": user_id_str,
+            "p_title": story_output.get("title", "Untitled"),
+            "p_content": json.dumps(story_output),
+            "p_prompt": topic_str,
+            "p_story_type": story_type_str,
+            "p_metadata": meta or {}
+        }).execute()
+    except Exception as db_err:
+        logger.error(f" [Task {task_id_str}] DATABASE ERROR: {str(db_err)}")
+        raise db_err
+
+    db_res = db_response.data or None
+    logger.info(f" [Task {task_id_str}] Story saved to DB. ID: {db_res.get('id') if db_res else 'Unknown'}")
+    checkpoints.save(task_id_str, "story_row", db_res or {"id": None})
+    # Tasks enqueued without a reservation are charged by the RPC itself
+    invalidate_profile(user_id_str)
+    return db_res
+
+
+@celery_app.task(name=REFUND_CREDIT_TASK)
+def refund_credit_task(task_id: str):
+    """
+    Errback of generate_story_task (inherited by its chain/chord): gives back the credit
+    reserved at enqueue once the story has failed for good. Refunds at most once per task id.
+    """
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        logger.error(f" [Task {task_id}] Cannot refund credit (Supabase client not initialized)")
+        return None
+
+    user_id = supabase_admin.rpc("refund_credit", {"p_task_id": task_id}).execute().data
+    if user_id:
+        invalidate_profile(user_id)
+        logger.info(f"↩️ [Task {task_id}] Story failed; credit refunded to user {user_id}.")
+    else:
+        logger.info(f" [Task {task_id}] No reserved credit to refund.")
+    return user_id
+
+
+@celery_app.task(bind=True, name=RENDER_STORY_PDF_TASK)
+def render_story_pdf_task(self, story_id: str, profile: str | None = None) -> dict:
+    """
+    Renders the PDF of a saved story, off the story's critical path: enqueued after the
+    story is saved (PDF_RENDER_MODE=background) or by GET /stories/{id}/pdf, which passes
+    the profile it checks the cache with. Content that already has a PDF in that profile
+    is not rendered again. The URL is written back into the story row.
+    """
+    task_id = self.request.id
+    try:
+        return _render_saved_story_pdf(story_id, task_id, profile)
+    finally:
+        # Once the row has its URL (or the render failed), the endpoint may enqueue again
+        release_render(task_id)
+
+
+def _render_saved_story_pdf(story_id: str, task_id: str, profile: str | None) -> dict:
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        logger.error(f" [Task {task_id}] Cannot render PDF (Supabase client not initialized)")
+        return {"story_id": story_id, "pdf_url": None}
+
+    rows = supabase_admin.table("stories").select("id, user_id, content").eq("id", story_id).limit(1).execute().data
+    if not rows:
+        logger.warning(f" [Task {task_id}] Story {story_id} not found, no PDF rendered.")
+        return {"story_id": story_id, "pdf_url": None}
+
+    story = parse_story_content(rows[0]["content"])
+    if cached_pdf_url(story, profile):
+        return {"story_id": story_id, "pdf_url": story["pdf_url"]}
+
+    pdf_url = render_and_upload_pdf(story, rows[0]["user_id"], task_id, profile=profile)
+    if pdf_url:
+        _save_pdf_link(supabase_admin, story_id, pdf_url, story["pdf_hash"], story["pdf_profile"])
+        logger.info(f"📄 [Task {task_id}] PDF of story {story_id} ready: {pdf_url}")
+    return {"story_id": story_id, "pdf_url": pdf_url}
+
+
+def _save_pdf_link(supabase_admin, story_id: str, pdf_url: str, pdf_hash: str, pdf_profile: str) -> None:
+    """
+    Sets `pdf_url`, `pdf_hash` and `pdf_profile` on the story as it is now, not on the copy
+    read before the render, so an edit saved meanwhile is kept (its PDF is then simply
+    stale by hash).
+    """
+    rows = supabase_admin.table("stories").select("content").eq("id", story_id).limit(1).execute().data
+    if not rows:
+        return
+    content = parse_story_content(rows[0]["content"])
+    content.update(pdf_url=pdf_url, pdf_hash=pdf_hash, pdf_profile=pdf_profile)
+    supabase_admin.table("stories").update({"content": json.dumps(content)}).eq("id", story_id).execute()
+
+
+@celery_app.task(bind=True, name=GENERATE_STORY_TASK)
+def generate_story_task(self, topic: str, user_id: str, jwt_token: str, model: str | None = None, image_style_context: str | None = None, num_chapters: int | None = None, story_type: str = "open", metadata: dict = None, plan: str = "free"):
     task_id = self.request.id
-    logger.info(f" [Task {task_id}] RECEIVED by worker.")
-    logger.info(f" [Task {task_id}] INPUT -> User: {user_id} | Topic: '{topic}' | Model: {model} | Style Context: {bool(image_style_context)} | Chapters: {num_chapters}")
-    
+    logger.info(f" [Task {task_id}] RECEIVED by worker (attempt {self.request.retries + 1}).")
+    logger.info(f" [Task {task_id}] INPUT -> User: {user_id} | Plan: {plan} | Topic: '{topic}' | Model: {model} | Style Context: {bool(image_style_context)} | Chapters: {num_chapters}")
+
+    run_metadata = build_run_metadata(task_id, topic, user_id, model, image_style_context, num_chapters, story_type, metadata)
+    # JSON state handed to the follow-up tasks; "plan" keeps them on this user's queue (see routing.py)
+    run = {
+        "task_id": task_id,
+        "topic": topic,
+        "user_id": user_id,
+        "jwt_token": jwt_token,
+        "model": model,
+        "image_style_context": image_style_context,
+        "num_chapters": num_chapters,
+        "story_type": story_type,
+        "metadata": run_metadata,
+        "plan": plan,
+    }
+
+    if STORY_PIPELINE == "canvas":
+        # The chain's last task inherits this task id, so /tasks/{task_id} still returns the final story
+        from api.celery_tasks.canvas import build_story_canvas
+        logger.info(f" [Task {task_id}] Fanning out into Celery canvas...")
+        return self.replace(build_story_canvas(run))
+
+    # Partial results (stage, story text, each image URL) are exposed as PROGRESS meta on /tasks/{task_id}
+    progress = ProgressReporter(lambda meta: self.update_state(state="PROGRESS", meta=meta))
+
     try:
         # 1. Invocar Workflow
         logger.info(f"🤖 [Task {task_id}] Invoking LangGraph workflow...")
-        
+
         from langchain_core.runnables import RunnableConfig
-        from langsmith import traceable
-        
-        # Normalize metadata for LangSmith filters
-        run_metadata = {
-            "agent_name": "story_agent",
-            "story_type": story_type,
-            "topic": topic,
-            "user_id": user_id,
-            "num_chapters": num_chapters,
-            "language": (metadata or {}).get("language", "en"),
-            "model": model or "llama-3.3-70b-versatile",
-            "image_style": bool(image_style_context),
-            "story_id": str(task_id)
-        }
-        if metadata:
-            run_metadata.update(metadata)
-            
+
         config = RunnableConfig(
             run_name="Story Generation Root",
             metadata=run_metadata
         )
-        
-        result = graph.invoke({
+
+        result = get_graph().invoke({
             "messages": [{"role": "user", "content": topic}],
             "user_id": user_id,
             "jwt_token": jwt_token,
@@ -62,106 +294,34 @@ def generate_story_task(self, topic: str, user_id: str, jwt_token: str, model: s
             "num_chapters": num_chapters,
             "story_type": story_type,
             "metadata": run_metadata,
-            "language": run_metadata.get("language")
+            "language": run_metadata.get("language"),
+            # Retries keep the task id, so finished nodes and images are replayed instead of regenerated
+            "task_id": task_id,
+            "on_progress": progress
         }, config=config)
-        
+
         story_data = result.get("story_data")
-        
+
         if not story_data:
             logger.error(f" [Task {task_id}] Workflow finished but returned NO story_data.")
             raise ValueError("No story data generated")
-            
+
         # Convertir a dict si es modelo Pydantic
         story_json = story_data.dict() if hasattr(story_data, "dict") else story_data
-        
+
         # Log del resultado generado
         title = story_json.get("title", "Untitled")
         chapters = story_json.get("chapters", [])
         logger.info(f" [Task {task_id}] GENERATION SUCCESS -> Title: '{title}' | Chapters: {len(chapters)}")
         logger.info(f" [Task {task_id}] Story Preview: {json.dumps(story_json, indent=2)[:500]}...")
-        
-        @traceable(run_type="chain", name="postprocessing", tags=["postprocessing"])
-        def process_post_generation(story_output, user_id_str, task_id_str, topic_str, story_type_str, meta):
-            pdf_url = None
-            try:
-                from api.services.pdf_service import generate_story_pdf
-                logger.info(f" [Task {task_id_str}] Generando PDF del cuento...")
-                pdf_bytes = generate_story_pdf(story_output)
-                
-                logger.info(f" [Task {task_id_str}] PDF generado. Tipo: {type(pdf_bytes)}, Tamaño: {len(pdf_bytes)} bytes")
-                
-                pdf_filename = f"{user_id_str}/{task_id_str}.pdf"
-                bucket_name = "cuentee_pdfs"
-
-                if supabase_admin:
-                    logger.info(f" [Task {task_id_str}] Subiendo PDF a bucket '{bucket_name}' como '{pdf_filename}'...")
-                    
-                    res = supabase_admin.storage.from_(bucket_name).upload(
-                        path=pdf_filename,
-                        file=pdf_bytes,
-                        file_options={"content-type": "application/pdf", "upsert": "true"}
-                    )
-                    
-                    public_url_resp = supabase_admin.storage.from_(bucket_name).get_public_url(pdf_filename)
-                    pdf_url = public_url_resp
-                    
-                    logger.info(f" [Task {task_id_str}] PDF subido exitosamente. URL: {pdf_url}")
-                    story_output["pdf_url"] = pdf_url
-                else:
-                    logger.warning(f" [Task {task_id_str}] No se pudo subir PDF (Supabase client missing).")
-
-            except Exception as pdf_err:
-                logger.error(f" [Task {task_id_str}] ERROR Generando/Subiendo PDF: {pdf_err}", exc_info=True)
-
-            # 2. Guardar en Base de Datos
-            db_res = None
-            if supabase_admin:
-                logger.info(f"💾 [Task {task_id_str}] Saving to Supabase 'stories' table...")
-                try:
-                    db_response = supabase_admin.table("stories").insert({
-                        "user_id": user_id_str,
-                        "title": story_output.get("title", "Untitled"),
-                        "content": json.dumps(story_output),
-                        "prompt": topic_str,
-                        "story_type": story_type_str,
-                        "metadata": meta or {}
-                    }).execute()
-                    
-                    logger.info(f" [Task {task_id_str}] Story saved to DB. ID: {db_response.data[0].get('id') if db_response.data else 'Unknown'}")
-                    db_res = db_response.data[0] if db_response.data else None
-                    
-                    # 3. Descontar Créditos
-                    logger.info(f" [Task {task_id_str}] Checking user credits...")
-                    resp = supabase_admin.table("profiles").select("credits").eq("id", user_id_str).single().execute()
-                    
-                    if resp.data:
-                        current_credits = resp.data.get("credits", 0)
-                        logger.info(f" [Task {task_id_str}] Current credits: {current_credits}")
-                        
-                        if current_credits > 0:
-                            new_credits = current_credits - 1
-                            supabase_admin.table("profiles").update({"credits": new_credits}).eq("id", user_id_str).execute()
-                            logger.info(f" [Task {task_id_str}] Credits deducted. New balance: {new_credits}")
-                        else:
-                            logger.warning(f" [Task {task_id_str}] User has 0 credits but task ran (Check API validation).")
-                    else:
-                        logger.warning(f" [Task {task_id_str}] User profile not found for credits deduction.")
-                    
-                except Exception as db_err:
-                    logger.error(f" [Task {task_id_str}] DATABASE ERROR: {str(db_err)}")
-                    raise db_err
-            else:
-                logger.error(f" [Task {task_id_str}] Skipping DB save (Supabase client not initialized)")
-            
-            return {"pdf_url": pdf_url, "db_response": db_res}
-
-        # Ejecutar postprocessing
-        post_result = process_post_generation(story_json, user_id, task_id, topic, story_type, run_metadata)
-        
-        logger.info(f"🏁 [Task {task_id}] FINISHED successfully. PDF URL: {post_result.get('pdf_url')}")
-        return story_json
-        
+
     except Exception as e:
         logger.error(f"🔥 [Task {task_id}] CRITICAL FAILURE: {str(e)}", exc_info=True)
         raise self.retry(exc=e, countdown=60, max_retries=3)
 
+    # Postprocessing: the CPU-bound PDF goes to the pdf queue instead of holding this I/O-bound slot.
+    # The chain inherits this task id, so /tasks/{task_id} returns the persisted story.
+    from api.celery_tasks.canvas import build_postprocessing_chain
+    run["story"] = story_json
+    logger.info(f" [Task {task_id}] Handing off PDF rendering and persistence...")
+    return self.replace(build_postprocessing_chain(run))
@@ -0,0 +1,144 @@
+"""
+Worker warm-up, wired to Celery signals in app.py.
+
+Read-only assets (compiled graph, prompt catalogs, PDF background, heavy
+imports) are loaded once in the parent before it forks its pool, so children
+share them copy-on-write. Network clients are built in each child right after
+the fork, because sockets and TLS sessions must not be shared between processes,
+and each pool then opens a connection (TCP + TLS) that the first task reuses.
+Either way, the first story a fresh child runs no longer pays the warm-up.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+
+from api.services import clients
+
+logger = logging.getLogger(__name__)
+
+# Open the Supabase and Redis connections at warm-up, not only build their clients
+WARMUP_CONNECT = os.getenv("CELERY_WORKER_WARMUP_CONNECT", "true").strip().lower() == "true"
+# A slow or unreachable service only delays a child's first task by this much; the pool connects on first use
+WARMUP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("CELERY_WORKER_WARMUP_CONNECT_TIMEOUT", "3"))
+
+# Registered clients that own sockets (see api/services/clients.py): built per process, never before a fork
+NETWORK_CLIENTS = (
+    "supabase_http",
+    "supabase_anon",
+    "supabase_admin",
+    "pdf_http",
+    "metrics_redis",
+    "pdf_lock_redis",
+    "openai",
+    "story_agent",
+    "image_llm",
+    "image_prompt_batch_agent",
+)
+
+# Modules the story code imports lazily; importing them opens no connections, so the parent can
+# do it once for every child
+HEAVY_MODULES = (
+    "api.celery_tasks.tasks",
+    "api.celery_tasks.canvas",
+    "langchain_core.runnables.config",
+    "boto3",
+)
+
+
+def preload_shared_assets() -> None:
+    """Load everything read-only a story needs. Safe to call before forking."""
+    started = time.perf_counter()
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as exc:
+            logger.warning(f"⚠️ Warm-up could not import {module}: {exc}")
+
+    from api.prompts.utils import preload_prompt_catalogs
+    from api.services.pdf_service import preload_assets
+
+    preload_prompt_catalogs()
+    preload_assets()
+    clients.warm_up("story_graph")
+    # Build the network clients once and drop them: that imports and initializes everything they
+    # need (SDKs, LangSmith wrappers, HTTP/2 stack) without sending a request, so no socket is
+    # opened and each child only has to construct the objects again
+    clients.warm_up(*NETWORK_CLIENTS)
+    clients.reset(*NETWORK_CLIENTS)
+    logger.info(f"🔥 Shared worker assets preloaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def _open_supabase() -> None:
+    """One request through the shared httpx pool; any HTTP status means the connection is open."""
+    from api.core import config
+    from api.services.supabase_client import get_http_client
+
+    if config.SUPABASE_URL:
+        get_http_client().head(
+            f"{config.SUPABASE_URL.rstrip('/')}/rest/v1/",
+            headers={"apikey": config.SUPABASE_ANON_KEY or ""},
+            timeout=WARMUP_CONNECT_TIMEOUT_SECONDS,
+        )
+
+
+def _open_redis() -> None:
+    from api.services.checkpoint_store import RedisCheckpointStore, get_checkpoint_store
+
+    store = get_checkpoint_store()
+    pools = [store._client] if isinstance(store, RedisCheckpointStore) else []
+    pools += [clients.get("metrics_redis"), clients.get("pdf_lock_redis")]
+    for client in pools:
+        if client is not None:
+            client.ping()
+
+
+CONNECTIONS = {"supabase": _open_supabase, "redis": _open_redis}
+
+
+def open_connections() -> list[str]:
+    """
+    Opens one connection in each pool, concurrently, waiting at most
+    WARMUP_CONNECT_TIMEOUT_SECONDS. Never raises: returns the pools that failed or
+    did not connect in time.
+    """
+    errors = {}
+
+    def connect(name, opener):
+        try:
+            opener()
+            errors[name] = None
+        except Exception as exc:
+            errors[name] = exc
+
+    # Daemon threads: one stuck on an unreachable host cannot hold the worker back
+    threads = [threading.Thread(target=connect, args=item, daemon=True) for item in CONNECTIONS.items()]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + WARMUP_CONNECT_TIMEOUT_SECONDS
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    failures = []
+    for name in CONNECTIONS:
+        if name not in errors:
+            logger.warning(f"⚠️ Warm-up: {name} did not connect within {WARMUP_CONNECT_TIMEOUT_SECONDS}s")
+            failures.append(name)
+        elif errors[name] is not None:
+            logger.warning(f"⚠️ Warm-up: could not connect to {name}: {errors[name]}")
+            failures.append(name)
+    return failures
+
+
+def open_client_pools() -> None:
+    """Build this process's network clients, dropping any inherited from a parent process, and connect them."""
+    started = time.perf_counter()
+    clients.reset(*NETWORK_CLIENTS)
+    failures = list(clients.warm_up(*NETWORK_CLIENTS))
+    if WARMUP_CONNECT:
+        failures += open_connections()
+    logger.info(
+        f"🔥 Client pools ready in {(time.perf_counter() - started) * 1000:.0f} ms"
+        + (f" (unavailable: {', '.join(failures)})" if failures else "")
+    )
@@ -35,4 +35,10 @@ HTTP_PID=$!
 HOSTNAME=$(hostname)
 echo "Starting Celery worker with hostname: celery@$HOSTNAME"
 
-exec celery -A api.celery_tasks.tasks worker --loglevel=info --pool=solo -n "celery@$HOSTNAME"
\ No newline at end of file
+# El pool y la concurrencia salen de CELERY_WORKER_POOL / CELERY_WORKER_CONCURRENCY (ver app.py)
+# CELERY_WORKER_QUEUES limita las colas que consume este worker (p.ej. "stories.plus" o "pdf"); vacío = todas
+QUEUE_ARGS=()
+if [ -n "$CELERY_WORKER_QUEUES" ]; then
+    QUEUE_ARGS=(-Q "$CELERY_WORKER_QUEUES")
+fi
+exec celery -A api.celery_tasks.tasks worker --loglevel=info "${QUEUE_ARGS[@]}" -n "celery@$HOSTNAME"
\ No newline at end of file
@@ -12,6 +12,16 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# Verificación local de JWT: secreto HS256 del proyecto (legacy) y/o JWKS para claves asimétricas
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL",
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None,
+)
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+JWT_CLAIMS_CACHE_TTL_SECONDS = int(os.getenv("JWT_CLAIMS_CACHE_TTL_SECONDS", "60"))
+JWKS_REFRESH_SECONDS = int(os.getenv("JWKS_REFRESH_SECONDS", "600"))
+
 # Credenciales de Groq
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
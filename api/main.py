@@ -1,13 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-import asyncio
 import redis
-from datetime import datetime, timezone, timedelta
 
 from api.core import config
 from api.routers import stories, tasks, transcription
-from api.services.supabase_client import service_supabase_client
 
 # Configuración del logging
 logging.basicConfig(level=logging.INFO)
@@ -36,37 +33,6 @@ app.include_router(transcription.router, prefix="/transcription", tags=["Transcr
 
 
 
-async def refill_plus_credits():
-    """
-    Tarea en segundo plano que se ejecuta una vez al día para rellenar los créditos
-    de los usuarios con plan 'plus'.
-    """
-    while True:
-        if service_supabase_client:
-            now = datetime.now(timezone.utc)
-            try:
-                resp = (
-                    service_supabase_client.table("profiles")
-                    .select("id, credits, plan, plus_since, last_credited_at")
-                    .eq("plan", "plus")
-                    .execute()
-                )
-                for user in resp.data or []:
-                    last_credited_str = user.get("last_credited_at") or user.get("plus_since")
-                    if last_credited_str:
-                        last_dt = datetime.fromisoformat(str(last_credited_str).replace("Z", "+00:00"))
-                        if now - last_dt >= timedelta(days=30):
-                            new_credits = (user.get("credits") or 0) + 10
-                            service_supabase_client.table("profiles").update(
-                                {"credits": new_credits, "last_credited_at": now.isoformat()}
-                            ).eq("id", user["id"]).execute()
-                            logger.info(f"Refilled credits for user {user['id']}.")
-            except Exception as e:
-                logger.error(f"Error during credit refill task: {e}", exc_info=True)
-
-        # Esperar 24 horas para la siguiente ejecución
-        await asyncio.sleep(60 * 60 * 24)
-
 @app.on_event("startup")
 async def startup_event():
     """
@@ -85,9 +51,7 @@ async def startup_event():
     else:
         logger.warning("⚠️ REDIS_URL not set, Redis health check skipped.")
 
-    # 2. Iniciar la tarea de recarga de créditos en segundo plano
-    logger.info("Starting background task for refilling credits.")
-    asyncio.create_task(refill_plus_credits())
+    # La recarga de créditos del plan plus la programa `celery beat` (ver api/celery_tasks/maintenance.py)
 
 @app.get("/", tags=["Health Check"])
 async def read_root():
@@ -95,3 +59,18 @@ async def read_root():
     Endpoint raíz para verificar que la API está funcionando.
     """
     return {"status": "ok", "message": "Welcome to the StoryBook API!"}
+
+@app.get("/metrics/pdf", tags=["Health Check"])
+def pdf_metrics():
+    """
+    Carga de la etapa de PDF: mensajes en espera por cola y tiempos de los últimos
+    renders. Sirve para escalar los workers de PDF (CPU) aparte de los de cuentos (I/O).
+    """
+    from api.celery_tasks.pdf_metrics import queue_depths, render_stats
+
+    try:
+        depths = queue_depths()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read queue depths: {e}")
+        depths = None
+    return {"queue_depths": depths, "render": render_stats()}
@@ -26,6 +26,18 @@ OBJECTIVE_CHARACTER_EXTRACTION_PROMPT = (
     "- Write descriptions in English regardless of story language."
 )
 
+BATCH_IMAGE_PROMPT_INSTRUCTIONS = (
+    "You will receive a complete story split into numbered scenes. "
+    "Write one image prompt per scene following the guidance above.\n"
+    "Scene 0 is the book cover; scenes 1 to {last_index} are the chapters in order.\n\n"
+    "Respond with a single JSON object and nothing else, in this shape:\n"
+    '{{"prompts": [{{"index": 0, "prompt": "..."}}, {{"index": 1, "prompt": "..."}}]}}\n\n'
+    "Rules:\n"
+    "- Return EXACTLY {num_scenes} entries, one for every index from 0 to {last_index}.\n"
+    "- Each prompt describes only its own scene and must stand alone (no references to other scenes).\n"
+    "- Use the character reference only to understand who appears; do NOT copy it into the prompts."
+)
+
 def get_story_system_prompt(lang: str = "en", num_chapters: int = DEFAULT_NUM_CHAPTERS) -> str:
     prompts = get_localized_prompts(lang)
     sys_prompts = prompts["STORY_SYSTEM_PROMPTS"]
@@ -39,6 +51,10 @@ def get_image_prompt_system(lang: str = "en") -> str:
     prompts = get_localized_prompts(lang)
     return prompts["STORY_SYSTEM_PROMPTS"]["image_system"]
 
+def get_batch_image_prompt_system(lang: str = "en", num_scenes: int = 1) -> str:
+    batch = BATCH_IMAGE_PROMPT_INSTRUCTIONS.format(num_scenes=num_scenes, last_index=num_scenes - 1)
+    return f"{get_image_prompt_system(lang)}\n\n{batch}"
+
 def get_character_extraction_prompt(lang: str = "en") -> str:
     _ = lang
     return OBJECTIVE_CHARACTER_EXTRACTION_PROMPT
@@ -3,6 +3,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_LANGUAGES = ("en", "es", "fr", "pt", "it", "de")
+
+def preload_prompt_catalogs():
+    """Imports every translation module now (worker warm-up) instead of on the first story per language."""
+    for lang in SUPPORTED_LANGUAGES:
+        importlib.import_module(f"api.prompts.translations.{lang}")
+
 def get_localized_prompts(lang: str):
     """
     Loads localized prompts for the given language.
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 import logging
+import uuid
 
-from api.core.dependencies import get_user_with_credits
-from api.services.user_service import UserProfile
-from api.celery_tasks.tasks import generate_story_task
+from api.core.dependencies import get_authenticated_user, get_user_with_credits
+from api.services.pdf_cache import cached_pdf_url, claim_render, parse_story_content, release_render, render_task_id, resolve_profile
+from api.services.user_service import UserProfile, refund_credit, reserve_credit
+from api.celery_tasks.signatures import refund_credit_signature, send_generate_story_task, send_render_story_pdf_task
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -16,10 +18,28 @@ class StoryRequest(BaseModel):
     visual_style: str | None = None
     lang: str | None = "en"
 
+def enqueue_story(user: UserProfile, **task_kwargs) -> dict:
+    """
+    Reserva un crédito y encola la generación con ese mismo task_id.
+    Si la tarea falla definitivamente, el errback `refund_credit_task` devuelve el crédito;
+    si no se puede encolar, se devuelve aquí mismo.
+    """
+    task_id = str(uuid.uuid4())
+    reserve_credit(user, task_id)
+    try:
+        send_generate_story_task(task_id, link_error=refund_credit_signature(task_id), **task_kwargs)
+    except Exception as e:
+        logger.error("Error enqueuing task %s: %s", task_id, e, exc_info=True)
+        refund_credit(user, task_id)
+        raise HTTPException(status_code=503, detail="Service busy or Redis error.")
+    return {"task_id": task_id, "status": "processing"}
+
 # --- Endpoints ---
 
+# Plain def, not async: reserve_credit and send_task block on Supabase and Redis, so FastAPI
+# runs these endpoints in its threadpool instead of on the event loop.
 @router.post("/generate-story-async")
-async def generate_story_async(request: StoryRequest, user: UserProfile = Depends(get_user_with_credits)):
+def generate_story_async(request: StoryRequest, user: UserProfile = Depends(get_user_with_credits)):
     """Inicia la generación de un cuento de forma asíncrona."""
     logger.info("Enqueuing async story generation task for user %s", user.id)
 
@@ -31,25 +51,51 @@ async def generate_story_async(request: StoryRequest, user: UserProfile = Depend
          style_desc = prompts["VISUAL_STYLE_PROMPTS"].get(request.visual_style, request.visual_style)
          image_style_context = f"ARTISTIC DIRECTION (Must follow strictly):\n{style_desc}"
 
+    return enqueue_story(
+        user,
+        topic=request.topic,
+        user_id=str(user.id),
+        jwt_token=user.token,
+        model=None,
+        num_chapters=request.num_chapters,
+        image_style_context=image_style_context,
+        story_type="open",
+        plan=user.plan,
+        metadata={
+            "language": request.lang,
+            "story_length": request.num_chapters,
+            "artistic_style": request.visual_style
+        }
+    )
+
+@router.get("/{story_id}/pdf")
+def get_story_pdf(story_id: str, user: UserProfile = Depends(get_authenticated_user)):
+    """
+    PDF del cuento. Si ya existe para el contenido actual devuelve su URL; si no,
+    encola su render y devuelve el task_id para seguirlo en /tasks/{task_id}.
+    """
+    # Cliente del usuario: RLS decide si puede ver este cuento
+    rows = user.client.table("stories").select("id, content").eq("id", story_id).limit(1).execute().data
+    if not rows:
+        raise HTTPException(status_code=404, detail="Story not found.")
+
+    story = parse_story_content(rows[0]["content"])
+    # El worker renderiza con el perfil con el que se comprueba aquí la caché, aunque el suyo sea otro
+    profile = resolve_profile()
+    pdf_url = cached_pdf_url(story, profile)
+    if pdf_url:
+        return {"status": "ready", "pdf_url": pdf_url}
+
+    # Mismo id para la misma versión; sólo la primera petición encola, las demás siguen ese render
+    task_id = render_task_id(story_id, story, profile)
     try:
-        task = generate_story_task.delay(
-            topic=request.topic,
-            user_id=str(user.id),
-            jwt_token=user.token,
-            model=None,
-            num_chapters=request.num_chapters,
-            image_style_context=image_style_context,
-            story_type="open",
-            metadata={
-                "language": request.lang,
-                "story_length": request.num_chapters,
-                "artistic_style": request.visual_style
-            }
-        )
-        return {"task_id": task.id, "status": "processing"}
+        if claim_render(task_id):
+            send_render_story_pdf_task(story_id, task_id=task_id, profile=profile)
     except Exception as e:
-        logger.error("Error enqueuing task: %s", e, exc_info=True)
+        logger.error("Error enqueuing PDF for story %s: %s", story_id, e, exc_info=True)
+        release_render(task_id)
         raise HTTPException(status_code=503, detail="Service busy or Redis error.")
+    return {"status": "rendering", "task_id": task_id}
 
 # --- Guided Story ---
 
@@ -65,7 +111,7 @@ class GuidedStoryRequest(BaseModel):
 from api.prompts.utils import get_localized_prompts
 
 @router.post("/generate_guided_story_async")
-async def generate_guided_story_async(req: GuidedStoryRequest, user: UserProfile = Depends(get_user_with_credits)):
+def generate_guided_story_async(req: GuidedStoryRequest, user: UserProfile = Depends(get_user_with_credits)):
     """
     Endpoint para generar un cuento guiado asíncrono.
     Configura el prompt basado en las opciones seleccionadas y encola la tarea.
@@ -102,28 +148,25 @@ async def generate_guided_story_async(req: GuidedStoryRequest, user: UserProfile
     logger.info(f"Generated Rich Story Prompt: {story_prompt[:100]}...")
 
     # 5. Encolar la tarea
-    try:
-        task = generate_story_task.delay(
-            topic=story_prompt,
-            user_id=str(user.id),
-            jwt_token=user.token,
-            model=None,
-            image_style_context=image_style_context,
-            num_chapters=req.num_chapters,
-            story_type="guided",
-            metadata={
-                "age_group": req.age_group,
-                "story_length": req.num_chapters,
-                "protagonist_name": protag_name,
-                "protagonist_description": protag_desc,
-                "scientific": True, # Based on endpoint purpose
-                "topic": req.scientific_topic,
-                "mission": req.mission,
-                "visual_style": req.visual_style,
-                "language": req.lang
-            }
-        )
-        return {"task_id": task.id, "status": "processing"}
-    except Exception as e:
-        logger.error("Error enqueuing guided task: %s", e, exc_info=True)
-        raise HTTPException(status_code=503, detail="Service busy or Redis error.")
+    return enqueue_story(
+        user,
+        topic=story_prompt,
+        user_id=str(user.id),
+        jwt_token=user.token,
+        model=None,
+        image_style_context=image_style_context,
+        num_chapters=req.num_chapters,
+        story_type="guided",
+        plan=user.plan,
+        metadata={
+            "age_group": req.age_group,
+            "story_length": req.num_chapters,
+            "protagonist_name": protag_name,
+            "protagonist_description": protag_desc,
+            "scientific": True, # Based on endpoint purpose
+            "topic": req.scientific_topic,
+            "mission": req.mission,
+            "visual_style": req.visual_style,
+            "language": req.lang
+        }
+    )
@@ -1,25 +1,122 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import logging
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from celery import states
 from celery.result import AsyncResult
+import redis.asyncio as aioredis
+
+from api.celery_tasks.app import celery_app, REDIS_URL
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.get("/{task_id}")
-async def get_task_status(task_id: str):
-    """
-    Devuelve el estado y el resultado de una tarea de Celery.
-    """
-    task_result = AsyncResult(task_id)
+# Estados finales: el stream se cierra tras enviarlos
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+# Comentario SSE periódico para que proxies y balanceadores no corten la conexión
+STREAM_KEEPALIVE_SECONDS = 15
+# Tope de duración de un stream; el cliente puede reconectar o volver al polling
+STREAM_MAX_SECONDS = 15 * 60
 
+_redis = None
+
+
+def get_redis():
+    """Async Redis client shared by every open stream (connections come from its pool)."""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+
+def build_task_response(task_id: str, status: str, result) -> dict:
+    """Same payload for polling and streaming: 'progress' while PROGRESS, 'result' on success, 'error' on failure."""
     response = {
         "task_id": task_id,
-        "status": task_result.status,
+        "status": status,
         "result": None,
+        "progress": None,
         "error": None
     }
 
-    if task_result.successful():
-        response["result"] = task_result.result
-    elif task_result.failed():
-        response["error"] = str(task_result.info)  # .info contiene la excepción
+    if status == "PROGRESS":
+        response["progress"] = result
+    elif status == "SUCCESS":
+        response["result"] = result
+    elif status == "FAILURE":
+        response["error"] = str(result)  # result contiene la excepción
 
     return response
+
+
+@router.get("/{task_id}")
+async def get_task_status(task_id: str):
+    """
+    Devuelve el estado y el resultado de una tarea de Celery.
+    Mientras la tarea está en curso (estado PROGRESS), 'progress' contiene la etapa
+    actual y el cuento parcial (texto e imágenes ya generadas).
+    """
+    task_result = AsyncResult(task_id)
+    return build_task_response(task_id, task_result.status, task_result.info)
+
+
+def _sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@router.get("/{task_id}/stream")
+async def stream_task_status(task_id: str, request: Request):
+    """
+    Server-Sent Events con el estado de la tarea: el mismo JSON que GET /tasks/{task_id},
+    enviado en cuanto cambia. El backend Redis de Celery publica cada estado en el canal
+    'celery-task-meta-<task_id>', así que basta con suscribirse; el stream termina en
+    SUCCESS/FAILURE/REVOKED.
+    """
+    channel = celery_app.backend.get_key_for_task(task_id)
+
+    async def events():
+        pubsub = get_redis().pubsub()
+        # Suscribirse antes de leer el estado actual para no perder un cambio entre medias
+        await pubsub.subscribe(channel)
+        try:
+            task_result = AsyncResult(task_id)
+            status, info = await run_in_threadpool(lambda: (task_result.status, task_result.info))
+            yield _sse(build_task_response(task_id, status, info))
+            if status in TERMINAL_STATES:
+                return
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + STREAM_MAX_SECONDS
+            last_sent = loop.time()
+            while loop.time() < deadline:
+                if await request.is_disconnected():
+                    return
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    if loop.time() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                        yield ": keepalive\n\n"
+                        last_sent = loop.time()
+                    continue
+
+                meta = celery_app.backend.decode_result(message["data"])
+                status = meta.get("status")
+                result = meta.get("result")
+                if status in states.EXCEPTION_STATES:
+                    # Igual que AsyncResult.info en el polling: la excepción, no su dict serializado
+                    result = celery_app.backend.exception_to_python(result)
+                yield _sse(build_task_response(task_id, status, result))
+                last_sent = loop.time()
+                if status in TERMINAL_STATES:
+                    return
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,147 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Minimal key/value cache interface with hit/miss counters.
+    Values must be JSON-serializable so every backend behaves the same.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str):
+        value = self._lookup(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class InMemoryLRUCache(CacheBackend):
+    """Thread-safe in-process LRU cache; evicts the least recently used entry past ``maxsize``."""
+
+    def __init__(self, maxsize: int = 512, ttl: int | None = None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float | None, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """Redis-backed cache shared by every process; eviction is left to key TTLs and Redis maxmemory policy."""
+
+    def __init__(self, client: redis.Redis, prefix: str, ttl: int | None = None):
+        super().__init__()
+        self._client = client
+        self._prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
+
+    def _lookup(self, key: str):
+        try:
+            raw = self._client.get(self._key(key))
+        except redis.RedisError as e:
+            logger.warning("Redis cache read failed for %s: %s", self._prefix, e)
+            return None
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        try:
+            self._client.set(self._key(key), json.dumps(value), ex=ttl)
+        except redis.RedisError as e:
+            logger.warning("Redis cache write failed for %s: %s", self._prefix, e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(self._key(key))
+        except redis.RedisError as e:
+            logger.warning("Redis cache delete failed for %s: %s", self._prefix, e)
+
+
+class TieredCache(CacheBackend):
+    """
+    In-process LRU in front of a shared cache (Redis). Reads hit the local tier first;
+    writes and deletes go to both. A delete in another process only reaches the shared
+    tier, so keep the local TTL short when values are invalidated across processes.
+    """
+
+    def __init__(self, local: InMemoryLRUCache, shared: CacheBackend):
+        super().__init__()
+        self.local = local
+        self.shared = shared
+
+    def _lookup(self, key: str):
+        value = self.local._lookup(key)
+        if value is None:
+            value = self.shared._lookup(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value, ttl: int | None = None) -> None:
+        # The local copy never outlives its own (short) TTL, even if the shared entry does
+        self.local.set(key, value, ttl=min(filter(None, (ttl, self.local.ttl)), default=None))
+        self.shared.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        self.shared.delete(key)
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+
+import redis
+
+from api.core import config
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints only need to outlive the Celery retry window (3 retries x 60s countdown)
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(60 * 60 * 24)))
+
+
+class CheckpointStore:
+    """
+    Durable key/value checkpoints for one generation run, keyed by run id (the Celery task id).
+    Values must be JSON-serializable.
+    """
+
+    def load(self, run_id: str) -> dict:
+        raise NotImplementedError
+
+    def get(self, run_id: str, key: str, default=None):
+        return self.load(run_id).get(key, default)
+
+    def save(self, run_id: str, key: str, value) -> None:
+        raise NotImplementedError
+
+    def clear(self, run_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCheckpointStore(CheckpointStore):
+    """Process-local stand-in used when Redis is not configured (only survives retries on the same worker)."""
+
+    def __init__(self):
+        self._runs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self, run_id: str) -> dict:
+        with self._lock:
+            return dict(self._runs.get(run_id, {}))
+
+    def save(self, run_id: str, key: str, value) -> None:
+        # Round-trip through JSON so both backends return identical shapes
+        encoded = json.loads(json.dumps(value))
+        with self._lock:
+            self._runs.setdefault(run_id, {})[key] = encoded
+
+    def clear(self, run_id: str) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+
+class RedisCheckpointStore(CheckpointStore):
+    """Stores each run as a Redis hash (one field per checkpoint) with a sliding TTL."""
+
+    def __init__(self, client: redis.Redis, ttl_seconds: int = CHECKPOINT_TTL_SECONDS, prefix: str = "story-checkpoint"):
+        self._client = client
+        self._ttl = ttl_seconds
+        self._prefix = prefix
+
+    def _key(self, run_id: str) -> str:
+        return f"{self._prefix}:{run_id}"
+
+    def load(self, run_id: str) -> dict:
+        raw = self._client.hgetall(self._key(run_id))
+        return {
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in raw.items()
+        }
+
+    def get(self, run_id: str, key: str, default=None):
+        value = self._client.hget(self._key(run_id), key)
+        return default if value is None else json.loads(value)
+
+    def save(self, run_id: str, key: str, value) -> None:
+        pipe = self._client.pipeline()
+        pipe.hset(self._key(run_id), key, json.dumps(value))
+        pipe.expire(self._key(run_id), self._ttl)
+        pipe.execute()
+
+    def clear(self, run_id: str) -> None:
+        self._client.delete(self._key(run_id))
+
+
+_store: CheckpointStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Returns the process-wide checkpoint store: Redis when REDIS_URL is set,
+    otherwise an in-memory stand-in.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if config.REDIS_URL:
+                _store = RedisCheckpointStore(redis.from_url(config.REDIS_URL))
+            else:
+                logger.warning("REDIS_URL not set; using in-memory checkpoint store.")
+                _store = InMemoryCheckpointStore()
+        return _store
@@ -0,0 +1,80 @@
+"""
+Lazy registry for expensive process-wide objects: the network clients (Groq,
+OpenAI, Supabase) and the compiled story graph.
+
+Modules register a factory at import time, which is cheap because nothing is built yet:
+
+    get_openai_client = clients.register("openai", _build_openai_client)
+
+Callers use the returned accessor where they need the client. The first call builds
+it (one thread builds, the others wait), later calls return the same instance.
+``warm_up()`` builds registered clients ahead of the first request, e.g. at worker boot.
+"""
+import logging
+import threading
+import time
+from typing import Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_factories: dict[str, Callable[[], object]] = {}
+_instances: dict[str, object] = {}
+_locks: dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def register(name: str, factory: Callable[[], T]) -> Callable[[], T]:
+    """Register ``factory`` under ``name`` and return the accessor that builds it on first use."""
+    with _registry_lock:
+        _factories[name] = factory
+        _locks.setdefault(name, threading.Lock())
+
+    def accessor() -> T:
+        return get(name)
+
+    accessor.__name__ = f"get_{name}"
+    accessor.__doc__ = f"Shared '{name}' client, built on first use."
+    return accessor
+
+
+def get(name: str):
+    """Return the client registered as ``name``, building it if this is the first use."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _locks[name]:
+        if name not in _instances:
+            started = time.perf_counter()
+            _instances[name] = _factories[name]()
+            logger.info("Client '%s' ready in %.0f ms", name, (time.perf_counter() - started) * 1000)
+        return _instances[name]
+
+
+def warm_up(*names: str) -> dict[str, Exception]:
+    """
+    Build the given clients (all registered ones if none are given) now.
+    Failures are logged and returned rather than raised: a process that never
+    uses a client (e.g. a PDF-only worker without GROQ_API_KEY) still boots.
+    """
+    failures = {}
+    for name in names or tuple(_factories):
+        try:
+            get(name)
+        except Exception as exc:
+            logger.warning("Could not warm up client '%s': %s", name, exc)
+            failures[name] = exc
+    return failures
+
+
+def reset(*names: str) -> None:
+    """Drop built clients (all if none are given) so the next use builds fresh ones, e.g. after fork."""
+    with _registry_lock:
+        for name in names or tuple(_instances):
+            _instances.pop(name, None)
+
+
+def is_built(name: str) -> bool:
+    return name in _instances
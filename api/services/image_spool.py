@@ -0,0 +1,98 @@
+"""
+Hand-off of generated image bytes from the image stage to the PDF stage.
+
+Every image uploaded to Supabase Storage is also written here, keyed by its
+public URL. When the PDF is rendered, the images are read from the spool instead
+of being downloaded again. Files live on disk, not in memory, so a worker holding
+many stories in flight stays bounded. A PDF worker on another host, or one
+without the shared directory, finds nothing and downloads the images as before.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Empty disables the spool. docker-compose shares one volume between the story and PDF workers.
+IMAGE_SPOOL_DIR = os.getenv("IMAGE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "cuentee-image-spool"))
+# Leftovers of stories whose PDF never ran (failed task, PDF on another host) are swept after this
+IMAGE_SPOOL_TTL_SECONDS = int(os.getenv("IMAGE_SPOOL_TTL_SECONDS", str(60 * 60)))
+_SWEEP_INTERVAL_SECONDS = 60
+
+_last_sweep = 0.0
+
+
+def _path(url: str) -> str:
+    return os.path.join(IMAGE_SPOOL_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+
+def put(url: str, data: bytes) -> None:
+    """Spool the bytes behind ``url``. Never raises: the PDF stage can always download instead."""
+    if not IMAGE_SPOOL_DIR or not url or not data:
+        return
+    try:
+        os.makedirs(IMAGE_SPOOL_DIR, exist_ok=True)
+        path = _path(url)
+        # Write then rename, so a concurrent reader never sees a partial image
+        with tempfile.NamedTemporaryFile(dir=IMAGE_SPOOL_DIR, suffix=".tmp", delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        sweep()
+    except OSError as e:
+        logger.warning(f"Could not spool image {url}: {e}")
+
+
+def load(urls) -> dict[str, bytes]:
+    """{url: bytes} for every spooled URL in ``urls``; the others are simply missing."""
+    images = {}
+    if not IMAGE_SPOOL_DIR:
+        return images
+    for url in urls:
+        if not url or url in images:
+            continue
+        try:
+            with open(_path(url), "rb") as f:
+                images[url] = f.read()
+        except OSError:
+            pass
+    return images
+
+
+def discard(urls) -> None:
+    """Delete the spooled files of ``urls`` once the PDF no longer needs them."""
+    if not IMAGE_SPOOL_DIR:
+        return
+    for url in urls:
+        if url:
+            try:
+                os.remove(_path(url))
+            except OSError:
+                pass
+
+
+def sweep(max_age: float = None) -> int:
+    """Delete spooled files older than ``max_age`` seconds (IMAGE_SPOOL_TTL_SECONDS by default)."""
+    global _last_sweep
+    now = time.time()
+    if max_age is None:
+        # Called on every put(); scanning the directory once a minute is enough
+        if now - _last_sweep < _SWEEP_INTERVAL_SECONDS:
+            return 0
+        max_age = IMAGE_SPOOL_TTL_SECONDS
+    _last_sweep = now
+
+    removed = 0
+    try:
+        entries = list(os.scandir(IMAGE_SPOOL_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
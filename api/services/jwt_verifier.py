@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import threading
+import time
+
+import jwt
+
+from api.core import config
+from api.services.cache import InMemoryLRUCache
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+class LocalVerificationUnavailable(Exception):
+    """No local key can check this token (e.g. an HS256 token without SUPABASE_JWT_SECRET)."""
+
+
+class JWTVerifier:
+    """
+    Verifies Supabase access tokens locally: signature, expiry and audience.
+
+    HS256 tokens are checked against the project's JWT secret, RS256/ES256 tokens
+    against the project's JWKS (fetched once, refreshed every ``jwks_lifespan``
+    seconds or when an unknown ``kid`` shows up). Verified claims are cached by
+    token hash for ``claims_ttl`` seconds, never past the token's own ``exp``.
+    """
+
+    def __init__(
+        self,
+        jwt_secret: str | None,
+        jwks_url: str | None,
+        audience: str = "authenticated",
+        claims_ttl: int = 60,
+        jwks_lifespan: int = 600,
+        cache_size: int = 4096,
+    ):
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.claims_ttl = claims_ttl
+        self.jwks_lifespan = jwks_lifespan
+        self._claims = InMemoryLRUCache(maxsize=cache_size)
+        self._jwks_client = None
+        self._jwks_lock = threading.Lock()
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _get_jwks_client(self) -> jwt.PyJWKClient:
+        with self._jwks_lock:
+            if self._jwks_client is None:
+                self._jwks_client = jwt.PyJWKClient(self.jwks_url, cache_keys=True, lifespan=self.jwks_lifespan)
+            return self._jwks_client
+
+    def _signing_key(self, token: str, algorithm: str):
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise LocalVerificationUnavailable("HS256 token but SUPABASE_JWT_SECRET is not set")
+            return self.jwt_secret
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            if not self.jwks_url:
+                raise LocalVerificationUnavailable(f"{algorithm} token but no JWKS URL is configured")
+            try:
+                return self._get_jwks_client().get_signing_key_from_jwt(token).key
+            except jwt.PyJWKClientConnectionError as exc:
+                raise LocalVerificationUnavailable(f"JWKS unreachable: {exc}") from exc
+        raise jwt.InvalidAlgorithmError(f"Unsupported JWT algorithm: {algorithm}")
+
+    def verify(self, token: str) -> dict:
+        """
+        Returns the verified claims of ``token``.
+        Raises ``jwt.InvalidTokenError`` for bad/expired tokens and
+        ``LocalVerificationUnavailable`` when the token cannot be checked locally.
+        """
+        key = self.token_hash(token)
+        cached = self._claims.get(key)
+        if cached is not None:
+            if cached.get("exp", 0) > time.time():
+                return cached
+            self._claims.delete(key)
+
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        claims = jwt.decode(
+            token,
+            self._signing_key(token, algorithm),
+            algorithms=[algorithm],
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+
+        ttl = min(self.claims_ttl, int(claims["exp"] - time.time()))
+        if ttl > 0:
+            self._claims.set(key, claims, ttl=ttl)
+        return claims
+
+
+_verifier: JWTVerifier | None = None
+_verifier_lock = threading.Lock()
+
+
+def get_jwt_verifier() -> JWTVerifier:
+    """Process-wide verifier built from config (shares the JWKS and claims caches across requests)."""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = JWTVerifier(
+                jwt_secret=config.SUPABASE_JWT_SECRET,
+                jwks_url=config.SUPABASE_JWKS_URL,
+                audience=config.JWT_AUDIENCE,
+                claims_ttl=config.JWT_CLAIMS_CACHE_TTL_SECONDS,
+                jwks_lifespan=config.JWKS_REFRESH_SECONDS,
+            )
+        return _verifier
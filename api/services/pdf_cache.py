@@ -0,0 +1,127 @@
+"""
+Content-addressed cache of story PDFs in the 'cuentee_pdfs' bucket.
+
+A PDF is stored as ``{user_id}/{content_hash}.pdf``. The hash covers only what is
+printed (title, cover and chapters), and the story content records the hash of
+the PDF it links to (``pdf_hash``). A story whose text and images did not change
+is therefore never rendered twice, however many times the PDF is requested.
+The hash also covers the output profile, so switching PDF_PROFILE renders new
+PDFs instead of serving the ones made with the previous profile. Whoever checks
+the cache passes its profile to the render as well (see GET /stories/{id}/pdf),
+so an API and a worker configured with different profiles still agree on the hash.
+
+This module has no PDF dependencies, so the API can check the cache without
+importing fpdf2.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+from api.core import config
+from api.services import clients
+
+logger = logging.getLogger(__name__)
+
+PDF_BUCKET = "cuentee_pdfs"
+# Perfil de salida por defecto ("screen" o "print", ver PDF_PROFILES en pdf_service.py)
+PDF_PROFILE = os.getenv("PDF_PROFILE", "screen").strip().lower()
+# Mientras un render está encolado o en curso no se encola otro de la misma versión.
+# Cubre un render completo; si el worker muere sin liberar el lock, se puede reintentar tras este tiempo.
+PDF_RENDER_LOCK_SECONDS = int(os.getenv("PDF_RENDER_LOCK_SECONDS", "600"))
+_RENDER_LOCK_PREFIX = "pdf-render-lock:"
+
+_local_locks: dict[str, float] = {}
+_local_locks_lock = threading.Lock()
+
+
+def _build_redis():
+    return redis.from_url(config.REDIS_URL) if config.REDIS_URL else None
+
+get_lock_redis = clients.register("pdf_lock_redis", _build_redis)
+
+
+def resolve_profile(profile: str | None = None) -> str:
+    """Profile name a render with ``profile`` uses (PDF_PROFILE when None)."""
+    return (profile or PDF_PROFILE).strip().lower()
+
+
+def story_content_hash(story: dict, profile: str | None = None) -> str:
+    """Hash of the printed content of ``story`` in ``profile`` (PDF_PROFILE by default); changes whenever the PDF would."""
+    chapters = story.get("chapters") if isinstance(story.get("chapters"), list) else []
+    printed = {
+        "profile": resolve_profile(profile),
+        "title": story.get("title"),
+        "cover_image_url": story.get("cover_image_url"),
+        "chapters": [
+            {
+                "title": chapter.get("title"),
+                "content": chapter.get("content") or chapter.get("text"),
+                "image_url": chapter.get("image_url"),
+            }
+            for chapter in chapters
+            if isinstance(chapter, dict)
+        ],
+    }
+    encoded = json.dumps(printed, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def pdf_path(user_id: str, content_hash: str) -> str:
+    """Object key of the PDF for one version of a user's story."""
+    return f"{user_id}/{content_hash}.pdf"
+
+
+def cached_pdf_url(story: dict, profile: str | None = None) -> str | None:
+    """The story's PDF URL if it was rendered from the current content in ``profile``, else None."""
+    if story.get("pdf_url") and story.get("pdf_hash") == story_content_hash(story, profile):
+        return story["pdf_url"]
+    return None
+
+
+def parse_story_content(content) -> dict:
+    """The story dict stored in ``stories.content`` (TEXT; older rows may be JSON-encoded twice)."""
+    for _ in range(2):
+        if not isinstance(content, str):
+            break
+        content = json.loads(content)
+    return content if isinstance(content, dict) else {}
+
+
+def render_task_id(story_id: str, story: dict, profile: str | None = None) -> str:
+    """Task id of the on-demand render of this version of a story."""
+    return f"pdf-{story_id}-{story_content_hash(story, profile)}"
+
+
+def claim_render(render_id: str) -> bool:
+    """
+    True if the caller should enqueue ``render_id``: False while a render with that id
+    is already queued or running. Redis ``SET NX EX`` when REDIS_URL is set, so it holds
+    across API processes; a per-process lock otherwise.
+    """
+    client = get_lock_redis()
+    if client is not None:
+        return bool(client.set(_RENDER_LOCK_PREFIX + render_id, 1, nx=True, ex=PDF_RENDER_LOCK_SECONDS))
+    now = time.monotonic()
+    with _local_locks_lock:
+        if _local_locks.get(render_id, 0) > now:
+            return False
+        _local_locks[render_id] = now + PDF_RENDER_LOCK_SECONDS
+        return True
+
+
+def release_render(render_id: str) -> None:
+    """Let ``render_id`` be enqueued again (the render finished, or could not be enqueued). Never raises."""
+    try:
+        client = get_lock_redis()
+        if client is not None:
+            client.delete(_RENDER_LOCK_PREFIX + render_id)
+            return
+        with _local_locks_lock:
+            _local_locks.pop(render_id, None)
+    except Exception as e:
+        logger.warning(f"Could not release PDF render lock {render_id}: {e}")
@@ -1,29 +1,68 @@
 import os
 import io
+import copy
+import functools
+import multiprocessing
+import threading
+import time
 import requests
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fontTools import ttLib
 from fpdf import FPDF
 from fpdf.enums import TextMode
+from fpdf.fonts import SubsetMap, TTFFont
+from fpdf.image_datastructures import RasterImageInfo
+from fpdf.image_parsing import get_img_info
 from PIL import Image, ImageDraw, ImageEnhance
 
+from api.services import clients
+from api.services.pdf_cache import PDF_PROFILE
+
 # Assuming this file is in api/services/pdf_service.py
 STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+# Descargas de imágenes del PDF en paralelo sobre una sesión keep-alive compartida
+PDF_IMAGE_FETCH_CONCURRENCY = max(1, int(os.getenv("PDF_IMAGE_FETCH_CONCURRENCY", "8")))
+PDF_IMAGE_TIMEOUT_SECONDS = float(os.getenv("PDF_IMAGE_TIMEOUT_SECONDS", "10"))
+# Procesos del pool de render (ver get_render_pool); por defecto uno por core
+PDF_RENDER_PROCESSES = max(1, int(os.getenv("PDF_RENDER_PROCESSES", str(os.cpu_count() or 1))))
+# Perfiles de salida: "screen" (descarga ligera) o "print" (calidad completa).
+# PDF_PROFILE (el perfil por defecto) vive en pdf_cache.py porque forma parte de la clave de caché.
+PDF_PROFILES = {
+    # Images resampled to `dpi` at their printed size, flattened on the page colour and stored as JPEG
+    "screen": {"dpi": 110, "jpeg_quality": 80},
+    # Source resolution, lossless RGBA PNG (the original output)
+    "print": {"dpi": None, "jpeg_quality": None},
+}
+# purple-50, the colour every page is filled with
+PAGE_COLOR = (250, 245, 255)
+A4_WIDTH_MM = 210
+# OpenDyslexic por estilo ("" regular, "B" bold)
+FONT_FILES = {
+    "": os.path.join(STATIC_DIR, "OpenDyslexic-Regular.otf"),
+    "B": os.path.join(STATIC_DIR, "OpenDyslexic-Bold.otf"),
+}
+
+def _round_corners(img, radius):
+    """RGBA copy of `img` whose corners outside a rounded rectangle are transparent."""
+    img = img.convert("RGBA")
+
+    # Create a mask for rounded corners
+    mask = Image.new("L", img.size, 0)
+    draw = ImageDraw.Draw(mask)
+    # Use provided radius or default to 10% of the smallest dimension
+    r = min(img.size) // 10 if radius is None else radius
+    draw.rounded_rectangle((0, 0) + img.size, radius=r, fill=255)
+
+    # Apply mask
+    img.putalpha(mask)
+    return img
 
 def get_rounded_image(img_data, radius=30):
     """
     Applies rounded corners to an image and returns PNG bytes.
     """
     try:
-        img = Image.open(io.BytesIO(img_data)).convert("RGBA")
-
-        # Create a mask for rounded corners
-        mask = Image.new("L", img.size, 0)
-        draw = ImageDraw.Draw(mask)
-        # Use provided radius or default to 10% of the smallest dimension
-        r = min(img.size) // 10 if radius is None else radius
-        draw.rounded_rectangle((0, 0) + img.size, radius=r, fill=255)
-
-        # Apply mask
-        img.putalpha(mask)
+        img = _round_corners(Image.open(io.BytesIO(img_data)), radius)
 
         output = io.BytesIO()
         img.save(output, format="PNG")
@@ -32,46 +71,226 @@ def get_rounded_image(img_data, radius=30):
         print(f"Error rounding image: {e}")
         return img_data
 
-def get_faded_bg_image(opacity=0.5):
+@functools.lru_cache(maxsize=4)
+def _faded_bg_png(opacity: float) -> bytes | None:
     """
-    Loads pdf_bg.png, reduces opacity, and returns bytes.
+    Loads pdf_bg.png, reduces opacity, and returns PNG bytes.
+    Computed once per process and opacity (see preload_assets).
     """
     bg_path = os.path.join(STATIC_DIR, "pdf_bg.png")
     if not os.path.exists(bg_path):
         return None
-    
+
     try:
         img = Image.open(bg_path).convert("RGBA")
-        
+
         # Reduce opacity
         alpha = img.split()[3]
         alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
         img.putalpha(alpha)
-        
+
         output = io.BytesIO()
         img.save(output, format="PNG")
-        output.seek(0)
-        return output
+        return output.getvalue()
     except Exception as e:
         print(f"Error processing background image: {e}")
         return None
 
+def _get_profile(name: str | None) -> dict:
+    profile = (name or PDF_PROFILE).strip().lower()
+    if profile not in PDF_PROFILES:
+        raise ValueError(f"Unknown PDF profile '{profile}'. Use one of: {', '.join(PDF_PROFILES)}")
+    return PDF_PROFILES[profile]
+
+def _flatten_to_jpeg(img, width_mm: float, profile: dict) -> bytes:
+    """
+    Composites an RGBA image on the page colour, downsamples it to the profile DPI
+    at `width_mm` (never upsamples) and returns JPEG bytes.
+    """
+    flat = Image.new("RGB", img.size, PAGE_COLOR)
+    flat.paste(img, mask=img.getchannel("A"))
+
+    target_w = round(width_mm / 25.4 * profile["dpi"])
+    if target_w < flat.width:
+        flat = flat.resize((target_w, round(flat.height * target_w / flat.width)), Image.LANCZOS)
+
+    output = io.BytesIO()
+    flat.save(output, format="JPEG", quality=profile["jpeg_quality"], optimize=True)
+    return output.getvalue()
+
+def prepare_image(img_data, radius, width_mm, profile=None):
+    """
+    Rounded image ready to embed at `width_mm`: an RGBA PNG for the "print" profile,
+    a downsampled JPEG with the corners baked on the page colour for "screen".
+    """
+    profile = _get_profile(profile)
+    if not profile["dpi"]:
+        return get_rounded_image(img_data, radius=radius)
+    try:
+        rounded = _round_corners(Image.open(io.BytesIO(img_data)), radius)
+        return _flatten_to_jpeg(rounded, width_mm, profile)
+    except Exception as e:
+        print(f"Error optimizing image: {e}")
+        return img_data
+
+@functools.lru_cache(maxsize=8)
+def _faded_bg_info(opacity: float, image_filter: str, profile: str) -> RasterImageInfo | None:
+    """
+    The faded background decoded and compressed the way fpdf2 embeds it, for one
+    output profile. Computed once per process; StoryPDF copies it into each document.
+    """
+    png = _faded_bg_png(opacity)
+    if not png:
+        return None
+    settings = _get_profile(profile)
+    if settings["dpi"]:
+        # Drawn over the plain page fill, so flattening it there looks the same
+        png = _flatten_to_jpeg(Image.open(io.BytesIO(png)), A4_WIDTH_MM, settings)
+    return get_img_info(f"faded_bg_{opacity}", io.BytesIO(png), image_filter)
+
+@functools.lru_cache(maxsize=None)
+def _parsed_font(path: str, fontkey: str, style: str) -> TTFFont:
+    """
+    Parses a font file once per process (cmap, glyph widths, descriptor).
+    Never added to a document as is: see StoryPDF._add_cached_font.
+    """
+    return TTFFont(FPDF(), path, fontkey, style)
+
+def preload_assets():
+    """
+    Computes the process-wide PDF assets now. Called by the worker before it forks
+    its pool, so every child shares them instead of building them on its first PDF.
+    """
+    Image.init()
+    _faded_bg_info(0.5, FPDF().image_cache.image_filter, PDF_PROFILE)
+    for style, path in FONT_FILES.items():
+        if os.path.exists(path):
+            _parsed_font(path, f"opendyslexic{style}", style)
+
+def _build_http_session() -> requests.Session:
+    """Keep-alive session sized so every concurrent image fetch reuses a pooled connection."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=PDF_IMAGE_FETCH_CONCURRENCY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+get_http_session = clients.register("pdf_http", _build_http_session)
+
+def _fetch_image(url: str) -> bytes | None:
+    try:
+        response = get_http_session().get(url, timeout=PDF_IMAGE_TIMEOUT_SECONDS)
+        if response.status_code == 200:
+            return response.content
+        print(f"Error downloading image {url}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error downloading image {url}: {e}")
+    return None
+
+def story_image_urls(story_data: dict) -> list[str]:
+    """Cover and chapter image URLs of a story, in book order (missing ones skipped)."""
+    chapters = story_data.get("chapters", [])
+    if not isinstance(chapters, list):
+        chapters = []
+    urls = [story_data.get("cover_image_url")] + [c.get("image_url") for c in chapters if isinstance(c, dict)]
+    return [url for url in urls if url]
+
+def fetch_images(urls, images: dict[str, bytes] | None = None) -> dict[str, bytes]:
+    """
+    Returns {url: bytes} for every URL, starting from the bytes already in `images`
+    and downloading the missing ones concurrently. Failed downloads are left out,
+    so the PDF is rendered without that image instead of failing.
+    """
+    images = dict(images or {})
+    missing = list(dict.fromkeys(url for url in urls if url and url not in images))
+    if not missing:
+        return images
+
+    with ThreadPoolExecutor(max_workers=min(PDF_IMAGE_FETCH_CONCURRENCY, len(missing))) as executor:
+        for url, content in zip(missing, executor.map(_fetch_image, missing)):
+            if content:
+                images[url] = content
+    return images
+
+def render_story_pdf(story_data: dict, images: dict[str, bytes] | None = None, profile: str | None = None) -> tuple[bytes, float]:
+    """
+    Renders from exactly `images` (no downloads: this runs in the render pool, where only
+    CPU work belongs) and returns the PDF plus the CPU seconds it took (the thread's CPU
+    time, not wall time). Missing images are left out of the book.
+    """
+    started = time.thread_time()
+    pdf_bytes = generate_story_pdf(story_data, images=images, profile=profile, fetch=False)
+    return pdf_bytes, time.thread_time() - started
+
+_render_pool: ProcessPoolExecutor | None = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """
+    Processes that render PDFs for a threads/gevent worker, so the CPU-bound layout
+    never holds the GIL its in-flight stories need. Started on first use, not by
+    clients.warm_up(). Spawned rather than forked: the worker already runs threads,
+    and forking those can copy locks in a held state.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_assets,
+            )
+        return _render_pool
+
 class StoryPDF(FPDF):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, profile=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.profile = (profile or PDF_PROFILE).strip().lower()
+        _get_profile(self.profile)
         # OpenDyslexic Font registration
-        font_reg_path = os.path.join(STATIC_DIR, "OpenDyslexic-Regular.otf")
-        font_bold_path = os.path.join(STATIC_DIR, "OpenDyslexic-Bold.otf")
-
-        if os.path.exists(font_reg_path):
-            self.add_font("OpenDyslexic", "", font_reg_path)
-        else:
-            print(f"Warning: OpenDyslexic-Regular not found at {font_reg_path}")
-
-        if os.path.exists(font_bold_path):
-            self.add_font("OpenDyslexic", "B", font_bold_path)
-        else:
-            print(f"Warning: OpenDyslexic-Bold not found at {font_bold_path}")
+        for style, path in FONT_FILES.items():
+            if os.path.exists(path):
+                self._add_cached_font("OpenDyslexic", style, path)
+            else:
+                print(f"Warning: OpenDyslexic font not found at {path}")
+
+    def _add_cached_font(self, family, style, path):
+        """
+        Equivalent to add_font(family, style, path), but reuses the process-wide parse.
+        Only the per-document state is fresh: font index, used-glyph subset and the
+        fontTools object, which output() subsets in place.
+        """
+        fontkey = f"{family.lower()}{style}"
+        font = copy.copy(_parsed_font(path, fontkey, style))
+        font.i = len(self.fonts) + 1
+        font.ttfont = ttLib.TTFont(path, recalcTimestamp=False, lazy=True)
+        font.cw = font.cw.copy()
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font._hbfont = None
+        font.subset = SubsetMap(font)
+        self.fonts[fontkey] = font
+        if font.is_cff and font.is_cid_keyed:
+            self._set_min_pdf_version("1.6")
+
+    def _background_image(self, opacity=0.5):
+        """
+        Registers the cached faded background once in this document and returns the
+        name every page draws it by, so the PDF holds a single image object for it.
+        """
+        name = f"faded_bg_{opacity}"
+        if name not in self.image_cache.images:
+            cached = _faded_bg_info(opacity, self.image_cache.image_filter, self.profile)
+            if cached is None:
+                return None
+            # Copy: output() stores this document's object id in the info
+            info = RasterImageInfo(cached, i=len(self.image_cache.images) + 1, usages=0, iccp_i=None)
+            iccp = info.get("iccp")
+            if iccp is not None:
+                info["iccp_i"] = self.image_cache.icc_profiles.setdefault(iccp, len(self.image_cache.icc_profiles))
+                info["iccp"] = None
+            self.image_cache.images[name] = info
+        return name
 
     def add_page(self, *args, **kwargs):
         super().add_page(*args, **kwargs)
@@ -80,9 +299,9 @@ class StoryPDF(FPDF):
         self.rect(0, 0, self.w, self.h, style='F')
 
         # 1b. Image Background (Faded)
-        bg_stream = get_faded_bg_image(opacity=0.5)
-        if bg_stream:
-            self.image(bg_stream, x=0, y=0, w=self.w, h=self.h)
+        bg_image = self._background_image(opacity=0.5)
+        if bg_image:
+            self.image(bg_image, x=0, y=0, w=self.w, h=self.h)
 
         # 2. Decorative Border: Black
         self.set_draw_color(0, 0, 0)
@@ -106,11 +325,19 @@ class StoryPDF(FPDF):
         self.set_text_color(128, 128, 128)
         self.cell(0, 10, f'Page {self.page_no()} / {{nb}}', 0, 0, 'C')
 
-def generate_story_pdf(story_data: dict) -> bytes:
+def generate_story_pdf(story_data: dict, images: dict[str, bytes] | None = None, profile: str | None = None, fetch: bool = True) -> bytes:
     """
     Generates an improved PDF from the story data with better design and branding.
+    `images` maps image URLs to bytes the caller already holds; the rest are
+    downloaded concurrently before rendering starts, unless `fetch` is False.
+    `profile` is a PDF_PROFILES key ("screen" or "print"), PDF_PROFILE by default.
     """
-    pdf = StoryPDF()
+    chapters = story_data.get("chapters", [])
+    if not isinstance(chapters, list):
+        chapters = []
+    images = fetch_images(story_image_urls(story_data), images) if fetch else dict(images or {})
+
+    pdf = StoryPDF(profile=profile)
     pdf.set_left_margin(20)
     pdf.set_right_margin(20)
     pdf.set_auto_page_break(auto=True, margin=25)
@@ -162,37 +389,31 @@ def generate_story_pdf(story_data: dict) -> bytes:
     pdf.ln(15)
 
     # Cover Image
-    cover_url = story_data.get("cover_image_url")
-    if cover_url:
+    cover_bytes = images.get(story_data.get("cover_image_url"))
+    if cover_bytes:
         try:
-            response = requests.get(cover_url, timeout=10)
-            if response.status_code == 200:
-                # Rounded image with radius
-                rounded_img = get_rounded_image(response.content, radius=80)
-                img_stream = io.BytesIO(rounded_img)
-
-                # Full width (210 - 40 = 170mm)
-                w_img = 170 
-                x_pos = pdf.l_margin # 20mm
-
-                y_start = pdf.get_y()
-                # Place image
-                info = pdf.image(img_stream, x=x_pos, w=w_img)
-                h_img = info.rendered_height
-
-                # Draw black frame
-                pdf.set_draw_color(0, 0, 0)
-                pdf.set_line_width(1)
-                pdf.rect(x_pos - 0.5, y_start - 0.5, w_img + 1, h_img + 1, style='D', round_corners=True, corner_radius=10)
-                pdf.set_y(y_start + h_img + 10)
+            # Rounded image with radius
+            # Full width (210 - 40 = 170mm)
+            w_img = 170 
+            rounded_img = prepare_image(cover_bytes, radius=80, width_mm=w_img, profile=pdf.profile)
+            img_stream = io.BytesIO(rounded_img)
+
+            x_pos = pdf.l_margin # 20mm
+
+            y_start = pdf.get_y()
+            # Place image
+            info = pdf.image(img_stream, x=x_pos, w=w_img)
+            h_img = info.rendered_height
+
+            # Draw black frame
+            pdf.set_draw_color(0, 0, 0)
+            pdf.set_line_width(1)
+            pdf.rect(x_pos - 0.5, y_start - 0.5, w_img + 1, h_img + 1, style='D', round_corners=True, corner_radius=10)
+            pdf.set_y(y_start + h_img + 10)
         except Exception as e:
             print(f"Error embedding cover image: {e}")
 
     # Chapters
-    chapters = story_data.get("chapters", [])
-    if not isinstance(chapters, list):
-        chapters = []
-
     for chapter in chapters:
         if isinstance(chapter, dict):
             pdf.add_page()
@@ -235,26 +456,24 @@ def generate_story_pdf(story_data: dict) -> bytes:
                 pdf.ln(10)
             
             # Chapter Image
-            if chap_image_url:
+            chap_image = images.get(chap_image_url)
+            if chap_image:
                 try:
-                    resp = requests.get(chap_image_url, timeout=10)
-                    if resp.status_code == 200:
-                        rounded_img = get_rounded_image(resp.content, radius=50)
-                        img_stream = io.BytesIO(rounded_img)
-                        
-                        # Full Width
-                        w_img = 170
-                        x_pos = pdf.l_margin
-
-                        y_start = pdf.get_y()
-                        info = pdf.image(img_stream, x=x_pos, w=w_img)
-                        h_img = info.rendered_height
-
-                        # Black Frame
-                        pdf.set_draw_color(0, 0, 0)
-                        pdf.set_line_width(1)
-                        pdf.rect(x_pos - 0.5, y_start - 0.5, w_img + 1, h_img + 1, style='D', round_corners=True, corner_radius=8)
-                        pdf.set_y(y_start + h_img + 10)
+                    # Full Width
+                    w_img = 170
+                    rounded_img = prepare_image(chap_image, radius=50, width_mm=w_img, profile=pdf.profile)
+                    img_stream = io.BytesIO(rounded_img)
+                    x_pos = pdf.l_margin
+
+                    y_start = pdf.get_y()
+                    info = pdf.image(img_stream, x=x_pos, w=w_img)
+                    h_img = info.rendered_height
+
+                    # Black Frame
+                    pdf.set_draw_color(0, 0, 0)
+                    pdf.set_line_width(1)
+                    pdf.rect(x_pos - 0.5, y_start - 0.5, w_img + 1, h_img + 1, style='D', round_corners=True, corner_radius=8)
+                    pdf.set_y(y_start + h_img + 10)
                 except Exception as e:
                     print(f"Error embedding chapter image: {e}")
             
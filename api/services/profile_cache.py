@@ -0,0 +1,51 @@
+import logging
+import os
+
+import redis
+
+from api.core import config
+from api.services.cache import CacheBackend, InMemoryLRUCache, RedisCache, TieredCache
+
+logger = logging.getLogger(__name__)
+
+# memory: per-process LRU. redis: short-lived per-process LRU in front of Redis, so an
+# invalidation from the worker or the refill job reaches every API process. off: no cache.
+PROFILE_CACHE_BACKEND = os.getenv("PROFILE_CACHE_BACKEND", "redis").strip().lower()
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "4096"))
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "30"))
+# Upper bound on how stale a process can be after an invalidation made by another process
+PROFILE_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_LOCAL_TTL_SECONDS", "5"))
+
+
+def _build_profile_cache() -> CacheBackend | None:
+    if PROFILE_CACHE_BACKEND == "off":
+        return None
+    if PROFILE_CACHE_BACKEND == "redis" and config.REDIS_URL:
+        return TieredCache(
+            InMemoryLRUCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_LOCAL_TTL_SECONDS),
+            RedisCache(redis.from_url(config.REDIS_URL), prefix="profile-cache", ttl=PROFILE_CACHE_TTL_SECONDS),
+        )
+    if PROFILE_CACHE_BACKEND == "redis":
+        logger.warning("PROFILE_CACHE_BACKEND=redis but REDIS_URL not set; using in-memory profile cache.")
+    return InMemoryLRUCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS)
+
+
+profile_cache = _build_profile_cache()
+
+
+def get_cached_profile(user_id: str) -> dict | None:
+    """Cached ``{"credits": ..., "plan": ...}`` for a user, or None on a miss."""
+    if profile_cache is None:
+        return None
+    return profile_cache.get(user_id)
+
+
+def cache_profile(user_id: str, profile: dict) -> None:
+    if profile_cache is not None:
+        profile_cache.set(user_id, {"credits": profile.get("credits", 0), "plan": profile.get("plan", "free")})
+
+
+def invalidate_profile(user_id: str) -> None:
+    """Drop a user's cached profile; call it after every write to their credits or plan."""
+    if profile_cache is not None:
+        profile_cache.delete(user_id)
@@ -1,11 +1,92 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest import SyncPostgrestClient
+from postgrest._sync.request_builder import SyncRequestBuilder
 from fastapi import HTTPException
+import httpx
 import logging
+import os
 
 from api.core import config
+from api.services import clients
 
 logger = logging.getLogger(__name__)
 
+# Todas las llamadas a Supabase (REST, Storage, Auth) comparten un único pool HTTP keep-alive por proceso
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "50"))
+SUPABASE_HTTP_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_TIMEOUT_SECONDS", "30"))
+
+
+def _build_http_client() -> httpx.Client:
+    """
+    httpx.Client compartido. Las cabeceras de cada cliente (apikey, JWT) se envían
+    por petición, así que el pool sirve a todos los usuarios.
+    """
+    return httpx.Client(
+        timeout=SUPABASE_HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+        ),
+        follow_redirects=True,
+        http2=True,
+    )
+
+# Todos los clientes se crean en el primer uso y se reutilizan (ver api/services/clients.py)
+get_http_client = clients.register("supabase_http", _build_http_client)
+
+
+def _pooled_options() -> ClientOptions:
+    return ClientOptions(httpx_client=get_http_client(), auto_refresh_token=False, persist_session=False)
+
+
+class UserSupabaseClient:
+    """
+    Cliente de Supabase con el JWT del usuario (aplica RLS).
+    Solo guarda las cabeceras del usuario: las peticiones salen por el pool compartido,
+    así que crearlo por request no abre conexiones nuevas.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.postgrest = SyncPostgrestClient(
+            f"{config.SUPABASE_URL.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": config.SUPABASE_ANON_KEY,
+                "Authorization": f"Bearer {token}",
+            },
+            http_client=get_http_client(),
+        )
+
+    def table(self, table_name: str) -> SyncRequestBuilder:
+        return self.postgrest.from_(table_name)
+
+    def from_(self, table_name: str) -> SyncRequestBuilder:
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, fn: str, params: dict | None = None):
+        return self.postgrest.rpc(fn, params or {})
+
+    @property
+    def auth(self):
+        """Auth de Supabase (p.ej. auth.get_user(token)); no depende del usuario, se comparte."""
+        return get_supabase_anon_client().auth
+
+
+_get_anon_client = clients.register(
+    "supabase_anon",
+    lambda: create_client(config.SUPABASE_URL, config.SUPABASE_ANON_KEY, options=_pooled_options()),
+)
+
+
+def get_supabase_anon_client() -> Client:
+    """Cliente anónimo compartido, usado para las llamadas a Supabase Auth."""
+    if not config.SUPABASE_URL or not config.SUPABASE_ANON_KEY:
+        logger.error("Supabase user client not configured.")
+        raise HTTPException(status_code=500, detail="Supabase user client not configured.")
+
+    return _get_anon_client()
+
+
 def get_supabase_service_client() -> Client:
     """
     Devuelve un cliente de Supabase privilegiado (rol de servicio).
@@ -15,9 +96,9 @@ def get_supabase_service_client() -> Client:
         logger.error("Supabase service client not configured.")
         raise HTTPException(status_code=500, detail="Supabase service client not configured.")
 
-    return create_client(config.SUPABASE_URL, config.SUPABASE_SERVICE_ROLE_KEY)
+    return create_client(config.SUPABASE_URL, config.SUPABASE_SERVICE_ROLE_KEY, options=_pooled_options())
 
-def get_supabase_user_client(token: str) -> Client:
+def get_supabase_user_client(token: str) -> UserSupabaseClient:
     """
     Devuelve un cliente de Supabase autenticado con el JWT del usuario.
     Este cliente aplicará las políticas de RLS de la base de datos.
@@ -26,15 +107,13 @@ def get_supabase_user_client(token: str) -> Client:
         logger.error("Supabase user client not configured.")
         raise HTTPException(status_code=500, detail="Supabase user client not configured.")
 
-    client = create_client(config.SUPABASE_URL, config.SUPABASE_ANON_KEY)
-
-    try:
-        client.postgrest.auth(token)
-    except Exception as exc:
-        logger.exception("Error authenticating Supabase client with user token.")
-        raise HTTPException(status_code=401, detail="Invalid authentication token.") from exc
+    return UserSupabaseClient(token)
 
-    return client
+def _build_admin_client() -> Client | None:
+    if not config.SUPABASE_URL or not config.SUPABASE_SERVICE_ROLE_KEY:
+        logger.warning("⚠️ SUPABASE service credentials not found. Database operations will fail.")
+        return None
+    return get_supabase_service_client()
 
-# Cliente de servicio singleton para ser usado por otros módulos
-service_supabase_client = get_supabase_service_client()
+# Cliente de servicio compartido por otros módulos (API y worker); None si faltan las credenciales
+get_supabase_admin_client = clients.register("supabase_admin", _build_admin_client)
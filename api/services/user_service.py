@@ -1,16 +1,17 @@
 from fastapi import HTTPException
-from supabase import Client
 import logging
 import jwt
 from datetime import datetime, timezone
 
-from api.services.supabase_client import get_supabase_user_client, service_supabase_client
+from api.services.supabase_client import UserSupabaseClient, get_supabase_user_client, get_supabase_admin_client
+from api.services.jwt_verifier import LocalVerificationUnavailable, get_jwt_verifier
+from api.services.profile_cache import cache_profile, get_cached_profile, invalidate_profile
 
 logger = logging.getLogger(__name__)
 
 class UserProfile:
     """Modelo para almacenar los datos relevantes del perfil del usuario."""
-    def __init__(self, user_id: str, credits: int, plan: str, supabase_client: Client, token: str):
+    def __init__(self, user_id: str, credits: int, plan: str, supabase_client: UserSupabaseClient, token: str):
         self.id = user_id
         self.credits = credits
         self.plan = plan
@@ -43,17 +44,8 @@ def _log_token_details(token: str):
         logger.exception("An unexpected error occurred while decoding the token.")
 
 
-def verify_jwt_and_get_user(token: str) -> UserProfile:
-    """
-    Verifica el JWT de un usuario, obtiene su perfil y devuelve un objeto UserProfile.
-    Eleva una HTTPException si el token es inválido o el usuario no existe.
-    """
-    logger.info("Verifying JWT and fetching user profile.")
-
-    # 1. Obtener un cliente de Supabase autenticado con el token del usuario.
-    supabase = get_supabase_user_client(token)
-
-    # 2. Verificar el token obteniendo los datos del usuario.
+def _verify_token_remotely(token: str, supabase: UserSupabaseClient) -> str:
+    """Verifica el token con una llamada a Supabase Auth y devuelve el user_id."""
     try:
         # CORRECCIÓN: Pasar el token explícitamente a la función get_user.
         user_response = supabase.auth.get_user(token)
@@ -61,14 +53,60 @@ def verify_jwt_and_get_user(token: str) -> UserProfile:
             logger.warning("Supabase did not return a user for the token.")
             _log_token_details(token)
             raise HTTPException(status_code=401, detail="Invalid or expired token.")
-        user_id = user_response.user.id
-        logger.info("JWT is valid for user_id: %s", user_id)
+        return user_response.user.id
+    except HTTPException:
+        raise
     except Exception as exc:
         logger.exception("Error verifying JWT with Supabase.")
         _log_token_details(token)
         raise HTTPException(status_code=401, detail="Invalid or expired token.") from exc
 
-    # 3. Obtener el perfil del usuario para verificar créditos y plan.
+
+def _verify_token(token: str, supabase: UserSupabaseClient) -> str:
+    """
+    Devuelve el user_id ('sub') de un token válido.
+    La verificación es local (secreto JWT o JWKS, con caché de claims); solo si el
+    token no se puede comprobar localmente se consulta a Supabase Auth.
+    """
+    try:
+        user_id = get_jwt_verifier().verify(token)["sub"]
+    except LocalVerificationUnavailable as exc:
+        logger.info("Local JWT verification unavailable (%s); asking Supabase Auth.", exc)
+        user_id = _verify_token_remotely(token, supabase)
+    except jwt.PyJWTError as exc:
+        logger.warning("Invalid JWT: %s", exc)
+        _log_token_details(token)
+        raise HTTPException(status_code=401, detail="Invalid or expired token.") from exc
+
+    logger.info("JWT is valid for user_id: %s", user_id)
+    return user_id
+
+
+def verify_jwt_and_get_user(token: str) -> UserProfile:
+    """
+    Verifica el JWT de un usuario, obtiene su perfil y devuelve un objeto UserProfile.
+    Eleva una HTTPException si el token es inválido o el usuario no existe.
+    """
+    logger.info("Verifying JWT and fetching user profile.")
+
+    # 1. Obtener un cliente de Supabase autenticado con el token del usuario.
+    supabase = get_supabase_user_client(token)
+
+    # 2. Verificar el token: localmente (firma + expiración) y, si no hay clave local, con Supabase Auth.
+    user_id = _verify_token(token, supabase)
+
+    # 3. Obtener el perfil del usuario para verificar créditos y plan (caché corta, invalidada al escribir créditos).
+    profile_data = get_cached_profile(user_id)
+    if profile_data is not None:
+        logger.info("User profile data (cached): %s", profile_data)
+        return UserProfile(
+            user_id=user_id,
+            credits=profile_data.get("credits", 0),
+            plan=profile_data.get("plan", "free"),
+            supabase_client=supabase,
+            token=token
+        )
+
     try:
         profile_response = (
             supabase.table("profiles")
@@ -85,6 +123,8 @@ def verify_jwt_and_get_user(token: str) -> UserProfile:
              logger.warning("No profile found for user_id: %s", user_id)
              raise HTTPException(status_code=404, detail="User profile not found.")
 
+        cache_profile(user_id, profile_data)
+
         # CORRECCIÓN: Pasar el token al crear el objeto UserProfile.
         return UserProfile(
             user_id=user_id,
@@ -110,20 +150,43 @@ def check_user_credits(user: UserProfile):
         )
     logger.info("User %s has %d credits.", user.id, user.credits)
 
-def deduct_credit(user: UserProfile):
+def reserve_credit(user: UserProfile, task_id: str) -> int:
     """
-    Resta un crédito del perfil de un usuario.
+    Reserva (descuenta) un crédito para la tarea `task_id` antes de encolarla.
+    La RPC `reserve_credit` lo hace de forma atómica, así que dos peticiones simultáneas
+    no pueden gastar el mismo crédito. Devuelve el nuevo saldo; eleva 402 si no quedan créditos.
     """
     try:
-        new_credits = user.credits - 1
-        (
-            user.client.table("profiles")
-            .update({"credits": new_credits})
-            .eq("id", user.id)
-            .execute()
+        response = user.client.rpc("reserve_credit", {"p_task_id": task_id}).execute()
+    except Exception as exc:
+        logger.exception("Failed to reserve credit for user %s.", user.id)
+        raise HTTPException(status_code=503, detail="Could not reserve credit.") from exc
+    finally:
+        invalidate_profile(user.id)
+
+    if response.data is None:
+        logger.warning("User %s has no available credits (reservation rejected).", user.id)
+        raise HTTPException(
+            status_code=402,
+            detail="No tienes créditos disponibles. Suscríbete para continuar.",
         )
-        logger.info("Credit deducted for user %s. New balance: %d", user.id, new_credits)
+    user.credits = response.data
+    logger.info("Credit reserved for user %s (task %s). New balance: %d", user.id, task_id, user.credits)
+    return user.credits
+
+def refund_credit(user: UserProfile, task_id: str):
+    """
+    Devuelve el crédito reservado para `task_id` (p.ej. si la tarea no se pudo encolar).
+    No eleva excepciones: un fallo aquí solo se registra.
+    """
+    supabase_admin = get_supabase_admin_client()
+    if supabase_admin is None:
+        logger.error("Cannot refund credit for task %s (Supabase service client missing).", task_id)
+        return
+    try:
+        supabase_admin.rpc("refund_credit", {"p_task_id": task_id}).execute()
+        logger.info("Credit refunded for user %s (task %s).", user.id, task_id)
     except Exception:
-        logger.exception("Failed to deduct credit for user %s.", user.id)
-        # No elevamos una excepción aquí para no interrumpir el flujo principal
-        # si solo falla la deducción de crédito, pero sí lo registramos.
+        logger.exception("Failed to refund credit for user %s (task %s).", user.id, task_id)
+    finally:
+        invalidate_profile(user.id)
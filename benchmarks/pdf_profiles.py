@@ -0,0 +1,91 @@
+"""
+PDF size and render time per output profile (``PDF_PROFILES`` in api/services/pdf_service.py).
+
+Renders the same book with every profile. The book has a cover and ``--chapters`` chapters,
+each illustrated with a 1024x1024 image like the ones the image model returns. Images are
+handed in as bytes, so nothing is downloaded and only rendering is timed.
+
+    python -m benchmarks.pdf_profiles --chapters 10 --runs 3
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def illustration(seed: int, size: int = 1024) -> bytes:
+    """A storybook-like PNG: soft gradient, flat shapes and a little grain (compresses like real art, not like noise)."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    top, bottom = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+    img = Image.linear_gradient("L").resize((size, size))
+    img = Image.composite(Image.new("RGB", (size, size), bottom), Image.new("RGB", (size, size), top), img)
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(25):
+        x, y, r = rng.randrange(size), rng.randrange(size), rng.randrange(20, size // 4)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    img = img.filter(ImageFilter.GaussianBlur(2))
+    grain = Image.effect_noise((size, size), 12).convert("RGB")
+    img = Image.blend(img, grain, 0.08)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def book(chapters: int) -> tuple[dict, dict[str, bytes]]:
+    text = "Once upon a time, a small toaster dreamed of flying over the kitchen. " * 25
+    story = {
+        "title": "The Toaster Who Wanted to Fly",
+        "cover_image_url": "https://benchmark/cover.png",
+        "chapters": [
+            {"title": f"Chapter {i}", "content": text, "image_url": f"https://benchmark/chapter_{i}.png"}
+            for i in range(1, chapters + 1)
+        ],
+    }
+    images = {url: illustration(seed) for seed, url in enumerate(
+        [story["cover_image_url"]] + [chapter["image_url"] for chapter in story["chapters"]]
+    )}
+    return story, images
+
+
+def measure(chapters: int = 10, runs: int = 3) -> dict[str, dict[str, float]]:
+    """{profile: {"bytes": size, "seconds": median render time}}."""
+    from api.services import pdf_service
+
+    story, images = book(chapters)
+    results = {}
+    for profile in pdf_service.PDF_PROFILES:
+        # First render builds the process-wide assets for this profile; it is not timed
+        pdf = pdf_service.generate_story_pdf(story, images=images, profile=profile)
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            pdf = pdf_service.generate_story_pdf(story, images=images, profile=profile)
+            samples.append(time.perf_counter() - started)
+        results[profile] = {"bytes": len(pdf), "seconds": statistics.median(samples)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = measure(args.chapters, args.runs)
+    print(f"{'profile':<10} {'size MB':>9} {'render s':>9}")
+    for profile, result in results.items():
+        print(f"{profile:<10} {result['bytes'] / 1_000_000:>9.2f} {result['seconds']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Cold-start benchmarks. Every measurement runs in a fresh interpreter:
+
+    import:<module>      wall time of ``import <module>`` (interpreter startup excluded)
+    api_first_request    import api.main + startup events + first ``GET /``
+    worker_boot          import the task modules the way ``celery -A api.celery_tasks.tasks worker`` does,
+                         plus the ``worker_init`` warm-up of a prefork parent
+    worker_child_ready   fork a child from the booted worker, run ``worker_process_init`` and build
+                         every registered client (what the first task of a recycled child pays)
+
+Results are the median of ``--runs`` runs and are compared against THRESHOLDS,
+which tests/test_startup.py asserts too, so startup regressions fail the suite.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --profile api.celery_tasks.tasks   # heaviest imports (-X importtime)
+    python -m benchmarks.startup --check                            # exit 1 on a regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+MODULES = (
+    "api.main",
+    "api.celery_tasks.tasks",
+    "api.celery_tasks.canvas",
+    "api.agents.story_agent",
+    "api.services.pdf_service",
+)
+
+# Seconds (median). Roughly 2-3x the numbers on a laptop, so noise on shared CI runners does not trip them.
+THRESHOLDS = {
+    "import:api.main": 2.5,
+    "import:api.celery_tasks.tasks": 2.5,
+    "import:api.celery_tasks.canvas": 2.5,
+    "import:api.agents.story_agent": 2.0,
+    "import:api.services.pdf_service": 2.0,
+    "api_first_request": 3.0,
+    "worker_boot": 9.0,
+    "worker_child_ready": 1.0,
+}
+
+_IMPORT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"import:{module}": time.perf_counter() - started}}))
+"""
+
+_API_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+from api.main import app
+with TestClient(app) as client:
+    assert client.get("/").status_code == 200
+print(json.dumps({"api_first_request": time.perf_counter() - started}))
+"""
+
+_WORKER_SCRIPT = """
+import json, os, time
+os.environ["CELERY_WORKER_POOL"] = "prefork"
+started = time.perf_counter()
+from celery.signals import worker_init
+from api.celery_tasks.app import celery_app
+celery_app.loader.import_default_modules()
+import api.celery_tasks.tasks
+worker_init.send(sender=None)
+booted = time.perf_counter()
+
+read_fd, write_fd = os.pipe()
+pid = os.fork()
+if pid == 0:
+    from celery.signals import worker_process_init
+    from api.services import clients
+    worker_process_init.send(sender=None)
+    clients.warm_up()
+    os.write(write_fd, b"1")
+    os._exit(0)
+os.read(read_fd, 1)
+ready = time.perf_counter()
+os.waitpid(pid, 0)
+print(json.dumps({"worker_boot": booted - started, "worker_child_ready": ready - booted}))
+"""
+
+
+def _env() -> dict:
+    """Fake credentials (clients are built, never called) and no Redis, so nothing touches the network."""
+    env = dict(os.environ)
+    env.pop("REDIS_URL", None)
+    # Connection warm-up would time the (fake) hosts, not the worker
+    env["CELERY_WORKER_WARMUP_CONNECT"] = "false"
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("GROQ_API_KEY", "gsk_benchmark")
+    env.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+    env.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+    env.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark-service-key")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (ROOT, env.get("PYTHONPATH"))))
+    return env
+
+
+def _run(script: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", script], cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+
+
+def _measure_once(script: str) -> dict[str, float]:
+    return json.loads(_run(script).stdout.strip().splitlines()[-1])
+
+
+def measure(runs: int = 3, modules=MODULES, api: bool = True, worker: bool = True) -> dict[str, float]:
+    """Median seconds per metric over ``runs`` fresh interpreters."""
+    scripts = [_IMPORT_SCRIPT.format(module=module) for module in modules]
+    if api:
+        scripts.append(_API_SCRIPT)
+    if worker and hasattr(os, "fork"):
+        scripts.append(_WORKER_SCRIPT)
+
+    samples: dict[str, list[float]] = {}
+    for _ in range(runs):
+        for script in scripts:
+            for metric, seconds in _measure_once(script).items():
+                samples.setdefault(metric, []).append(seconds)
+    return {metric: statistics.median(values) for metric, values in samples.items()}
+
+
+def check(results: dict[str, float], thresholds: dict[str, float] = THRESHOLDS) -> list[str]:
+    """Return one message per metric above its threshold (empty list = no regression)."""
+    return [
+        f"{metric}: {results[metric]:.2f}s > {limit:.2f}s"
+        for metric, limit in thresholds.items()
+        if metric in results and results[metric] > limit
+    ]
+
+
+def import_profile(module: str, top: int = 15) -> list[tuple[str, float]]:
+    """Heaviest imports of ``module`` as (package, cumulative seconds), from ``python -X importtime``."""
+    stderr = _run(f"import {module}", "-X", "importtime").stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Only top-level packages: nested entries are already included in their parent's cumulative time
+        if not name.startswith(" ") and "." not in name:
+            entries.append((name, int(cumulative) / 1_000_000))
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--profile", metavar="MODULE", help="print the heaviest imports of MODULE and exit")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a threshold is exceeded")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print(f"{'package':<32} {'cumulative s':>12}")
+        for name, seconds in import_profile(args.profile):
+            print(f"{name:<32} {seconds:>12.3f}")
+        return 0
+
+    results = measure(args.runs)
+    print(f"{'metric':<36} {'median s':>9} {'limit s':>8}")
+    for metric, seconds in results.items():
+        limit = THRESHOLDS.get(metric)
+        print(f"{metric:<36} {seconds:>9.2f} {limit if limit is not None else '-':>8}")
+
+    regressions = check(results)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
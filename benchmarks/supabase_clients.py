@@ -0,0 +1,101 @@
+"""
+Request throughput of the user-scoped Supabase client: per-request ``create_client``
+(the previous behaviour) against the pooled ``get_supabase_user_client``.
+
+Both run the profile lookup from ``verify_jwt_and_get_user`` against a local
+PostgREST stand-in (HTTP/1.1 keep-alive server on 127.0.0.1), so the numbers
+show client construction and connection setup cost, not Supabase latency.
+
+    python -m benchmarks.supabase_clients --requests 500 --threads 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Any JWT-shaped string passes the client's key check; nothing leaves the machine
+FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark"
+USER_TOKEN = "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJ1c2VyLTEifQ.benchmark"
+
+
+class PostgrestStandIn(BaseHTTPRequestHandler):
+    """Answers every REST call like PostgREST answers a single-row profile select."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with PostgrestStandIn._lock:
+            PostgrestStandIn.connections += 1
+
+    def do_GET(self):
+        body = json.dumps({"credits": 3, "plan": "free"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def profile_lookup(client):
+    return client.table("profiles").select("credits", "plan").eq("id", "user-1").single().execute().data
+
+
+def before(url: str):
+    from supabase import create_client
+
+    client = create_client(url, FAKE_KEY)
+    client.postgrest.auth(USER_TOKEN)
+    return profile_lookup(client)
+
+
+def after(url: str):
+    from api.services.supabase_client import get_supabase_user_client
+
+    return profile_lookup(get_supabase_user_client(USER_TOKEN))
+
+
+def run(fn, url: str, requests: int, threads: int) -> tuple[float, int]:
+    PostgrestStandIn.connections = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for data in pool.map(lambda _: fn(url), range(requests)):
+            assert data == {"credits": 3, "plan": "free"}
+    return time.perf_counter() - started, PostgrestStandIn.connections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    from api.core import config
+
+    config.SUPABASE_URL = url
+    config.SUPABASE_ANON_KEY = FAKE_KEY
+
+    print(f"{'client':<18} {'requests':>8} {'seconds':>8} {'req/s':>8} {'connections':>12}")
+    for name, fn in (("create_client", before), ("pooled", after)):
+        elapsed, connections = run(fn, url, args.requests, args.threads)
+        print(f"{name:<18} {args.requests:>8} {elapsed:>8.2f} {args.requests / elapsed:>8.0f} {connections:>12}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Throughput benchmark for the story worker: stories/minute per worker process.
+
+Runs ``generate_story_task`` end to end on an in-process Celery worker (memory
+broker, in-memory result backend) with every external provider replaced by a
+local fake that only sleeps for a configurable latency: Groq (story, characters,
+scene prompts), OpenAI images, the Supabase S3 upload, the PDF image downloads
+and the Supabase table/storage calls. The numbers therefore measure how many
+stories one process can keep in flight, not provider speed. PDF rendering
+stays real (it is CPU work the threads pool cannot overlap) unless
+``--skip-pdf`` is given.
+
+    python -m benchmarks.worker_pool --pools solo threads --stories 32 --concurrency 16
+"""
+import argparse
+import base64
+import io
+import os
+import re
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Import-time checks in the agents require these; no request ever leaves the process
+for _key, _value in {
+    "OPENAI_API_KEY": "sk-benchmark",
+    "GROQ_API_KEY": "gsk_benchmark",
+    "SUPABASE_URL": "https://benchmark.supabase.co",
+    "SUPABASE_SERVICE_ROLE_KEY": "benchmark",
+    "SUPABASE_ANON_KEY": "benchmark",
+    "SUPABASE_PROJECT_REF": "benchmark",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+
+def _png_bytes() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 120, 80)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeProviders:
+    """Patches every network-bound dependency of the story task with a sleeping fake."""
+
+    def __init__(self, llm_latency: float, image_latency: float, io_latency: float, num_chapters: int, render_pdf: bool = True):
+        self.llm_latency = llm_latency
+        self.image_latency = image_latency
+        self.io_latency = io_latency
+        self.num_chapters = num_chapters
+        self.render_pdf = render_pdf
+        self.png = _png_bytes()
+        self._stack = ExitStack()
+
+    # --- Groq ---------------------------------------------------------------
+    def story(self, messages):
+        from api.agents.utils import Story
+
+        time.sleep(self.llm_latency)
+        return Story(
+            title="Benchmark Story",
+            chapters=[
+                {"title": f"Chapter {i}", "content": f"Leo the fox walks through chapter {i}. " * 40}
+                for i in range(1, self.num_chapters + 1)
+            ],
+        )
+
+    def text(self, messages):
+        time.sleep(self.llm_latency)
+        return SimpleNamespace(content="- Leo: fox, young, short orange fur, green eyes, orange, blue scarf, white tail tip, small")
+
+    def scene_prompts(self, messages):
+        from api.agents.utils import ScenePromptBatch
+
+        time.sleep(self.llm_latency)
+        indexes = [int(i) for i in re.findall(r"### Scene (\d+)", messages[-1]["content"])]
+        return ScenePromptBatch(prompts=[{"index": i, "prompt": f"Watercolor scene {i}"} for i in indexes])
+
+    # --- OpenAI images / Supabase S3 ------------------------------------------
+    def generate_image(self, **params):
+        time.sleep(self.image_latency)
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=base64.b64encode(self.png).decode(), url=None)])
+
+    def put_object(self, **kwargs):
+        time.sleep(self.io_latency)
+
+    # --- PDF image downloads ------------------------------------------------
+    def http_get(self, url, timeout=None):
+        time.sleep(self.io_latency)
+        return SimpleNamespace(status_code=200, content=self.png)
+
+    # --- Supabase RPCs / storage --------------------------------------------
+    def supabase(self):
+        providers = self
+
+        class Query:
+            def __init__(self, op=None):
+                self._op = op
+
+            def __getattr__(self, name):
+                def step(*args, **kwargs):
+                    self._op = self._op or name
+                    return self
+                return step
+
+            def execute(self):
+                time.sleep(providers.io_latency)
+                if self._op == "finalize_story":
+                    return SimpleNamespace(data={"id": str(uuid.uuid4())})
+                return SimpleNamespace(data=[])
+
+        class Bucket:
+            def exists(self, path):
+                return False
+
+            def upload(self, path, file, file_options=None):
+                time.sleep(providers.io_latency)
+
+            def get_public_url(self, path):
+                return f"https://benchmark.supabase.co/storage/v1/object/public/cuentee_pdfs/{path}"
+
+        return SimpleNamespace(
+            rpc=lambda fn, params=None: Query(fn),
+            storage=SimpleNamespace(from_=lambda bucket: Bucket()),
+        )
+
+    def __enter__(self):
+        from api.agents import story_agent, utils
+        from api.celery_tasks import canvas, tasks
+        from api.services import checkpoint_store, pdf_service
+
+        fake_s3 = SimpleNamespace(put_object=self.put_object)
+        patches = [
+            patch.object(story_agent, "get_story_agent", return_value=SimpleNamespace(invoke=self.story)),
+            patch.object(story_agent, "get_image_llm", return_value=SimpleNamespace(invoke=self.text)),
+            patch.object(story_agent, "get_image_prompt_batch_agent", return_value=SimpleNamespace(invoke=self.scene_prompts)),
+            patch.object(utils, "get_openai_client", return_value=SimpleNamespace(images=SimpleNamespace(generate=self.generate_image))),
+            patch.object(utils, "GPT_IMAGE_MODELS", {utils.SELECTED_IMAGE_MODEL}),
+            patch.object(utils, "image_cache", None),
+            patch.object(utils.GenerationContext, "get_s3_client", lambda context: fake_s3),
+            patch.object(pdf_service, "get_http_session", return_value=SimpleNamespace(get=self.http_get)),
+            patch.object(tasks, "get_supabase_admin_client", return_value=self.supabase()),
+            patch.object(tasks, "STORY_PIPELINE", "graph"),
+            # Render before the task completes, so stories/minute includes the PDF
+            patch.object(canvas, "PDF_RENDER_MODE", "inline"),
+            patch.object(checkpoint_store, "_store", checkpoint_store.InMemoryCheckpointStore()),
+        ]
+        if not self.render_pdf:
+            # PDF rendering is CPU-bound; skipping it isolates the network-bound part of the pipeline
+            patches.append(patch.object(pdf_service, "generate_story_pdf", lambda story_data, **kwargs: b"%PDF-1.4 benchmark"))
+            # The stub only exists in this process, so render in the task's thread
+            patches.append(patch.object(tasks, "PDF_PROCESS_POOL", False))
+        for p in patches:
+            self._stack.enter_context(p)
+        return self
+
+    def __exit__(self, *exc):
+        return self._stack.__exit__(*exc)
+
+
+def run(pool: str, concurrency: int, stories: int, timeout: float) -> float:
+    """Run ``stories`` stories on one worker process and return the elapsed seconds."""
+    from celery.contrib.testing.worker import start_worker
+
+    from api.celery_tasks.app import celery_app
+    from api.celery_tasks.tasks import generate_story_task
+
+    with start_worker(celery_app, pool=pool, concurrency=concurrency, perform_ping_check=False, shutdown_timeout=timeout):
+        started = time.perf_counter()
+        results = [
+            generate_story_task.delay(f"Benchmark topic {i}", f"user-{i}", "jwt")
+            for i in range(stories)
+        ]
+        for result in results:
+            story = result.get(timeout=timeout)
+            if not story.get("cover_image_url") or not story.get("pdf_url"):
+                raise RuntimeError(f"Story {result.id} finished without images or PDF")
+        return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", nargs="+", default=["solo", "threads"], choices=["solo", "threads"])
+    parser.add_argument("--concurrency", type=int, default=16, help="worker concurrency for the threads pool")
+    parser.add_argument("--stories", type=int, default=32)
+    parser.add_argument("--chapters", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake Groq call")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="seconds per fake OpenAI image")
+    parser.add_argument("--io-latency", type=float, default=0.1, help="seconds per fake Supabase/download call")
+    parser.add_argument("--skip-pdf", action="store_true", help="replace PDF rendering (CPU-bound) with a stub")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    from api.celery_tasks.app import celery_app
+
+    celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://", task_always_eager=False)
+
+    print(f"{'pool':<8} {'concurrency':>11} {'stories':>8} {'seconds':>9} {'stories/min':>12}")
+    with FakeProviders(args.llm_latency, args.image_latency, args.io_latency, args.chapters, not args.skip_pdf):
+        for pool in args.pools:
+            concurrency = 1 if pool == "solo" else args.concurrency
+            elapsed = run(pool, concurrency, args.stories, args.timeout)
+            print(f"{pool:<8} {concurrency:>11} {args.stories:>8} {elapsed:>9.1f} {args.stories / elapsed * 60:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+-- Migration script to reserve credits at enqueue time and finalize stories in one round trip
+-- Execute this in your Supabase SQL Editor
+
+-- One row per story task: the credit is taken when the task is enqueued ('reserved'),
+-- kept when the story is saved ('committed') or given back if the task fails ('refunded')
+CREATE TABLE IF NOT EXISTS credit_reservations (
+  task_id TEXT PRIMARY KEY,
+  user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'reserved' CHECK (status IN ('reserved', 'committed', 'refunded')),
+  story_id UUID REFERENCES stories(id) ON DELETE SET NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_reservations_user_id ON credit_reservations(user_id);
+
+ALTER TABLE credit_reservations ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view their own credit reservations" ON credit_reservations;
+CREATE POLICY "Users can view their own credit reservations" ON credit_reservations
+  FOR SELECT USING (auth.uid() = user_id);
+
+-- Called by the API with the user's JWT before enqueuing a story.
+-- Returns the new balance, or NULL if the user has no credits left. Calling it again
+-- with the same task id does not take a second credit.
+CREATE OR REPLACE FUNCTION public.reserve_credit(p_task_id TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+  v_user UUID := auth.uid();
+  v_credits INTEGER;
+BEGIN
+  IF v_user IS NULL THEN
+    RAISE EXCEPTION 'reserve_credit requires an authenticated user';
+  END IF;
+
+  IF EXISTS (SELECT 1 FROM credit_reservations WHERE task_id = p_task_id AND user_id = v_user) THEN
+    SELECT credits INTO v_credits FROM profiles WHERE id = v_user;
+    RETURN v_credits;
+  END IF;
+
+  UPDATE profiles SET credits = credits - 1
+  WHERE id = v_user AND credits > 0
+  RETURNING credits INTO v_credits;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO credit_reservations (task_id, user_id) VALUES (p_task_id, v_user);
+  RETURN v_credits;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Called by the worker (service role): inserts the story and commits the reservation in
+-- one transaction. Idempotent per task id, so a retried task gets the same row back.
+-- Tasks enqueued without a reservation are charged here.
+CREATE OR REPLACE FUNCTION public.finalize_story(
+  p_task_id TEXT,
+  p_user_id UUID,
+  p_title TEXT,
+  p_content TEXT,
+  p_prompt TEXT,
+  p_story_type TEXT,
+  p_metadata JSONB
+)
+RETURNS stories AS $$
+DECLARE
+  v_reservation credit_reservations%ROWTYPE;
+  v_story stories%ROWTYPE;
+BEGIN
+  SELECT * INTO v_reservation FROM credit_reservations WHERE task_id = p_task_id FOR UPDATE;
+
+  IF FOUND AND v_reservation.story_id IS NOT NULL THEN
+    SELECT * INTO v_story FROM stories WHERE id = v_reservation.story_id;
+    IF FOUND THEN
+      RETURN v_story;
+    END IF;
+  END IF;
+
+  INSERT INTO stories (user_id, title, content, prompt, story_type, metadata)
+  VALUES (p_user_id, p_title, p_content, p_prompt, COALESCE(p_story_type, 'open'), COALESCE(p_metadata, '{}'::jsonb))
+  RETURNING * INTO v_story;
+
+  IF v_reservation.task_id IS NULL OR v_reservation.status = 'refunded' THEN
+    UPDATE profiles SET credits = credits - 1 WHERE id = p_user_id AND credits > 0;
+  END IF;
+
+  INSERT INTO credit_reservations (task_id, user_id, status, story_id)
+  VALUES (p_task_id, p_user_id, 'committed', v_story.id)
+  ON CONFLICT (task_id) DO UPDATE
+    SET status = 'committed', story_id = EXCLUDED.story_id, updated_at = NOW();
+
+  RETURN v_story;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Called when a story task fails for good (or could not be enqueued).
+-- Gives the credit back once and returns the user id, or NULL if there was nothing to refund.
+CREATE OR REPLACE FUNCTION public.refund_credit(p_task_id TEXT)
+RETURNS UUID AS $$
+DECLARE
+  v_user UUID;
+BEGIN
+  UPDATE credit_reservations SET status = 'refunded', updated_at = NOW()
+  WHERE task_id = p_task_id AND status = 'reserved'
+  RETURNING user_id INTO v_user;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  UPDATE profiles SET credits = credits + 1 WHERE id = v_user;
+  RETURN v_user;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.reserve_credit(TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.reserve_credit(TEXT) TO authenticated, service_role;
+
+REVOKE ALL ON FUNCTION public.finalize_story(TEXT, UUID, TEXT, TEXT, TEXT, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.finalize_story(TEXT, UUID, TEXT, TEXT, TEXT, TEXT, JSONB) TO service_role;
+
+REVOKE ALL ON FUNCTION public.refund_credit(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.refund_credit(TEXT) TO service_role;
@@ -0,0 +1,30 @@
+-- Migration script to refill 'plus' credits with one set-based UPDATE
+-- Execute this in your Supabase SQL Editor
+
+-- Only 'plus' profiles are ever scanned by the refill
+CREATE INDEX IF NOT EXISTS idx_profiles_plus_refill
+  ON profiles (COALESCE(last_credited_at, plus_since))
+  WHERE plan = 'plus';
+
+-- Adds p_amount credits to every 'plus' profile last credited (or subscribed) at least
+-- p_interval_days ago, and returns the ids of the refilled profiles (the caller drops
+-- their cached profiles).
+-- Running it twice (or from two schedulers at once) is safe: refilled rows no longer match.
+-- The return type changed from INTEGER, which CREATE OR REPLACE cannot do.
+DROP FUNCTION IF EXISTS public.refill_plus_credits(INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION public.refill_plus_credits(p_amount INTEGER DEFAULT 10, p_interval_days INTEGER DEFAULT 30)
+RETURNS SETOF UUID AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE profiles
+  SET credits = COALESCE(credits, 0) + p_amount,
+      last_credited_at = NOW()
+  WHERE plan = 'plus'
+    AND COALESCE(last_credited_at, plus_since) <= NOW() - make_interval(days => p_interval_days)
+  RETURNING id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.refill_plus_credits(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.refill_plus_credits(INTEGER, INTEGER) TO service_role;
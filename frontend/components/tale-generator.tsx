@@ -221,14 +221,17 @@ export default function TaleGenerator() {
   useEffect(() => {
     if (asyncStoryData && asyncStoryData.chapters && Array.isArray(asyncStoryData.chapters)) {
       if (!asyncStorySavedRef.current) {
-        console.log("[v0] Async story completed:", asyncStoryData)
+        // Partial stories arrive while processing; keep updating until the task completes
         setAiStory(asyncStoryData.chapters)
         setStoryTitle(asyncStoryData.title || "AI Generated Tale with Images Async")
 
-        asyncStorySavedRef.current = true
+        if (asyncStatus === "completed") {
+          console.log("[v0] Async story completed:", asyncStoryData)
+          asyncStorySavedRef.current = true
+        }
       }
     }
-  }, [asyncStoryData])
+  }, [asyncStoryData, asyncStatus])
 
   useEffect(() => {
     if (asyncError) {
@@ -14,9 +14,20 @@ interface StoryData {
   [key: string]: unknown
 }
 
+// Payload of GET /tasks/{task_id} and of each /tasks/{task_id}/stream event
+interface TaskStatusResponse {
+  task_id: string
+  status: string
+  result: StoryData | null
+  progress: { stage?: string; story?: StoryData } | null
+  error: string | null
+}
+
 interface UseStoryGenerationReturn {
   isGenerating: boolean
   status: StoryStatus
+  // Backend stage while processing, e.g. "generating_story", "generating_images", "rendering_pdf"
+  stage: string | null
   storyData: StoryData | null
   error: string | null
   generateStory: (
@@ -32,13 +43,47 @@ const POLLING_INTERVAL = 2000 // 2 seconds
 export function useStoryGeneration(): UseStoryGenerationReturn {
   const [isGenerating, setIsGenerating] = useState(false)
   const [status, setStatus] = useState<StoryStatus>("idle")
+  const [stage, setStage] = useState<string | null>(null)
   const [storyData, setStoryData] = useState<StoryData | null>(null)
   const [error, setError] = useState<string | null>(null)
   const pollingIntervalRef = useRef<NodeJS.Timeout | null>(null)
+  const eventSourceRef = useRef<EventSource | null>(null)
   const abortControllerRef = useRef<AbortController | null>(null)
 
   const fastApiUrl = process.env.NEXT_PUBLIC_FASTAPI_URL
 
+  // Applies one task status payload (same shape for GET /tasks/{id} and the SSE stream). Returns true when finished.
+  const applyTaskUpdate = useCallback((data: TaskStatusResponse) => {
+    console.log("[v0] Task status:", data.status, "Task ID:", data.task_id)
+
+    // Handle different statuses
+    if (data.status === "PENDING" || data.status === "STARTED") {
+      setStatus("processing")
+      return false
+    } else if (data.status === "PROGRESS") {
+      // Partial story: text as soon as it exists, then each image as it lands
+      setStatus("processing")
+      setStage(data.progress?.stage ?? null)
+      if (data.progress?.story) {
+        setStoryData(data.progress.story)
+      }
+      return false
+    } else if (data.status === "SUCCESS") {
+      setStatus("completed")
+      setStoryData(data.result || {})
+      setIsGenerating(false)
+      return true
+    } else if (data.status === "FAILURE") {
+      setStatus("failed")
+      setError(data.error || "Task failed without error message")
+      setIsGenerating(false)
+      return true
+    } else {
+      console.warn("[v0] Unknown status:", data.status)
+      return false
+    }
+  }, [])
+
   const pollTaskStatus = useCallback(
     async (taskId: string, token: string) => {
       try {
@@ -55,28 +100,7 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
           throw new Error(`Failed to fetch task status: ${response.statusText}`)
         }
 
-        const data = await response.json()
-        console.log("[v0] Task status:", data.status, "Task ID:", taskId)
-
-        // Handle different statuses
-        if (data.status === "PENDING" || data.status === "STARTED") {
-          setStatus("processing")
-          // Continue polling
-          return false
-        } else if (data.status === "SUCCESS") {
-          setStatus("completed")
-          setStoryData(data.result || {})
-          setIsGenerating(false)
-          return true
-        } else if (data.status === "FAILURE") {
-          setStatus("failed")
-          setError(data.error || "Task failed without error message")
-          setIsGenerating(false)
-          return true
-        } else {
-          console.warn("[v0] Unknown status:", data.status)
-          return false
-        }
+        return applyTaskUpdate(await response.json())
       } catch (err) {
         if (err instanceof Error && err.name !== "AbortError") {
           console.error("[v0] Polling error:", err)
@@ -88,7 +112,65 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
         return false
       }
     },
-    [fastApiUrl],
+    [fastApiUrl, applyTaskUpdate],
+  )
+
+  const startPolling = useCallback(
+    (taskId: string, token: string) => {
+      let pollCount = 0
+      const maxPolls = 300 // 10 minutes max (300 * 2s)
+
+      pollingIntervalRef.current = setInterval(async () => {
+        pollCount++
+
+        if (pollCount > maxPolls) {
+          clearInterval(pollingIntervalRef.current!)
+          setError("Task took too long to complete")
+          setStatus("failed")
+          setIsGenerating(false)
+          return
+        }
+
+        const isDone = await pollTaskStatus(taskId, token)
+        if (isDone) {
+          clearInterval(pollingIntervalRef.current!)
+        }
+      }, POLLING_INTERVAL)
+    },
+    [pollTaskStatus],
+  )
+
+  // Server-Sent Events push every state change as it happens; polling is only the fallback
+  const watchTask = useCallback(
+    (taskId: string, token: string) => {
+      if (typeof EventSource === "undefined") {
+        startPolling(taskId, token)
+        return
+      }
+
+      let finished = false
+      const source = new EventSource(`${fastApiUrl}/tasks/${taskId}/stream`)
+      eventSourceRef.current = source
+
+      source.onmessage = (event) => {
+        finished = applyTaskUpdate(JSON.parse(event.data))
+        if (finished) {
+          source.close()
+          eventSourceRef.current = null
+        }
+      }
+
+      source.onerror = () => {
+        // Stream dropped (proxy, timeout, older backend): close it and keep going with polling
+        source.close()
+        eventSourceRef.current = null
+        if (!finished) {
+          console.warn("[v0] Task stream closed, falling back to polling")
+          startPolling(taskId, token)
+        }
+      }
+    },
+    [fastApiUrl, applyTaskUpdate, startPolling],
   )
 
   const generateStory = useCallback(
@@ -102,6 +184,7 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
 
       // Reset states
       setError(null)
+      setStage(null)
       setStoryData(null)
       setIsGenerating(true)
       setStatus("queued")
@@ -147,26 +230,8 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
           throw new Error("No task_id received from API")
         }
 
-        // Step 2: Start polling
-        let pollCount = 0
-        const maxPolls = 300 // 10 minutes max (300 * 2s)
-
-        pollingIntervalRef.current = setInterval(async () => {
-          pollCount++
-
-          if (pollCount > maxPolls) {
-            clearInterval(pollingIntervalRef.current!)
-            setError("Task took too long to complete")
-            setStatus("failed")
-            setIsGenerating(false)
-            return
-          }
-
-          const isDone = await pollTaskStatus(initData.task_id, token)
-          if (isDone) {
-            clearInterval(pollingIntervalRef.current!)
-          }
-        }, POLLING_INTERVAL)
+        // Step 2: Follow the task (SSE stream, polling as fallback)
+        watchTask(initData.task_id, token)
       } catch (err) {
         if (err instanceof Error && err.name !== "AbortError") {
           console.error("[v0] Error in generateStory:", err)
@@ -177,20 +242,24 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
         if (pollingIntervalRef.current) {
           clearInterval(pollingIntervalRef.current)
         }
+        eventSourceRef.current?.close()
       }
     },
-    [fastApiUrl, pollTaskStatus],
+    [fastApiUrl, watchTask],
   )
 
   const reset = useCallback(() => {
     if (pollingIntervalRef.current) {
       clearInterval(pollingIntervalRef.current)
     }
+    eventSourceRef.current?.close()
+    eventSourceRef.current = null
     if (abortControllerRef.current) {
       abortControllerRef.current.abort()
     }
     setIsGenerating(false)
     setStatus("idle")
+    setStage(null)
     setStoryData(null)
     setError(null)
   }, [])
@@ -201,6 +270,7 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
       if (pollingIntervalRef.current) {
         clearInterval(pollingIntervalRef.current)
       }
+      eventSourceRef.current?.close()
       if (abortControllerRef.current) {
         abortControllerRef.current.abort()
       }
@@ -210,6 +280,7 @@ export function useStoryGeneration(): UseStoryGenerationReturn {
   return {
     isGenerating,
     status,
+    stage,
     storyData,
     error,
     generateStory,
@@ -12,8 +12,11 @@ os.environ.setdefault("SUPABASE_URL", "https://fake.supabase.co")
 os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake-key")
 os.environ.setdefault("SUPABASE_ANON_KEY", "fake-anon-key")
 os.environ.setdefault("SUPABASE_PROJECT_REF", "fake-project")
+# Render PDFs in-process so patched pdf_service functions apply (spawned processes would not see them)
+os.environ.setdefault("PDF_PROCESS_POOL", "false")
 
 from api.agents.utils import Story
+from api.services import image_spool
 
 @pytest.fixture(autouse=True)
 def mock_env_vars(monkeypatch):
@@ -25,6 +28,11 @@ def mock_env_vars(monkeypatch):
     monkeypatch.setenv("SUPABASE_ANON_KEY", "fake-anon-key")
     monkeypatch.setenv("SUPABASE_PROJECT_REF", "fake-project")
 
+@pytest.fixture(autouse=True)
+def isolated_image_spool(monkeypatch, tmp_path):
+    """Keep spooled test images out of the shared temp directory."""
+    monkeypatch.setattr(image_spool, "IMAGE_SPOOL_DIR", str(tmp_path / "image-spool"))
+
 @pytest.fixture
 def mock_story_agent():
     """Mock the story generation LLM agent."""
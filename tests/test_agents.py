@@ -11,8 +11,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
 from unittest.mock import patch, MagicMock
-from api.agents.story_agent import story_generation_node
-from api.agents.utils import Story, StoryState
+from api.agents.story_agent import story_generation_node, image_generation_node
+from api.agents.utils import Story, StoryState, ScenePrompt, ScenePromptBatch
 from api.prompts.story_prompts import get_story_system_prompt
 
 # ============================================================================
@@ -24,7 +24,7 @@ def test_story_generation_node_success(mock_story_agent):
     logger.info(">>> TEST START: test_story_generation_node_success")
     
     # Mock the 'story_agent' imported in api.agents.story_agent
-    with patch("api.agents.story_agent.story_agent", mock_story_agent):
+    with patch("api.agents.story_agent.get_story_agent", return_value=mock_story_agent):
         state = StoryState(
             messages=[{"role": "user", "content": "Write a story about a brave toaster"}],
             story_data=None,
@@ -51,6 +51,75 @@ def test_story_generation_node_success(mock_story_agent):
         
     logger.info("<<< TEST PASS: test_story_generation_node_success")
 
+def test_image_generation_node_keeps_chapter_order(mock_story_agent):
+    """Images render concurrently but land on the right cover/chapter slots."""
+    import time
+    story = mock_story_agent.invoke.return_value.model_copy(deep=True)
+
+    def fake_generate_image(prompt, image_type="image", model=None, index=None, context=None):
+        # Later chapters finish first to expose ordering bugs
+        time.sleep(0.05 * (len(story.chapters) - (index or 0)))
+        return f"https://example.test/{image_type}_{index}.png"
+
+    with (
+        patch("api.agents.story_agent.make_image_prompt", side_effect=lambda text, **kw: text),
+        patch("api.agents.story_agent.generate_image", side_effect=fake_generate_image) as mock_generate,
+        patch("api.agents.story_agent.IMAGE_CONCURRENCY", 4),
+        patch("api.agents.story_agent.IMAGE_PROMPT_BATCH", False),
+    ):
+        result = image_generation_node(StoryState(
+            messages=[],
+            story_data=story,
+            user_id="test_user",
+            jwt_token="fake_token",
+            model="gpt-image-1",
+        ))
+
+    output = result["final_output"]
+    assert mock_generate.call_count == 4
+    assert output["cover_image_url"] == "https://example.test/cover_0.png"
+    assert [c["image_url"] for c in output["chapters"]] == [
+        "https://example.test/chapter_1.png",
+        "https://example.test/chapter_2.png",
+        "https://example.test/chapter_3.png",
+    ]
+
+def test_batched_image_prompts_fall_back_only_for_invalid_entries(mock_story_agent):
+    """One batched LLM call covers valid scenes; only bad entries use the per-scene path."""
+    story = mock_story_agent.invoke.return_value.model_copy(deep=True)
+    batch = ScenePromptBatch(prompts=[
+        ScenePrompt(index=0, prompt="A cover scene"),
+        ScenePrompt(index=1, prompt="Chapter one scene"),
+        ScenePrompt(index=1, prompt="Duplicate entry"),
+        ScenePrompt(index=2, prompt="   "),
+        ScenePrompt(index=7, prompt="Unknown scene"),
+    ])
+    mock_batch_agent = MagicMock()
+    mock_batch_agent.invoke.return_value = batch
+
+    with (
+        patch("api.agents.story_agent.get_image_prompt_batch_agent", return_value=mock_batch_agent),
+        patch("api.agents.story_agent.make_image_prompt", return_value="fallback prompt") as mock_single,
+        patch("api.agents.story_agent.generate_image", side_effect=lambda prompt, **kw: prompt) as mock_generate,
+        patch("api.agents.story_agent.IMAGE_PROMPT_BATCH", True),
+    ):
+        result = image_generation_node(StoryState(
+            messages=[],
+            story_data=story,
+            user_id="test_user",
+            jwt_token="fake_token",
+            character_descriptions="- Chapter: a talking book, old, no hair, black eyes, brown cover, no clothes, gold trim, small",
+        ))
+
+    output = result["final_output"]
+    mock_batch_agent.invoke.assert_called_once()
+    assert mock_single.call_count == 2
+    assert output["cover_image_url"].startswith("CHARACTER CONSISTENCY (All characters")
+    assert output["cover_image_url"].endswith("A cover scene")
+    assert output["chapters"][0]["image_url"].endswith("Chapter one scene")
+    assert [c["image_url"] for c in output["chapters"][1:]] == ["fallback prompt", "fallback prompt"]
+    assert mock_generate.call_count == 4
+
 # ============================================================================
 # INTEGRATION TESTS (REAL API CALLS)
 # ============================================================================
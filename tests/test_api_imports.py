@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+WORKER_ONLY_MODULES = ("api.celery_tasks.tasks", "api.agents", "langchain_core", "langgraph", "langchain_groq", "openai", "boto3")
+
+
+def test_api_does_not_import_the_worker_stack():
+    """The web tier enqueues by task name, so importing the app must not load the LLM/S3 clients."""
+    script = (
+        "import sys, api.main\n"
+        f"print(','.join(m for m in sys.modules if m.split('.')[0] in {WORKER_ONLY_MODULES!r} or m in {WORKER_ONLY_MODULES!r}))"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_send_task_reaches_the_registered_worker_task():
+    from api.celery_tasks import signatures, tasks
+
+    assert tasks.generate_story_task.name == signatures.GENERATE_STORY_TASK
+    assert tasks.refund_credit_task.name == signatures.REFUND_CREDIT_TASK
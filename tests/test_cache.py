@@ -0,0 +1,30 @@
+from unittest.mock import patch
+
+from api.services.cache import InMemoryLRUCache
+
+
+def test_lru_evicts_least_recently_used_and_counts_hits():
+    cache = InMemoryLRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert cache.stats() == {"hits": 3, "misses": 1}
+
+
+def test_lru_entries_expire_after_ttl():
+    cache = InMemoryLRUCache(maxsize=4, ttl=10)
+    with patch("api.services.cache.time.monotonic", return_value=100.0):
+        cache.set("token", {"sub": "user-1"})
+    with patch("api.services.cache.time.monotonic", return_value=105.0):
+        assert cache.get("token") == {"sub": "user-1"}
+    with patch("api.services.cache.time.monotonic", return_value=111.0):
+        assert cache.get("token") is None
+    cache.set("token", {"sub": "user-1"})
+    cache.delete("token")
+    assert cache.get("token") is None
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.backends.cache import CacheBackend
+
+from api.agents import story_agent
+from api.celery_tasks import canvas, tasks
+from api.celery_tasks.app import celery_app
+from api.celery_tasks.progress import ProgressReporter
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+
+@pytest.fixture
+def eager_celery():
+    """Run the canvas inline with an in-memory result backend (chords need one)."""
+    previous = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    previous_backend = celery_app.backend
+    celery_app._backend = CacheBackend(app=celery_app, backend="memory", url="memory://")
+    yield celery_app
+    celery_app._backend = previous_backend
+    celery_app.conf.task_always_eager = previous
+
+
+def test_canvas_pipeline_fans_out_images_and_returns_story(eager_celery, mock_story_agent):
+    store = InMemoryCheckpointStore()
+    published = []
+    mock_image_llm = MagicMock()
+    mock_image_llm.invoke.return_value = SimpleNamespace(content="- Toaster: appliance, new, no hair, round dials, silver, none, red lever, small")
+
+    with (
+        patch.object(tasks, "STORY_PIPELINE", "canvas"),
+        patch.object(tasks, "get_supabase_admin_client", return_value=None),
+        patch.object(tasks, "get_checkpoint_store", return_value=store),
+        patch.object(canvas, "get_checkpoint_store", return_value=store),
+        patch.object(story_agent, "get_checkpoint_store", return_value=store),
+        patch.object(canvas, "_progress", side_effect=lambda run: ProgressReporter(published.append, story=run.get("story"))),
+        patch.object(story_agent, "get_story_agent", return_value=mock_story_agent),
+        patch.object(story_agent, "get_image_llm", return_value=mock_image_llm),
+        patch.object(story_agent, "IMAGE_PROMPT_BATCH", False),
+        patch.object(story_agent, "make_image_prompt", side_effect=lambda text, **kw: text),
+        patch.object(story_agent, "generate_image", side_effect=lambda prompt, index=None, **kw: f"https://example.test/{index}.png") as mock_generate,
+        patch("api.services.pdf_service.generate_story_pdf", return_value=b"%PDF"),
+    ):
+        result = tasks.generate_story_task.apply(
+            kwargs={"topic": "A brave toaster", "user_id": "test_user", "jwt_token": "fake_token", "num_chapters": 3},
+            task_id="task-1",
+        ).get()
+
+    assert mock_generate.call_count == 4
+    assert result["title"] == "Test Story"
+    assert result["cover_image_url"] == "https://example.test/0.png"
+    assert [c["image_url"] for c in result["chapters"]] == [
+        "https://example.test/1.png",
+        "https://example.test/2.png",
+        "https://example.test/3.png",
+    ]
+    assert "story_ready" in [meta["stage"] for meta in published]
+    assert max(meta["images_done"] for meta in published) == 4
+    # Checkpoints are cleared once the story is persisted
+    assert store.load("task-1") == {}
@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock, patch
+
+from api.agents import story_agent
+from api.agents.utils import Story
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+
+def test_in_memory_store_roundtrip_and_clear():
+    store = InMemoryCheckpointStore()
+    store.save("task-1", "image:0", "https://example.test/cover.png")
+    store.save("task-1", "node:generate_story", {"story_data": {"title": "T", "chapters": []}})
+
+    assert store.get("task-1", "image:0") == "https://example.test/cover.png"
+    assert store.load("task-1")["node:generate_story"]["story_data"]["title"] == "T"
+    assert store.get("task-2", "image:0") is None
+
+    store.clear("task-1")
+    assert store.load("task-1") == {}
+
+
+def test_graph_resumes_from_first_incomplete_step(mock_story_agent):
+    """A retried run replays saved nodes/images and only renders what is missing."""
+    store = InMemoryCheckpointStore()
+    story = mock_story_agent.invoke.return_value
+    store.save("task-1", "node:generate_story", {"story_data": story.model_dump()})
+    store.save("task-1", "node:extract_characters", {})
+    store.save("task-1", "story_id", "story-1")
+    store.save("task-1", "image:0", "https://example.test/cover.png")
+    store.save("task-1", "image:2", "https://example.test/chapter_2.png")
+
+    mock_image_llm = MagicMock()
+    with (
+        patch.object(story_agent, "get_checkpoint_store", return_value=store),
+        patch.object(story_agent, "get_story_agent", return_value=mock_story_agent),
+        patch.object(story_agent, "get_image_llm", return_value=mock_image_llm),
+        patch.object(story_agent, "IMAGE_PROMPT_BATCH", False),
+        patch.object(story_agent, "make_image_prompt", side_effect=lambda text, **kw: text),
+        patch.object(story_agent, "generate_image", side_effect=lambda prompt, index=None, **kw: f"https://example.test/new_{index}.png") as mock_generate,
+    ):
+        result = story_agent.get_graph().invoke({
+            "messages": [{"role": "user", "content": "A brave toaster"}],
+            "user_id": "test_user",
+            "jwt_token": "fake_token",
+            "task_id": "task-1",
+        })
+
+    mock_story_agent.invoke.assert_not_called()
+    mock_image_llm.invoke.assert_not_called()
+    assert sorted(call.kwargs["index"] for call in mock_generate.call_args_list) == [1, 3]
+    assert result["final_output"]["story_id"] == "story-1"
+    assert isinstance(result["story_data"], Story)
+    assert result["story_data"].cover_image_url == "https://example.test/cover.png"
+    assert [c.image_url for c in result["story_data"].chapters] == [
+        "https://example.test/new_1.png",
+        "https://example.test/chapter_2.png",
+        "https://example.test/new_3.png",
+    ]
+    assert store.get("task-1", "image:3") == "https://example.test/new_3.png"
+    assert store.get("task-1", "node:generate_images")["final_output"]["story_id"] == "story-1"
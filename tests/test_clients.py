@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from api.services import clients
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_client_is_built_once_on_first_use_across_threads():
+    builds = []
+
+    def build():
+        builds.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    get_fake = clients.register("test_fake", build)
+    try:
+        assert not clients.is_built("test_fake")
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_fake())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(builds) == 1
+        assert all(result is results[0] for result in results)
+    finally:
+        clients.reset("test_fake")
+
+
+def test_warm_up_reports_failures_without_raising():
+    def broken():
+        raise EnvironmentError("missing key")
+
+    clients.register("test_broken", broken)
+    failures = clients.warm_up("test_broken")
+    assert isinstance(failures["test_broken"], EnvironmentError)
+    assert not clients.is_built("test_broken")
+
+
+def test_worker_modules_import_without_provider_keys():
+    """Keys are only needed when a client is first used, not to import the worker code."""
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "GROQ_API_KEY", "SUPABASE_ANON_KEY", "SUPABASE_SERVICE_ROLE_KEY")}
+    script = (
+        "import sys, api.celery_tasks.tasks, api.celery_tasks.canvas\n"
+        "from api.services import clients\n"
+        "print(sorted(n for n in ('story_agent', 'image_llm', 'openai', 'supabase_admin', 'story_graph') if clients.is_built(n)),"
+        " 'openai' in sys.modules, 'boto3' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[] False False"
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from api.celery_tasks import tasks
+from api.routers import stories
+from api.services import user_service
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+
+def _user(reserved_balance) -> user_service.UserProfile:
+    client = MagicMock()
+    client.rpc.return_value.execute.return_value = SimpleNamespace(data=reserved_balance)
+    return user_service.UserProfile("user-1", credits=1, plan="free", supabase_client=client, token="token")
+
+
+def test_enqueue_reserves_a_credit_under_the_task_id():
+    user = _user(reserved_balance=0)
+
+    with patch.object(stories, "send_generate_story_task") as send_task:
+        response = stories.enqueue_story(user, topic="A brave toaster", user_id="user-1")
+
+    task_id = response["task_id"]
+    user.client.rpc.assert_called_once_with("reserve_credit", {"p_task_id": task_id})
+    assert user.credits == 0
+    assert send_task.call_args.args == (task_id,)
+    assert send_task.call_args.kwargs["link_error"].args == (task_id,)
+
+
+def test_enqueue_is_rejected_when_the_reservation_fails():
+    user = _user(reserved_balance=None)
+
+    with patch.object(stories, "send_generate_story_task") as send_task:
+        with pytest.raises(HTTPException) as exc_info:
+            stories.enqueue_story(user, topic="A brave toaster", user_id="user-1")
+
+    assert exc_info.value.status_code == 402
+    send_task.assert_not_called()
+
+
+def test_enqueue_failure_refunds_the_reservation():
+    user = _user(reserved_balance=0)
+    service = MagicMock()
+
+    with (
+        patch.object(stories, "send_generate_story_task", side_effect=ConnectionError("redis down")),
+        patch.object(user_service, "get_supabase_admin_client", return_value=service),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            stories.enqueue_story(user, topic="A brave toaster", user_id="user-1")
+
+    assert exc_info.value.status_code == 503
+    task_id = user.client.rpc.call_args.args[1]["p_task_id"]
+    service.rpc.assert_called_once_with("refund_credit", {"p_task_id": task_id})
+
+
+def test_story_is_saved_with_one_finalize_call_per_task():
+    admin = MagicMock()
+    admin.rpc.return_value.execute.return_value = SimpleNamespace(data={"id": "story-1"})
+    store = InMemoryCheckpointStore()
+
+    with patch.object(tasks, "get_supabase_admin_client", return_value=admin), patch.object(tasks, "get_checkpoint_store", return_value=store):
+        for _ in range(2):
+            row = tasks.save_story_and_commit_credit({"title": "T"}, "user-1", "task-1", "topic", "open", {})
+
+    assert row == {"id": "story-1"}
+    admin.rpc.assert_called_once()
+    assert admin.rpc.call_args.args[0] == "finalize_story"
+    admin.table.assert_not_called()
+
+
+def test_generate_endpoints_do_not_block_the_event_loop():
+    import inspect
+
+    # The credit RPC and the enqueue are blocking calls: FastAPI must run these endpoints in its threadpool
+    for endpoint in (stories.generate_story_async, stories.generate_guided_story_async):
+        assert not inspect.iscoroutinefunction(endpoint)
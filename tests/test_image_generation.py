@@ -2,6 +2,8 @@ import base64
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import boto3
+
 from api.agents import utils
 
 
@@ -14,15 +16,17 @@ def test_gpt_image_2_uses_low_quality_and_base64_upload():
         ]
     )
     mock_generate = MagicMock(return_value=response)
+    context = utils.GenerationContext("user-1", "jwt-1", "story-1")
 
     with (
-        patch.object(utils.client.images, "generate", mock_generate),
+        patch.object(utils, "get_openai_client", return_value=SimpleNamespace(images=SimpleNamespace(generate=mock_generate))),
         patch.object(utils, "upload_image_bytes_to_supabase", return_value="https://example.test/image.png") as mock_upload,
     ):
         image_url = utils.generate_image(
             "A bright storybook castle",
             model="gpt-image-2-2026-04-21",
             image_type="cover",
+            context=context,
         )
 
     assert image_url == "https://example.test/image.png"
@@ -30,4 +34,68 @@ def test_gpt_image_2_uses_low_quality_and_base64_upload():
     params = mock_generate.call_args.kwargs
     assert params["model"] == "gpt-image-2-2026-04-21"
     assert params["quality"] == "low"
-    mock_upload.assert_called_once_with(b"fake-image-data", "cover")
+    mock_upload.assert_called_once_with(b"fake-image-data", "cover", context)
+
+
+def test_generation_contexts_do_not_share_upload_state():
+    first = utils.GenerationContext("user-1", "jwt-1", "story-1")
+    second = utils.GenerationContext("user-2", "jwt-2", "story-2")
+    s3_first, s3_second = MagicMock(), MagicMock()
+
+    with patch.object(boto3.session, "Session") as mock_session:
+        mock_session.return_value.client.side_effect = [s3_first, s3_second]
+        first_url = utils.upload_image_bytes_to_supabase(b"one", "chapter_1", first)
+        second_url = utils.upload_image_bytes_to_supabase(b"two", "chapter_1", second)
+
+    assert "/user-1/story-1/chapter_1_" in first_url
+    assert "/user-2/story-2/chapter_1_" in second_url
+    assert s3_first.put_object.call_args.kwargs["Key"].startswith("user-1/story-1/")
+    assert s3_second.put_object.call_args.kwargs["Key"].startswith("user-2/story-2/")
+    assert mock_session.return_value.client.call_args_list[1].kwargs["aws_session_token"] == "jwt-2"
+    assert [first.next_chapter_index(), first.next_chapter_index(), second.next_chapter_index()] == [1, 2, 1]
+
+
+def test_repeated_prompt_is_served_from_image_cache():
+    response = SimpleNamespace(
+        data=[SimpleNamespace(b64_json=base64.b64encode(b"fake-image-data").decode("ascii"))]
+    )
+    mock_generate = MagicMock(return_value=response)
+    stored_url = utils.public_url_for("user-1/story-1/chapter_1_abcd1234.png")
+    context = utils.GenerationContext("user-1", "jwt-1", "story-1")
+
+    with (
+        patch.object(utils, "image_cache", utils.InMemoryLRUCache(maxsize=8)) as cache,
+        patch.object(utils, "get_openai_client", return_value=SimpleNamespace(images=SimpleNamespace(generate=mock_generate))),
+        patch.object(utils.requests, "get", return_value=SimpleNamespace(content=b"fake-image-data", raise_for_status=lambda: None)),
+        patch.object(utils, "upload_image_bytes_to_supabase", return_value=stored_url) as mock_upload,
+    ):
+        first = utils.generate_image("A lighthouse", model="gpt-image-1", index=1, context=context)
+        second = utils.generate_image("A lighthouse", model="gpt-image-1", index=2, context=context)
+        other_model = utils.generate_image("A lighthouse", model="gpt-image-1-mini", index=3, context=context)
+
+    assert first == second == other_model == stored_url
+    assert mock_generate.call_count == 2
+    # The hit is copied (uploaded again under this story), not generated again
+    assert mock_upload.call_count == 3
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_image_cache_hit_is_copied_into_the_new_story_and_spooled():
+    cached_key = "user-1/story-1/chapter_1_abcd1234.png"
+    context = utils.GenerationContext("user-2", "jwt-2", "story-2")
+    s3 = MagicMock()
+    cache = utils.InMemoryLRUCache(maxsize=8)
+    cache.set(utils.image_cache_key("gpt-image-1", "A lighthouse", "1024x1024", "low"), {"object_key": cached_key})
+
+    with (
+        patch.object(utils, "image_cache", cache),
+        patch.object(utils, "get_openai_client", side_effect=AssertionError("generated")),
+        patch.object(utils.requests, "get", return_value=SimpleNamespace(content=b"cached-bytes", raise_for_status=lambda: None)) as download,
+        patch.object(utils.GenerationContext, "get_s3_client", lambda self: s3),
+    ):
+        url = utils.generate_image("A lighthouse", model="gpt-image-1", index=1, context=context)
+
+    assert download.call_args.args[0] == utils.public_url_for(cached_key)
+    assert s3.put_object.call_args.kwargs["Key"].startswith("user-2/story-2/chapter_1_")
+    assert url.startswith(utils.public_url_for("user-2/story-2/chapter_1_"))
+    assert utils.image_spool.load([url]) == {url: b"cached-bytes"}
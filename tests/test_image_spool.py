@@ -0,0 +1,52 @@
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from api.agents import utils
+from api.celery_tasks import tasks
+from api.services import image_spool, pdf_service
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+
+def test_uploaded_image_bytes_are_spooled_under_their_public_url():
+    context = utils.GenerationContext("user-1", "jwt-1", "story-1")
+    with patch.object(utils.GenerationContext, "get_s3_client", lambda self: SimpleNamespace(put_object=lambda **kwargs: None)):
+        url = utils.upload_image_bytes_to_supabase(b"png-bytes", "cover", context)
+
+    assert image_spool.load([url, "https://example.test/other.png"]) == {url: b"png-bytes"}
+    image_spool.discard([url])
+    assert image_spool.load([url]) == {}
+
+
+def test_pdf_stage_renders_spooled_images_without_downloading():
+    story = {"title": "T", "cover_image_url": "https://img/cover", "chapters": [{"title": "1", "content": "x", "image_url": "https://img/1"}]}
+    image_spool.put("https://img/cover", b"cover")
+    image_spool.put("https://img/1", b"chapter")
+
+    def render(story_data, images=None, **kwargs):
+        # Only what the spool missed would be downloaded
+        assert pdf_service.fetch_images(pdf_service.story_image_urls(story_data), images) == images
+        return b"%PDF"
+
+    with (
+        patch.object(pdf_service, "generate_story_pdf", side_effect=render) as generate,
+        patch.object(pdf_service, "get_http_session", side_effect=AssertionError("downloaded")),
+        patch.object(tasks, "get_supabase_admin_client", return_value=None),
+        patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+    ):
+        tasks.render_and_upload_pdf(story, "user-1", "task-1")
+
+    assert generate.call_args.kwargs["images"] == {"https://img/cover": b"cover", "https://img/1": b"chapter"}
+    # Consumed: the spool does not grow with every story
+    assert image_spool.load(["https://img/cover", "https://img/1"]) == {}
+
+
+def test_sweep_removes_only_stale_files():
+    image_spool.put("https://img/old", b"old")
+    image_spool.put("https://img/new", b"new")
+    stale = time.time() - 2 * image_spool.IMAGE_SPOOL_TTL_SECONDS
+    os.utime(image_spool._path("https://img/old"), (stale, stale))
+
+    assert image_spool.sweep(image_spool.IMAGE_SPOOL_TTL_SECONDS) == 1
+    assert image_spool.load(["https://img/old", "https://img/new"]) == {"https://img/new": b"new"}
@@ -0,0 +1,69 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+
+from api.services import user_service
+from api.services.jwt_verifier import JWTVerifier, LocalVerificationUnavailable
+
+SECRET = "super-secret-jwt-token-with-at-least-32-characters"
+
+
+def _token(key=SECRET, algorithm="HS256", exp_in=3600, **extra):
+    claims = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + exp_in, **extra}
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": "key-1"})
+
+
+def test_hs256_token_is_verified_locally_and_claims_are_cached():
+    verifier = JWTVerifier(jwt_secret=SECRET, jwks_url=None)
+    token = _token()
+
+    with patch("api.services.jwt_verifier.jwt.decode", wraps=jwt.decode) as decode:
+        assert verifier.verify(token)["sub"] == "user-1"
+        assert verifier.verify(token)["sub"] == "user-1"
+
+    # Second call is served from the claims cache (keyed by token hash)
+    assert decode.call_count == 1
+
+
+@pytest.mark.parametrize("token", [
+    _token(exp_in=-10),
+    _token(key="another-secret-that-is-also-32-characters-long"),
+    _token(aud="anon"),
+])
+def test_expired_forged_or_wrong_audience_tokens_are_rejected(token):
+    verifier = JWTVerifier(jwt_secret=SECRET, jwks_url=None)
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(token)
+
+
+def test_asymmetric_token_uses_the_cached_jwks_key():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    verifier = JWTVerifier(jwt_secret=None, jwks_url="https://fake.supabase.co/auth/v1/.well-known/jwks.json")
+    jwks_client = SimpleNamespace(get_signing_key_from_jwt=lambda token: SimpleNamespace(key=private_key.public_key()))
+
+    with patch.object(verifier, "_get_jwks_client", return_value=jwks_client):
+        assert verifier.verify(_token(private_key, "ES256"))["sub"] == "user-1"
+
+
+def test_hs256_without_secret_is_not_verifiable_locally():
+    verifier = JWTVerifier(jwt_secret=None, jwks_url=None)
+    with pytest.raises(LocalVerificationUnavailable):
+        verifier.verify(_token())
+
+
+def test_user_service_only_calls_supabase_auth_when_local_verification_is_unavailable():
+    supabase = SimpleNamespace(auth=SimpleNamespace(get_user=lambda token: SimpleNamespace(user=SimpleNamespace(id="remote-user"))))
+
+    with patch.object(user_service, "get_jwt_verifier", return_value=JWTVerifier(jwt_secret=SECRET, jwks_url=None)):
+        assert user_service._verify_token(_token(), supabase) == "user-1"
+        with pytest.raises(HTTPException) as excinfo:
+            user_service._verify_token(_token(exp_in=-10), supabase)
+        assert excinfo.value.status_code == 401
+
+    with patch.object(user_service, "get_jwt_verifier", return_value=JWTVerifier(jwt_secret=None, jwks_url=None)):
+        assert user_service._verify_token(_token(), supabase) == "remote-user"
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from api.celery_tasks import maintenance
+from api.celery_tasks.app import celery_app
+from api.services import profile_cache
+from api.services.cache import InMemoryLRUCache
+
+
+def test_refill_is_one_rpc_regardless_of_user_count():
+    service = MagicMock()
+    service.rpc.return_value.execute.return_value = SimpleNamespace(data=[f"user-{i}" for i in range(1200)])
+
+    with patch.object(maintenance, "get_supabase_admin_client", return_value=service), patch.object(maintenance, "invalidate_profile"):
+        assert maintenance.refill_plus_credits_task() == 1200
+
+    service.rpc.assert_called_once_with("refill_plus_credits", {"p_amount": 10, "p_interval_days": 30})
+    service.table.assert_not_called()
+
+
+def test_refill_drops_the_cached_profiles_of_refilled_users():
+    service = MagicMock()
+    service.rpc.return_value.execute.return_value = SimpleNamespace(data=["user-1", {"refill_plus_credits": "user-2"}])
+    cache = InMemoryLRUCache(maxsize=8)
+    for user_id in ("user-1", "user-2", "user-3"):
+        cache.set(user_id, {"credits": 0, "plan": "plus"})
+
+    with patch.object(maintenance, "get_supabase_admin_client", return_value=service), patch.object(profile_cache, "profile_cache", cache):
+        assert maintenance.refill_plus_credits_task() == 2
+
+        assert profile_cache.get_cached_profile("user-1") is None
+        assert profile_cache.get_cached_profile("user-2") is None
+        assert profile_cache.get_cached_profile("user-3") == {"credits": 0, "plan": "plus"}
+
+
+def test_refill_is_scheduled_by_beat():
+    entry = celery_app.conf.beat_schedule["refill-plus-credits"]
+    assert entry["task"] == maintenance.refill_plus_credits_task.name
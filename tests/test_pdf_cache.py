@@ -0,0 +1,186 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from api.celery_tasks import canvas, tasks
+from api.routers import stories
+from api.services import pdf_cache, pdf_service
+from api.services.checkpoint_store import InMemoryCheckpointStore
+from api.services.pdf_cache import cached_pdf_url, story_content_hash
+
+
+@pytest.fixture(autouse=True)
+def local_render_locks():
+    """Per-test, in-process render locks (no Redis)."""
+    with patch.object(pdf_cache, "get_lock_redis", return_value=None), patch.object(pdf_cache, "_local_locks", {}):
+        yield
+
+
+STORY = {"title": "T", "cover_image_url": "https://img/0", "chapters": [{"title": "1", "content": "Once", "image_url": "https://img/1"}]}
+
+
+def _admin(content=None, pdf_in_storage=False):
+    admin = MagicMock()
+    admin.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = SimpleNamespace(
+        data=[{"id": "story-1", "user_id": "user-1", "content": json.dumps(content or STORY)}]
+    )
+    bucket = admin.storage.from_.return_value
+    bucket.exists.return_value = pdf_in_storage
+    bucket.get_public_url.side_effect = lambda path: f"https://pdfs/{path}"
+    return admin
+
+
+def test_content_hash_tracks_printed_content_only():
+    base = story_content_hash(STORY)
+
+    assert story_content_hash({**STORY, "pdf_url": "x", "metadata": {"a": 1}}) == base
+    assert story_content_hash({**STORY, "title": "T2"}) != base
+    assert cached_pdf_url({**STORY, "pdf_url": "https://pdfs/a.pdf", "pdf_hash": base}) == "https://pdfs/a.pdf"
+    assert cached_pdf_url({**STORY, "title": "T2", "pdf_url": "https://pdfs/a.pdf", "pdf_hash": base}) is None
+
+
+def test_pdf_already_in_storage_for_this_content_is_not_rendered_again():
+    story = dict(STORY)
+    with (
+        patch.object(tasks, "get_supabase_admin_client", return_value=_admin(pdf_in_storage=True)),
+        patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+        patch.object(pdf_service, "generate_story_pdf") as generate,
+    ):
+        url = tasks.render_and_upload_pdf(story, "user-1", "task-1")
+
+    generate.assert_not_called()
+    assert url == f"https://pdfs/user-1/{story_content_hash(STORY)}.pdf"
+    assert story["pdf_hash"] == story_content_hash(STORY)
+
+
+def test_story_is_persisted_before_its_pdf_in_background_mode():
+    run = {"task_id": "task-1", "user_id": "user-1", "topic": "t", "story": dict(STORY)}
+
+    assert [link.task for link in canvas.build_postprocessing_chain(run).tasks] == ["render_pdf_task", "persist_story_task"]
+    with patch.object(canvas, "PDF_RENDER_MODE", "background"):
+        assert [link.task for link in canvas.build_postprocessing_chain(run).tasks] == ["persist_story_task"]
+    with (
+        patch.object(canvas, "PDF_RENDER_MODE", "background"),
+        patch.object(canvas, "save_story_and_commit_credit", return_value={"id": "story-1"}),
+        patch.object(canvas, "send_render_story_pdf_task") as send_pdf,
+    ):
+        result = canvas.persist_story_task.apply(args=(run,)).get()
+
+    assert "pdf_url" not in result
+    send_pdf.assert_called_once_with("story-1")
+
+
+def test_background_render_writes_the_pdf_url_back_into_the_story():
+    admin = _admin()
+    with (
+        patch.object(tasks, "get_supabase_admin_client", return_value=admin),
+        patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+        patch.object(pdf_service, "fetch_images", return_value={}),
+        patch.object(pdf_service, "generate_story_pdf", return_value=b"%PDF") as generate,
+    ):
+        result = tasks.render_story_pdf_task.apply(args=("story-1",)).get()
+
+    generate.assert_called_once()
+    saved = json.loads(admin.table.return_value.update.call_args.args[0]["content"])
+    assert saved["pdf_url"] == result["pdf_url"]
+    assert cached_pdf_url(saved) == result["pdf_url"]
+
+
+def test_download_returns_the_cached_pdf_or_enqueues_one_render():
+    cached = {**STORY, "pdf_url": "https://pdfs/a.pdf", "pdf_hash": story_content_hash(STORY)}
+
+    def user_with(content):
+        client = MagicMock()
+        client.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = SimpleNamespace(
+            data=[{"id": "story-1", "content": json.dumps(content)}]
+        )
+        return SimpleNamespace(client=client)
+
+    with patch.object(stories, "send_render_story_pdf_task") as send_pdf:
+        assert stories.get_story_pdf("story-1", user_with(cached)) == {"status": "ready", "pdf_url": "https://pdfs/a.pdf"}
+        send_pdf.assert_not_called()
+
+        response = stories.get_story_pdf("story-1", user_with({**cached, "title": "Edited"}))
+
+    assert response["status"] == "rendering"
+    send_pdf.assert_called_once_with("story-1", task_id=response["task_id"], profile="screen")
+
+
+def test_repeated_downloads_enqueue_one_render_until_it_finishes():
+    client = MagicMock()
+    client.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = SimpleNamespace(
+        data=[{"id": "story-1", "content": json.dumps(STORY)}]
+    )
+    user = SimpleNamespace(client=client)
+
+    with patch.object(stories, "send_render_story_pdf_task") as send_pdf:
+        first = stories.get_story_pdf("story-1", user)
+        second = stories.get_story_pdf("story-1", user)
+        send_pdf.assert_called_once_with("story-1", task_id=first["task_id"], profile="screen")
+        assert second == first
+
+        pdf_cache.release_render(first["task_id"])
+        stories.get_story_pdf("story-1", user)
+        assert send_pdf.call_count == 2
+
+
+def test_pdf_cache_key_includes_the_output_profile():
+    screen = {**STORY, "pdf_url": "https://pdfs/a.pdf", "pdf_hash": story_content_hash(STORY, "screen")}
+
+    assert story_content_hash(STORY, "screen") != story_content_hash(STORY, "print")
+    with patch("api.services.pdf_cache.PDF_PROFILE", "print"):
+        assert story_content_hash(STORY) == story_content_hash(STORY, "print")
+        assert cached_pdf_url(screen) is None
+
+
+def test_background_render_keeps_edits_saved_during_the_render():
+    admin = _admin()
+    edited = {**STORY, "title": "Edited while rendering"}
+    select = admin.table.return_value.select.return_value.eq.return_value.limit.return_value.execute
+    select.side_effect = [
+        SimpleNamespace(data=[{"id": "story-1", "user_id": "user-1", "content": json.dumps(STORY)}]),
+        SimpleNamespace(data=[{"content": json.dumps(edited)}]),
+    ]
+    with (
+        patch.object(tasks, "get_supabase_admin_client", return_value=admin),
+        patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+        patch.object(pdf_service, "fetch_images", return_value={}),
+        patch.object(pdf_service, "generate_story_pdf", return_value=b"%PDF"),
+    ):
+        result = tasks.render_story_pdf_task.apply(args=("story-1",)).get()
+
+    saved = json.loads(admin.table.return_value.update.call_args.args[0]["content"])
+    assert saved["title"] == "Edited while rendering"
+    assert (saved["pdf_url"], saved["pdf_hash"]) == (result["pdf_url"], story_content_hash(STORY))
+    # The PDF was rendered from the old text, so the edited story does not serve it
+    assert cached_pdf_url(saved) is None
+
+
+def test_api_and_worker_with_different_profiles_agree_on_the_cached_pdf():
+    admin = _admin()
+    user = SimpleNamespace(client=MagicMock())
+    select = user.client.table.return_value.select.return_value.eq.return_value.limit.return_value.execute
+    select.return_value = SimpleNamespace(data=[{"id": "story-1", "content": json.dumps(STORY)}])
+
+    # The API expects print PDFs; the worker's own PDF_PROFILE stays screen
+    with patch.object(pdf_cache, "PDF_PROFILE", "print"), patch.object(stories, "send_render_story_pdf_task") as send_pdf:
+        response = stories.get_story_pdf("story-1", user)
+    profile = send_pdf.call_args.kwargs["profile"]
+
+    with (
+        patch.object(tasks, "get_supabase_admin_client", return_value=admin),
+        patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+        patch.object(pdf_service, "fetch_images", return_value={}),
+        patch.object(pdf_service, "generate_story_pdf", return_value=b"%PDF") as generate,
+    ):
+        tasks.render_story_pdf_task.apply(args=("story-1",), kwargs={"profile": profile}, task_id=response["task_id"]).get()
+
+    assert generate.call_args.kwargs["profile"] == "print"
+    saved = json.loads(admin.table.return_value.update.call_args.args[0]["content"])
+    assert saved["pdf_profile"] == "print"
+    select.return_value = SimpleNamespace(data=[{"id": "story-1", "content": json.dumps(saved)}])
+    with patch.object(pdf_cache, "PDF_PROFILE", "print"), patch.object(stories, "send_render_story_pdf_task") as send_again:
+        assert stories.get_story_pdf("story-1", user) == {"status": "ready", "pdf_url": saved["pdf_url"]}
+    send_again.assert_not_called()
@@ -0,0 +1,122 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from api.celery_tasks import pdf_metrics, tasks
+from api.services import pdf_service
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STORY = {"title": "T", "chapters": [{"title": "1", "content": "Once upon a time."}]}
+
+
+@pytest.fixture
+def local_samples():
+    with patch.object(pdf_metrics, "get_metrics_redis", return_value=None), patch.object(pdf_metrics, "_local_samples", pdf_metrics.deque(maxlen=pdf_metrics.RENDER_SAMPLES)):
+        yield
+
+
+def test_render_stats_summarize_recent_renders(local_samples):
+    assert pdf_metrics.render_stats() == {"count": 0}
+    for seconds in range(1, 21):
+        pdf_metrics.record_render(seconds, cpu_seconds=seconds / 2)
+
+    stats = pdf_metrics.render_stats()
+    assert stats["count"] == 20
+    assert (stats["avg_seconds"], stats["p50_seconds"], stats["p95_seconds"]) == (10.5, 10.5, 20)
+    assert stats["avg_cpu_seconds"] == 5.25
+
+
+def test_queue_depths_are_read_passively_from_the_broker():
+    channel = MagicMock()
+    channel.queue_declare.side_effect = lambda queue, passive: SimpleNamespace(message_count=len(queue))
+    conn = MagicMock()
+    conn.__enter__.return_value.default_channel = channel
+
+    with patch.object(pdf_metrics.celery_app, "connection_for_read", return_value=conn):
+        assert pdf_metrics.queue_depths(["pdf", "stories.free"]) == {"pdf": 3, "stories.free": 12}
+    assert all(call.kwargs["passive"] for call in channel.queue_declare.call_args_list)
+
+
+class FakeRedis:
+    """Just enough of a Redis client for kombu's Redis transport to declare and size queues."""
+
+    def __init__(self, lists):
+        self.lists = lists
+        self.ops = []
+
+    def ping(self):
+        return True
+
+    def pipeline(self):
+        return FakeRedis(self.lists)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def exists(self, key):
+        self.ops.append(lambda: int(bool(self.lists.get(key))))
+        return self
+
+    def llen(self, key):
+        self.ops.append(lambda: len(self.lists.get(key, [])))
+        return self
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+def test_queue_depths_on_the_redis_transport_report_idle_queues_as_empty():
+    from kombu import Connection
+    from kombu.transport import redis as redis_transport
+
+    # Redis holds no key for an empty queue, only for "pdf", which has two messages waiting
+    client = FakeRedis({"pdf": [b"render-1", b"render-2"]})
+    with (
+        patch.object(redis_transport.Channel, "_create_client", lambda channel, asynchronous=False: client),
+        patch.object(pdf_metrics.celery_app, "connection_for_read", lambda: Connection("redis://localhost:6379/0")),
+    ):
+        assert pdf_metrics.queue_depths(["pdf", "stories.free"]) == {"pdf": 2, "stories.free": 0}
+
+
+def test_render_runs_in_the_process_pool_and_is_metered(local_samples):
+    bucket = MagicMock()
+    bucket.exists.return_value = False
+    admin = SimpleNamespace(storage=SimpleNamespace(from_=lambda name: bucket))
+    story = dict(STORY)
+    try:
+        with (
+            patch.object(tasks, "PDF_PROCESS_POOL", True),
+            patch.object(pdf_service, "PDF_RENDER_PROCESSES", 1),
+            patch.object(tasks, "get_supabase_admin_client", return_value=admin),
+            patch.object(tasks, "get_checkpoint_store", return_value=InMemoryCheckpointStore()),
+        ):
+            tasks.render_and_upload_pdf(story, "user-1", "task-1")
+            render_pid = pdf_service.get_render_pool().submit(os.getpid).result()
+    finally:
+        if pdf_service._render_pool:
+            pdf_service._render_pool.shutdown()
+        pdf_service._render_pool = None
+
+    assert render_pid != os.getpid()
+    assert bucket.upload.call_args.kwargs["file"].startswith(b"%PDF")
+    assert pdf_metrics.render_stats()["count"] == 1
+
+
+def test_pdf_only_worker_is_sized_to_the_cpu():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("CELERY_WORKER_")}
+    probe = "from api.celery_tasks.app import celery_app as a; c = a.conf; print(c.worker_pool, c.worker_concurrency, c.worker_prefetch_multiplier)"
+
+    def conf(**overrides):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env={**env, **overrides}, capture_output=True, text=True, check=True)
+        return out.stdout.split()
+
+    assert conf(CELERY_WORKER_QUEUES="pdf") == ["prefork", str(os.cpu_count() or 1), "1"]
+    assert conf(CELERY_WORKER_QUEUES="stories.plus,stories.free,celery") == ["threads", "16", "4"]
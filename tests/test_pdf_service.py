@@ -0,0 +1,136 @@
+import io
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from api.services import pdf_service
+
+STORY = {
+    "title": "A brave toaster",
+    "chapters": [{"title": f"Chapter {i}", "content": "Once upon a time there was a toaster. " * 60} for i in range(3)],
+}
+
+
+def test_background_is_one_image_object_shared_by_every_page():
+    pdf = pdf_service.StoryPDF()
+    for _ in range(5):
+        pdf.add_page()
+
+    backgrounds = [info for name, info in pdf.image_cache.images.items() if name.startswith("faded_bg_")]
+    assert len(backgrounds) == 1
+    assert backgrounds[0]["usages"] == 5
+
+
+def test_assets_are_built_once_per_process():
+    pdf_service.preload_assets()
+    fonts_before = pdf_service._parsed_font.cache_info()
+    background_before = pdf_service._faded_bg_info.cache_info()
+
+    first = pdf_service.generate_story_pdf(STORY)
+    second = pdf_service.generate_story_pdf(STORY)
+
+    assert pdf_service._parsed_font.cache_info().misses == fonts_before.misses
+    assert pdf_service._faded_bg_info.cache_info().misses == background_before.misses
+    # Per-document font state is fresh, so both books embed the same subset
+    assert first.startswith(b"%PDF") and abs(len(first) - len(second)) < 100
+
+
+def test_images_are_fetched_concurrently_and_held_bytes_are_not_downloaded():
+    in_flight, peak, requested = [0], [0], []
+    lock = threading.Lock()
+
+    def get(url, timeout=None):
+        with lock:
+            requested.append(url)
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return SimpleNamespace(status_code=404 if url.endswith("missing") else 200, content=url.encode())
+
+    urls = ["https://img/cover", None, "https://img/1", "https://img/2", "https://img/2", "https://img/missing"]
+    with patch.object(pdf_service, "get_http_session", return_value=SimpleNamespace(get=get)):
+        images = pdf_service.fetch_images(urls, {"https://img/cover": b"held"})
+
+    assert images == {"https://img/cover": b"held", "https://img/1": b"https://img/1", "https://img/2": b"https://img/2"}
+    assert sorted(requested) == ["https://img/1", "https://img/2", "https://img/missing"]
+    assert peak[0] == 3
+
+
+def _png(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (200, 120, 80)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_screen_profile_downsamples_and_flattens_images_to_jpeg():
+    screen = Image.open(io.BytesIO(pdf_service.prepare_image(_png(1024), radius=50, width_mm=170, profile="screen")))
+    print_ = Image.open(io.BytesIO(pdf_service.prepare_image(_png(1024), radius=50, width_mm=170, profile="print")))
+
+    assert (screen.format, screen.mode, screen.width) == ("JPEG", "RGB", round(170 / 25.4 * pdf_service.PDF_PROFILES["screen"]["dpi"]))
+    # Rounded corner baked on the page colour instead of an alpha channel
+    assert all(abs(a - b) < 8 for a, b in zip(screen.getpixel((2, 2)), pdf_service.PAGE_COLOR))
+    assert (print_.format, print_.mode, print_.width) == ("PNG", "RGBA", 1024)
+
+
+def test_screen_pdf_is_smaller_than_print():
+    story = {**STORY, "cover_image_url": "https://img/cover"}
+    images = {"https://img/cover": _png(1024)}
+
+    screen = pdf_service.generate_story_pdf(story, images=images, profile="screen")
+    print_ = pdf_service.generate_story_pdf(story, images=images, profile="print")
+
+    assert b"/DCTDecode" in screen and b"/DCTDecode" not in print_
+    assert len(screen) < len(print_) / 2
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        pdf_service.StoryPDF(profile="poster")
+
+
+# fpdf2 attributes StoryPDF._add_cached_font sets by hand; fpdf2 is pinned in api/requirements.txt
+# for this reason. If an upgrade changes them, this fails instead of every PDF at run time.
+TTFFONT_SLOTS = {
+    "i", "type", "name", "desc", "glyph_ids", "_hbfont", "sp", "ss", "up", "ut", "cw", "ttffile", "fontkey",
+    "emphasis", "scale", "subset", "cmap", "ttfont", "missing_glyphs", "biggest_size_pt", "color_font",
+    "unicode_range", "palette_index", "is_compressed", "is_cff", "is_cid_keyed", "is_symbol", "cff_ros",
+    "collection_font_number",
+}
+
+
+def test_cached_fonts_match_fpdf2_add_font():
+    from datetime import datetime, timezone
+
+    from fpdf import FPDF
+    from fpdf.fonts import TTFFont
+
+    assert set(TTFFont.__slots__) == TTFFONT_SLOTS
+    assert callable(getattr(FPDF, "_set_min_pdf_version", None))
+
+    def render(add_font):
+        pdf = FPDF()
+        pdf.set_creation_date(datetime(2024, 1, 1, tzinfo=timezone.utc))
+        add_font(pdf)
+        pdf.add_page()
+        pdf.set_font("OpenDyslexic", size=14)
+        pdf.multi_cell(0, 10, "Once upon a time, a toaster dreamed of flying.")
+        return bytes(pdf.output())
+
+    path = pdf_service.FONT_FILES[""]
+    expected = render(lambda pdf: pdf.add_font("OpenDyslexic", "", path))
+    cached = render(lambda pdf: pdf_service.StoryPDF._add_cached_font(pdf, "OpenDyslexic", "", path))
+    assert cached == expected
+
+
+def test_render_pool_entry_point_never_downloads():
+    story = {**STORY, "cover_image_url": "https://img/cover"}
+    with patch.object(pdf_service, "get_http_session", side_effect=AssertionError("downloaded")):
+        pdf, cpu_seconds = pdf_service.render_story_pdf(story, images={})
+
+    assert pdf.startswith(b"%PDF") and cpu_seconds > 0
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from api.services import profile_cache, user_service
+from api.services.cache import InMemoryLRUCache, TieredCache
+
+
+def _supabase_with_profile(profile: dict) -> MagicMock:
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = SimpleNamespace(data=profile)
+    return supabase
+
+
+def test_profile_is_cached_until_credits_are_written():
+    supabase = _supabase_with_profile({"credits": 2, "plan": "plus"})
+    verifier = SimpleNamespace(verify=lambda token: {"sub": "user-1"})
+
+    with (
+        patch.object(profile_cache, "profile_cache", InMemoryLRUCache(maxsize=8, ttl=30)),
+        patch.object(user_service, "get_jwt_verifier", return_value=verifier),
+        patch.object(user_service, "get_supabase_user_client", return_value=supabase),
+    ):
+        first = user_service.verify_jwt_and_get_user("token")
+        second = user_service.verify_jwt_and_get_user("token")
+        assert (second.credits, second.plan) == (2, "plus")
+        assert supabase.table.return_value.select.call_count == 1
+
+        supabase.rpc.return_value.execute.return_value = SimpleNamespace(data=1)
+        user_service.reserve_credit(first, "task-1")
+        user_service.verify_jwt_and_get_user("token")
+        # The write invalidated the entry, so the profile is read again
+        assert supabase.table.return_value.select.call_count == 2
+
+
+def test_tiered_cache_delete_reaches_the_shared_tier():
+    shared = InMemoryLRUCache(maxsize=8)
+    api_process = TieredCache(InMemoryLRUCache(maxsize=8, ttl=5), shared)
+    worker_process = TieredCache(InMemoryLRUCache(maxsize=8, ttl=5), shared)
+
+    api_process.set("user-1", {"credits": 1, "plan": "free"}, ttl=30)
+    assert worker_process.get("user-1") == {"credits": 1, "plan": "free"}
+
+    worker_process.delete("user-1")
+    assert shared.get("user-1") is None
+    assert worker_process.get("user-1") is None
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from api.agents.story_agent import image_generation_node
+from api.agents.utils import StoryState
+from api.celery_tasks.progress import ProgressReporter
+
+
+def test_reporter_publishes_partial_story_with_each_image():
+    published = []
+    progress = ProgressReporter(published.append)
+
+    progress("generating_story")
+    progress("story_ready", story={"title": "T", "cover_image_url": None, "chapters": [{"title": "C1", "content": "x", "image_url": None}]})
+    progress("generating_images", images_total=2)
+    progress("generating_images", image={"index": 1, "url": "https://example.test/chapter_1.png"})
+
+    assert [meta["stage"] for meta in published] == ["generating_story", "story_ready", "generating_images", "generating_images"]
+    assert published[0]["story"] is None
+    assert published[-1]["story"]["chapters"][0]["image_url"] == "https://example.test/chapter_1.png"
+    assert published[-1]["images_done"] == 1
+    assert published[-1]["images_total"] == 2
+    # Earlier snapshots are not mutated by later updates
+    assert published[1]["story"]["chapters"][0]["image_url"] is None
+
+
+def test_reporter_never_raises_when_publish_fails():
+    def broken_publish(meta):
+        raise ConnectionError("redis down")
+
+    progress = ProgressReporter(broken_publish)
+    progress("generating_story")
+    assert progress.meta["stage"] == "generating_story"
+
+
+def test_image_node_reports_every_image(mock_story_agent):
+    published = []
+    story = mock_story_agent.invoke.return_value.model_copy(deep=True)
+
+    with (
+        patch("api.agents.story_agent.IMAGE_PROMPT_BATCH", False),
+        patch("api.agents.story_agent.make_image_prompt", side_effect=lambda text, **kw: text),
+        patch("api.agents.story_agent.generate_image", side_effect=lambda prompt, index=None, **kw: f"https://example.test/{index}.png"),
+    ):
+        image_generation_node(StoryState(
+            messages=[],
+            story_data=story,
+            user_id="test_user",
+            jwt_token="fake_token",
+            on_progress=ProgressReporter(published.append),
+        ))
+
+    final = published[-1]
+    assert final["images_done"] == final["images_total"] == 4
+    assert final["story"]["cover_image_url"] == "https://example.test/0.png"
+    assert [c["image_url"] for c in final["story"]["chapters"]] == [
+        "https://example.test/1.png",
+        "https://example.test/2.png",
+        "https://example.test/3.png",
+    ]
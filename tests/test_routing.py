@@ -0,0 +1,22 @@
+from api.celery_tasks import routing
+from api.celery_tasks.app import celery_app
+
+
+def _queue_for(name, args=(), kwargs=None):
+    return celery_app.amqp.router.route({}, name, args, kwargs or {})["queue"].name
+
+
+def test_story_task_is_routed_by_plan():
+    assert _queue_for("generate_story_task", kwargs={"plan": "plus"}) == routing.STORY_QUEUE_PLUS
+    assert _queue_for("generate_story_task", kwargs={"plan": "free"}) == routing.STORY_QUEUE_FREE
+    # Older callers that do not send a plan land on the free queue
+    assert _queue_for("generate_story_task", kwargs={"topic": "x"}) == routing.STORY_QUEUE_FREE
+
+
+def test_canvas_tasks_follow_the_run_plan_and_pdf_has_its_own_queue():
+    run = {"task_id": "task-1", "plan": "plus"}
+    assert _queue_for("chapter_image_task", args=(run, {"index": 1})) == routing.STORY_QUEUE_PLUS
+    # Chord body: the joined results come before the run
+    assert _queue_for("join_images_task", args=([{"index": 0, "url": "u"}], run)) == routing.STORY_QUEUE_PLUS
+    assert _queue_for("persist_story_task", args=({"task_id": "task-2", "plan": "free"},)) == routing.STORY_QUEUE_FREE
+    assert _queue_for("render_pdf_task", args=(run,)) == routing.PDF_QUEUE
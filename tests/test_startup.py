@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks import startup
+
+
+@pytest.fixture(scope="module")
+def startup_results():
+    return startup.measure(runs=1)
+
+
+def test_startup_stays_under_thresholds(startup_results):
+    assert startup.check(startup_results) == []
+
+
+def test_every_threshold_is_measured(startup_results):
+    expected = set(startup.THRESHOLDS)
+    if "worker_child_ready" not in startup_results:
+        # No os.fork on this platform
+        expected -= {"worker_boot", "worker_child_ready"}
+    assert expected <= set(startup_results)
+
+
+def test_check_reports_regressions():
+    assert startup.check({"api_first_request": 10.0}, {"api_first_request": 3.0}) == ["api_first_request: 10.00s > 3.00s"]
@@ -0,0 +1,27 @@
+import httpx
+from unittest.mock import patch
+
+from api.services import supabase_client
+
+
+def test_user_clients_share_one_pool_and_send_their_own_jwt():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((str(request.url), request.headers["authorization"], request.headers["apikey"]))
+        return httpx.Response(200, json=[{"credits": 3, "plan": "free"}])
+
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch.object(supabase_client, "get_http_client", return_value=shared):
+        alice = supabase_client.get_supabase_user_client("token-alice")
+        bob = supabase_client.get_supabase_user_client("token-bob")
+
+        assert alice.postgrest.session is shared and bob.postgrest.session is shared
+        alice.table("profiles").select("credits").eq("id", "alice").execute()
+        bob.table("profiles").select("credits").eq("id", "bob").execute()
+
+    assert seen[0][0].startswith("https://fake.supabase.co/rest/v1/profiles?")
+    assert [(auth, key) for _, auth, key in seen] == [
+        ("Bearer token-alice", "fake-anon-key"),
+        ("Bearer token-bob", "fake-anon-key"),
+    ]
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.celery_tasks.app import celery_app
+from api.routers import tasks as tasks_router
+
+
+class FakePubSub:
+    """Replays Celery backend messages as the Redis result backend would publish them."""
+
+    def __init__(self, metas):
+        self.messages = [{"type": "message", "data": celery_app.backend.encode(meta)} for meta in metas]
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    async def unsubscribe(self, channel):
+        self.channels.remove(channel)
+
+    async def aclose(self):
+        pass
+
+
+def _events(body: str) -> list[dict]:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_stream_pushes_progress_until_the_task_finishes():
+    progress = {"stage": "generating_images", "story": {"title": "T"}, "images_done": 1, "images_total": 4}
+    pubsub = FakePubSub([
+        {"status": "PROGRESS", "result": progress, "task_id": "task-1"},
+        {"status": "SUCCESS", "result": {"title": "T", "chapters": []}, "task_id": "task-1"},
+    ])
+    app = FastAPI()
+    app.include_router(tasks_router.router, prefix="/tasks")
+
+    with (
+        patch.object(tasks_router, "get_redis", return_value=SimpleNamespace(pubsub=lambda: pubsub)),
+        patch.object(tasks_router, "AsyncResult", return_value=SimpleNamespace(status="PENDING", info=None)),
+    ):
+        response = TestClient(app).get("/tasks/task-1/stream")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [event["status"] for event in events] == ["PENDING", "PROGRESS", "SUCCESS"]
+    assert events[1]["progress"] == progress
+    assert events[2]["result"] == {"title": "T", "chapters": []}
+    # The subscription is released once the terminal state is sent
+    assert pubsub.channels == []
+
+
+def test_stream_of_a_finished_task_sends_one_event():
+    pubsub = FakePubSub([])
+    app = FastAPI()
+    app.include_router(tasks_router.router, prefix="/tasks")
+
+    with (
+        patch.object(tasks_router, "get_redis", return_value=SimpleNamespace(pubsub=lambda: pubsub)),
+        patch.object(tasks_router, "AsyncResult", return_value=SimpleNamespace(status="SUCCESS", info={"title": "Done"})),
+    ):
+        response = TestClient(app).get("/tasks/task-2/stream")
+
+    assert _events(response.text) == [
+        {"task_id": "task-2", "status": "SUCCESS", "result": {"title": "Done"}, "progress": None, "error": None}
+    ]
+
+
+def test_stream_reports_failures_like_polling():
+    failure = celery_app.backend.prepare_exception(ValueError("Story generation failed"))
+    pubsub = FakePubSub([{"status": "FAILURE", "result": failure, "task_id": "task-3"}])
+    app = FastAPI()
+    app.include_router(tasks_router.router, prefix="/tasks")
+
+    with (
+        patch.object(tasks_router, "get_redis", return_value=SimpleNamespace(pubsub=lambda: pubsub)),
+        patch.object(tasks_router, "AsyncResult", return_value=SimpleNamespace(status="STARTED", info=None)),
+    ):
+        response = TestClient(app).get("/tasks/task-3/stream")
+
+    polled = tasks_router.build_task_response("task-3", "FAILURE", ValueError("Story generation failed"))
+    assert _events(response.text)[-1] == polled
+    assert polled["error"] == "Story generation failed"
@@ -0,0 +1,81 @@
+import importlib
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from api.celery_tasks import warmup
+from api.services import clients
+
+
+def _fake_clients():
+    # Importing these registers the real factories; do it first so the fakes below win
+    for module in warmup.HEAVY_MODULES + ("api.services.pdf_service",):
+        importlib.import_module(module)
+    builds = []
+    for name in warmup.NETWORK_CLIENTS + ("story_graph",):
+        clients.register(name, lambda name=name: builds.append(name) or object())
+    return builds
+
+
+def test_preload_keeps_network_clients_unbuilt_before_fork():
+    with patch.dict(clients._factories), patch.dict(clients._instances, clear=True):
+        builds = _fake_clients()
+        warmup.preload_shared_assets()
+
+        assert clients.is_built("story_graph")
+        # Built once to import their dependencies, then dropped so no child inherits them
+        assert set(warmup.NETWORK_CLIENTS) <= set(builds)
+        assert not any(clients.is_built(name) for name in warmup.NETWORK_CLIENTS)
+
+
+def test_open_client_pools_replaces_inherited_clients():
+    with patch.dict(clients._factories), patch.dict(clients._instances, clear=True):
+        _fake_clients()
+        inherited = clients.get("openai")
+
+        warmup.open_client_pools()
+
+        assert all(clients.is_built(name) for name in warmup.NETWORK_CLIENTS)
+        assert clients.get("openai") is not inherited
+
+
+def test_open_client_pools_opens_a_connection_in_each_pool():
+    from api.services import checkpoint_store
+
+    opened = []
+    http = SimpleNamespace(head=lambda url, **kwargs: opened.append(("supabase", url, kwargs["timeout"])))
+    redis_pool = SimpleNamespace(ping=lambda: opened.append(("redis",)))
+
+    with (
+        patch.dict(clients._factories),
+        patch.dict(clients._instances, clear=True),
+        patch.object(checkpoint_store, "_store", checkpoint_store.RedisCheckpointStore(redis_pool)),
+    ):
+        _fake_clients()
+        clients.register("supabase_http", lambda: http)
+        clients.register("metrics_redis", lambda: redis_pool)
+        clients.register("pdf_lock_redis", lambda: None)
+
+        warmup.open_client_pools()
+
+    assert ("supabase", "https://fake.supabase.co/rest/v1/", warmup.WARMUP_CONNECT_TIMEOUT_SECONDS) in opened
+    # The checkpoint store and the metrics client each ping their own pool
+    assert opened.count(("redis",)) == 2
+
+
+def test_unreachable_services_do_not_block_or_fail_the_warm_up():
+    def hang():
+        threading.Event().wait(5)
+
+    def refuse():
+        raise ConnectionRefusedError("refused")
+
+    with (
+        patch.object(warmup, "CONNECTIONS", {"supabase": hang, "redis": refuse}),
+        patch.object(warmup, "WARMUP_CONNECT_TIMEOUT_SECONDS", 0.2),
+    ):
+        started = time.monotonic()
+        assert sorted(warmup.open_connections()) == ["redis", "supabase"]
+
+    assert time.monotonic() - started < 1
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from celery.backends.cache import CacheBackend
+
+from api.agents import story_agent
+from api.agents.utils import Story
+from api.celery_tasks import canvas, tasks
+from api.celery_tasks.app import celery_app
+from api.services.checkpoint_store import InMemoryCheckpointStore
+
+
+@pytest.fixture
+def memory_backend():
+    """In-memory result backend so PROGRESS updates from eager tasks do not need Redis."""
+    previous_backend = celery_app.backend
+    celery_app._backend = CacheBackend(app=celery_app, backend="memory", url="memory://")
+    yield celery_app
+    celery_app._backend = previous_backend
+
+
+def test_concurrent_story_tasks_keep_per_run_state(memory_backend):
+    """Several stories in flight on one process (threads pool) must not mix users, story ids or checkpoints."""
+    runs = 4
+    store = InMemoryCheckpointStore()
+    # Every run waits here once, so all of them are inside the graph at the same time
+    barrier = threading.Barrier(runs, timeout=10)
+
+    def write_story(messages):
+        barrier.wait()
+        return Story(title=messages[-1]["content"], chapters=[{"title": "One", "content": "Text"}, {"title": "Two", "content": "Text"}])
+
+    def render(prompt, index=None, context=None, **kwargs):
+        return f"https://example.test/{context.user_id}/{context.story_id}/{index}.png"
+
+    with (
+        patch.object(tasks, "STORY_PIPELINE", "graph"),
+        patch.object(tasks, "get_supabase_admin_client", return_value=None),
+        patch.object(tasks, "get_checkpoint_store", return_value=store),
+        patch.object(canvas, "get_checkpoint_store", return_value=store),
+        patch.object(story_agent, "get_checkpoint_store", return_value=store),
+        patch.object(story_agent, "get_story_agent", return_value=SimpleNamespace(invoke=write_story)),
+        patch.object(story_agent, "get_image_llm", return_value=SimpleNamespace(invoke=lambda messages: SimpleNamespace(content=""))),
+        patch.object(story_agent, "IMAGE_PROMPT_BATCH", False),
+        patch.object(story_agent, "make_image_prompt", side_effect=lambda text, **kw: text),
+        patch.object(story_agent, "generate_image", side_effect=render),
+        patch("api.services.pdf_service.generate_story_pdf", return_value=b"%PDF"),
+        ThreadPoolExecutor(max_workers=runs) as pool,
+    ):
+        futures = [
+            pool.submit(
+                lambda i: tasks.generate_story_task.apply(
+                    kwargs={"topic": f"topic-{i}", "user_id": f"user-{i}", "jwt_token": f"jwt-{i}", "num_chapters": 2},
+                    task_id=f"task-{i}",
+                ).get(),
+                i,
+            )
+            for i in range(runs)
+        ]
+        results = [future.result(timeout=30) for future in futures]
+
+    story_ids = set()
+    for i, result in enumerate(results):
+        assert result["title"] == f"topic-{i}"
+        urls = [result["cover_image_url"], *(chapter["image_url"] for chapter in result["chapters"])]
+        assert all(url.startswith(f"https://example.test/user-{i}/") for url in urls)
+        # One storage folder per story, never shared with another run
+        run_story_ids = {url.split("/")[4] for url in urls}
+        assert len(run_story_ids) == 1
+        story_ids |= run_story_ids
+        assert store.load(f"task-{i}") == {}
+    assert len(story_ids) == runs